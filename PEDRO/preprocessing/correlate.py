@@ -0,0 +1,240 @@
+import argparse
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+PREPROCESSING_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(PREPROCESSING_DIR, '..', '..')
+sys.path.insert(0, ROOT)
+from read import PACKET_HEADER
+from replay import read_text_log
+
+README = os.path.join(PREPROCESSING_DIR, 'README.md')
+MISSING = -1  # Byte matrix value where a frame lacks the reference byte
+# Global alignment scores: frames differ by a few inserted bytes (gear 1's
+# 02 c0, an fe before the closing 02) and scattered corrupted ones
+MATCH, MISMATCH, GAP = 2, -1, -2
+
+def load_factors(path=README):
+    """
+    The test matrix from the README: (factor names, {test number: [values]}).
+    Values stay strings; encode_factor turns a column into numbers.
+    """
+    names, tests = None, {}
+    with open(path) as f:
+        for line in f:
+            cells = [cell.strip() for cell in line.rstrip('\n').split('\t')]
+            if len(cells) < 2:
+                continue
+            if cells[0].startswith('Test'):
+                # "Test Distance Unit" shares a cell with the first factor
+                first = cells[0][len('Test'):].strip()
+                names = ([first] if first else []) + cells[1:]
+            elif names and cells[0].isdigit() and len(cells) == len(names) + 1:
+                tests[int(cells[0])] = cells[1:]
+    return names or [], tests
+
+def encode_factor(values):
+    """Numbers as they are; anything else as codes in sorted order (Km/Mi, No/Si, ...)."""
+    try:
+        return np.array([float(value) for value in values])
+    except ValueError:
+        levels = sorted(set(values))
+        return np.array([levels.index(value) for value in values], dtype=float)
+
+def capture_frames(path, header=bytes(PACKET_HEADER)):
+    """
+    Frames of one capture, cut at every header. Only frames of the
+    capture's most common length are kept: the rest lost bytes or a header
+    to corruption.
+    """
+    stream = b''.join(data for _, data in read_text_log(path))
+    frames = [header + piece for piece in stream.split(header)[1:]]
+    if not frames:
+        return []
+    length = Counter(map(len, frames)).most_common(1)[0][0]
+    return [frame for frame in frames if len(frame) == length]
+
+def align(frame, reference):
+    """
+    Global alignment of frame onto reference: (row, inserted) where row
+    holds frame's byte at every reference position (MISSING where frame
+    has none) and inserted[i] counts the frame's extra bytes before
+    reference byte i (len(reference) + 1 slots).
+    """
+    rows, cols = len(frame) + 1, len(reference) + 1
+    score = [[0] * cols for _ in range(rows)]
+    for i in range(1, rows):
+        score[i][0] = i * GAP
+    for j in range(1, cols):
+        score[0][j] = j * GAP
+    for i in range(1, rows):
+        for j in range(1, cols):
+            diagonal = score[i - 1][j - 1] + (MATCH if frame[i - 1] == reference[j - 1] else MISMATCH)
+            score[i][j] = max(diagonal, score[i - 1][j] + GAP, score[i][j - 1] + GAP)
+
+    row = [MISSING] * len(reference)
+    inserted = [0] * cols
+    i, j = rows - 1, cols - 1
+    while i or j:
+        if i and j and score[i][j] == score[i - 1][j - 1] + (MATCH if frame[i - 1] == reference[j - 1] else MISMATCH):
+            row[j - 1] = frame[i - 1]
+            i, j = i - 1, j - 1
+        elif i and score[i][j] == score[i - 1][j] + GAP:
+            inserted[j] += 1
+            i -= 1
+        else:
+            j -= 1
+    return row, inserted
+
+def load_matrix(tests, directory=PREPROCESSING_DIR):
+    """
+    Columnar byte matrix of every test's frames, aligned onto a reference
+    frame (the most common frame of the most common length): (matrix,
+    test_of_row, columns). matrix is frames x column (int16), test_of_row
+    the test number of each row and columns a label per column. The first
+    columns are the reference byte positions (MISSING where a frame lacks
+    the byte); after them come the insertion points some frames use, as
+    the number of bytes inserted there ("+8": before reference byte 8).
+    """
+    frames_of = {}
+    for test in tests:
+        frames = capture_frames(os.path.join(directory, f'{test}.txt'))
+        if frames:
+            frames_of[test] = frames
+    pooled = Counter(frame for frames in frames_of.values() for frame in frames)
+    length = Counter(len(frame) for frame in pooled.elements()).most_common(1)[0][0]
+    reference = next(frame for frame, _ in pooled.most_common() if len(frame) == length)
+
+    # Corruption repeats few frames, so each distinct frame is aligned once
+    aligned = {frame: align(frame, reference) for frame in pooled}
+    slots = sorted({slot for _, inserted in aligned.values() for slot, count in enumerate(inserted) if count})
+    width = len(reference) + len(slots)
+    rows = [row + [inserted[slot] for slot in slots]
+            for frames in frames_of.values() for row, inserted in map(aligned.get, frames)]
+    matrix = np.array(rows, dtype=np.int16).reshape(-1, width)
+    labels = np.repeat(list(frames_of), [len(frames) for frames in frames_of.values()]).astype(np.int32)
+    columns = [str(pos) for pos in range(len(reference))] + [f"+{slot}" for slot in slots]
+    return matrix, labels, columns
+
+def value_counts(matrix):
+    """Per-position histograms: positions x 257 counts, column 0 counting MISSING."""
+    positions = np.broadcast_to(np.arange(matrix.shape[1]), matrix.shape)
+    flat = positions.ravel() * 257 + (matrix.ravel() + 1)
+    return np.bincount(flat, minlength=matrix.shape[1] * 257).reshape(matrix.shape[1], 257)
+
+def entropy(counts):
+    """Shannon entropy in bits along the last axis (a missing byte counts as a value of its own)."""
+    counts = counts.astype(float)
+    totals = counts.sum(axis=-1, keepdims=True)
+    p = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=-1)
+
+def modal_values(matrix, labels, tests):
+    """tests x columns matrix of each test's most common value (corruption voted out)."""
+    return np.stack([value_counts(matrix[labels == test]).argmax(axis=1) - 1 for test in tests])
+
+def factor_scores(matrix, labels, tests, factor):
+    """
+    How well each byte position follows one factor. Returns a dict of
+    per-position arrays:
+      explained   share of the byte's entropy explained by the factor,
+                  I(byte; factor) / H(byte), over every frame (1: the byte
+                  is a function of the factor)
+      correlation Pearson r between the tests' modal bytes and the factor
+    """
+    level_of_test = dict(zip(tests, factor))
+    levels = sorted(set(factor))
+    level_rows = np.array([levels.index(level_of_test[test]) for test in labels])
+
+    # Joint histograms (level, position, value) in one bincount
+    width = matrix.shape[1]
+    positions = np.broadcast_to(np.arange(width), matrix.shape)
+    flat = (level_rows[:, None] * width + positions) * 257 + (matrix + 1)
+    joint = np.bincount(flat.ravel(), minlength=len(levels) * width * 257).reshape(len(levels), width, 257)
+    per_position = joint.sum(axis=0)
+    weights = joint.sum(axis=2) / np.maximum(per_position.sum(axis=1), 1)
+    h_byte = entropy(per_position)
+    h_given = (weights * entropy(joint)).sum(axis=0)
+    explained = np.divide(h_byte - h_given, h_byte, out=np.zeros(width), where=h_byte > 1e-9)
+
+    modes = modal_values(matrix, labels, tests).astype(float)
+    f = factor - factor.mean()
+    m = modes - modes.mean(axis=0)
+    denominator = np.sqrt((f ** 2).sum() * (m ** 2).sum(axis=0))
+    correlation = np.divide(f @ m, denominator, out=np.zeros(width), where=denominator > 0)
+    return {"explained": explained, "correlation": correlation}
+
+def analyze(directory=PREPROCESSING_DIR, readme=README):
+    """
+    Load the tests and score every byte position. Returns a dict with the
+    matrix, entropy and value histograms per position, the tests' modal
+    frames and {factor name: factor_scores}.
+    """
+    names, table = load_factors(readme)
+    tests = sorted(table)
+    matrix, labels, columns = load_matrix(tests, directory)
+    tests = [test for test in tests if np.any(labels == test)]
+    counts = value_counts(matrix)
+    return {
+        "tests": tests,
+        "matrix": matrix,
+        "columns": columns,
+        "labels": labels,
+        "entropy": entropy(counts),
+        "histograms": counts,
+        "modes": modal_values(matrix, labels, tests),
+        "factors": {name: (table, index) for index, name in enumerate(names)},
+        "scores": {
+            name: factor_scores(matrix, labels, tests, encode_factor([table[test][index] for test in tests]))
+            for index, name in enumerate(names)
+        },
+    }
+
+def format_value(value):
+    return "--" if value < 0 else f"{value:02x}"
+
+def top_values(histogram, count=3):
+    """The most common values of one column as 'xx:share' strings ('--' for a missing byte)."""
+    total = histogram.sum()
+    order = np.argsort(histogram)[::-1][:count]
+    return " ".join(f"{format_value(value - 1)}:{histogram[value] / total:.0%}" for value in order if histogram[value])
+
+def print_report(result, top=5, min_explained=0.5):
+    matrix, tests, columns = result["matrix"], result["tests"], result["columns"]
+    print(f"{len(matrix)} frames from tests {', '.join(map(str, tests))}, aligned onto "
+          f"{sum(not column.startswith('+') for column in columns)} reference bytes "
+          f"(+N: bytes inserted before reference byte N)")
+
+    print(f"\n{'Byte':>4} {'Entropy':>8}  Top values")
+    for pos in np.flatnonzero(result["entropy"] > 0.1):
+        print(f"{columns[pos]:>4} {result['entropy'][pos]:>8.2f}  {top_values(result['histograms'][pos])}")
+
+    for name, scores in result["scores"].items():
+        table, index = result["factors"][name]
+        explained, correlation = scores["explained"], scores["correlation"]
+        ranked = [pos for pos in np.argsort(-explained, kind='stable') if explained[pos] >= min_explained][:top]
+        print(f"\n{name}: " + ", ".join(f"{test}={table[test][index]}" for test in tests))
+        if not ranked:
+            print("  no byte follows this factor")
+            continue
+        for pos in ranked:
+            modes = " ".join(map(format_value, result["modes"][:, pos]))
+            print(f"  byte {columns[pos]:>3}: explained {explained[pos]:.2f}, r {correlation[pos]:+.2f}  per test: {modes}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the byte positions that encode each pairwise test factor.")
+    parser.add_argument('--dir', default=PREPROCESSING_DIR, help="folder with the N.txt captures")
+    parser.add_argument('--readme', default=README, help="README holding the test matrix")
+    parser.add_argument('--top', type=int, default=5, help="positions listed per factor")
+    parser.add_argument('--min-explained', type=float, default=0.5,
+                        help="lowest share of a byte's entropy the factor must explain")
+    args = parser.parse_args()
+
+    print_report(analyze(args.dir, args.readme), args.top, args.min_explained)
+
+if __name__ == '__main__':
+    main()
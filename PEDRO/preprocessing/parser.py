@@ -1,11 +1,171 @@
 import re
 import csv
 import os
+import sys
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+pattern = re.compile(r'\[(\d+)\]\s+\[\d+\]\s+HEX:\s+((?:[0-9a-fA-F]{2}(?:\s)?)+)')
+
+# Capture folders converted by batch mode when no paths are given
+PEDRO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DIRS = [
+    os.path.join(PEDRO_DIR, 'preprocessing'),
+    os.path.join(PEDRO_DIR, 'read', 'pairwise'),
+    os.path.join(PEDRO_DIR, 'read', 'legacy_reads'),
+]
+
+OUTPUT_FORMATS = ('compact', 'npz', 'wide')
 
 def get_txt_files(dir_path):
     return [f for f in os.listdir(dir_path) if f.endswith('.txt')]
 
-def main():
+def iter_packets(log_path):
+    """
+    Stream (packet_index, hex_bytes) pairs from a capture, one line at a time.
+    """
+    with open(log_path, 'r') as f_in:
+        for line in f_in:
+            match = pattern.search(line)
+            if match:
+                yield match.group(1), match.group(2).split()
+
+def write_wide_csv(log_path, csv_path):
+    """
+    Legacy layout: one ByteN column per position, padded to the longest packet.
+    Two streaming passes: the first only measures the longest packet.
+    """
+    max_bytes = max((len(hex_bytes) for _, hex_bytes in iter_packets(log_path)), default=0)
+    count = 0
+
+    with open(csv_path, 'w', newline='') as f_out:
+        writer = csv.writer(f_out)
+        header = ['PacketIndex'] + [f'Byte{i+1}' for i in range(max_bytes)]
+        writer.writerow(header)
+
+        for pkt_index, hex_bytes in iter_packets(log_path):
+            # Pad row with empty strings if shorter than max_bytes
+            writer.writerow([pkt_index] + hex_bytes + [''] * (max_bytes - len(hex_bytes)))
+            count += 1
+
+    return count
+
+def write_compact_csv(log_path, csv_path):
+    """
+    One row per packet: index, length and the bytes as a single hex string.
+    """
+    count = 0
+
+    with open(csv_path, 'w', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(['PacketIndex', 'Length', 'Bytes'])
+
+        for pkt_index, hex_bytes in iter_packets(log_path):
+            writer.writerow([pkt_index, len(hex_bytes), ''.join(hex_bytes)])
+            count += 1
+
+    return count
+
+def write_npz(log_path, npz_path):
+    """
+    Ragged NPZ: all packet bytes concatenated in 'data', with per-packet
+    'index', 'offset' and 'length' arrays. Packet i is
+    data[offset[i]:offset[i] + length[i]].
+    """
+    import numpy as np
+
+    data = bytearray()
+    indexes = array('I')
+    offsets = array('Q')
+    lengths = array('H')
+
+    for pkt_index, hex_bytes in iter_packets(log_path):
+        indexes.append(int(pkt_index))
+        offsets.append(len(data))
+        lengths.append(len(hex_bytes))
+        data += bytes.fromhex(''.join(hex_bytes))
+
+    np.savez_compressed(
+        npz_path,
+        index=np.frombuffer(indexes, dtype=np.uint32),
+        offset=np.frombuffer(offsets, dtype=np.uint64),
+        length=np.frombuffer(lengths, dtype=np.uint16),
+        data=np.frombuffer(bytes(data), dtype=np.uint8),
+    )
+    return len(lengths)
+
+WRITERS = {
+    'compact': (write_compact_csv, '_packets_compact.csv'),
+    'npz': (write_npz, '_packets.npz'),
+    'wide': (write_wide_csv, '_packets.csv'),
+}
+
+def output_path(log_path, output_format='compact', out_dir=None):
+    """
+    Where a capture's conversion goes: next to the capture, or in out_dir
+    prefixed with the capture's folder name (preprocessing/1.txt and
+    read/pairwise/1.txt would otherwise both become 1_packets...).
+    """
+    _, suffix = WRITERS[output_format]
+    name = os.path.splitext(os.path.basename(log_path))[0]
+    if not out_dir:
+        return os.path.join(os.path.dirname(log_path), name + suffix)
+    folder = os.path.basename(os.path.dirname(os.path.abspath(log_path)))
+    return os.path.join(out_dir, f'{folder}_{name}{suffix}')
+
+def convert_file(log_path, output_format='compact', out_dir=None):
+    """
+    Convert one capture. Returns (log_path, out_path, packet_count).
+    """
+    writer, _ = WRITERS[output_format]
+    out_path = output_path(log_path, output_format, out_dir)
+    return log_path, out_path, writer(log_path, out_path)
+
+def collect_logs(paths):
+    """
+    Expand directories into their .txt captures.
+    """
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            logs.extend(os.path.join(path, f) for f in sorted(get_txt_files(path)))
+        else:
+            logs.append(path)
+    return logs
+
+def run_batch(paths, output_format='compact', out_dir=None, workers=None):
+    """
+    Convert every capture under paths in parallel, one file per worker task.
+    """
+    logs = collect_logs(paths)
+    if not logs:
+        print("No .txt files found.")
+        return []
+
+    # Two captures must never be written to the same file by parallel workers
+    targets = {}
+    for log in logs:
+        out_path = os.path.abspath(output_path(log, output_format, out_dir))
+        if out_path in targets:
+            raise SystemExit(f"{log} and {targets[out_path]} would both be written to {out_path}")
+        targets[out_path] = log
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(convert_file, log, output_format, out_dir) for log in logs]
+        for future in futures:
+            log_path, out_path, count = future.result()
+            print(f"{log_path} -> {out_path}: {count} packets")
+            results.append((log_path, out_path, count))
+
+    print(f"Converted {len(results)} files, {sum(r[2] for r in results)} packets.")
+    return results
+
+def interactive():
     dir_path = '.'  # current directory, or specify your 'preprocessing' folder here
     files = get_txt_files(dir_path)
     if not files:
@@ -22,36 +182,26 @@ def main():
         return
 
     log_file = files[int(choice)-1]
-    csv_file = os.path.splitext(log_file)[0] + "_packets.csv"
-
-    pattern = re.compile(r'\[(\d+)\]\s+\[\d+\]\s+HEX:\s+((?:[0-9a-fA-F]{2}(?:\s)?)+)')
+    _, csv_file, count = convert_file(os.path.join(dir_path, log_file), 'wide')
 
-    max_bytes = 0
-    rows = []
+    print(f"CSV file '{os.path.basename(csv_file)}' created with {count} packets.")
 
-    # Read lines, parse and store data in memory first to determine max bytes length
-    with open(os.path.join(dir_path, log_file), 'r') as f_in:
-        for line in f_in:
-            match = pattern.search(line)
-            if match:
-                pkt_index = match.group(1)
-                hex_bytes = match.group(2).strip().split()
-                rows.append([pkt_index] + hex_bytes)
-                if len(hex_bytes) > max_bytes:
-                    max_bytes = len(hex_bytes)
-
-    # Write CSV
-    with open(os.path.join(dir_path, csv_file), 'w', newline='') as f_out:
-        writer = csv.writer(f_out)
-        header = ['PacketIndex'] + [f'Byte{i+1}' for i in range(max_bytes)]
-        writer.writerow(header)
+def main():
+    if len(sys.argv) == 1:
+        interactive()
+        return
 
-        for row in rows:
-            # Pad row with empty strings if shorter than max_bytes
-            row += [''] * (max_bytes - (len(row)-1))
-            writer.writerow(row)
+    parser = argparse.ArgumentParser(description="Convert HEX capture logs to packet tables.")
+    parser.add_argument('paths', nargs='*', help="capture files or directories (default: the PEDRO capture folders)")
+    parser.add_argument('--all', action='store_true', help="convert the PEDRO capture folders without prompting")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='compact', help="output layout (default: compact)")
+    parser.add_argument('--out-dir', help="write outputs here instead of next to each capture")
+    parser.add_argument('--workers', type=int, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args()
 
-    print(f"CSV file '{csv_file}' created with {len(rows)} packets.")
+    if not args.paths and not args.all:
+        parser.error("give capture paths, or --all for the PEDRO capture folders")
+    run_batch(args.paths + (DEFAULT_DIRS if args.all else []), args.format, args.out_dir, args.workers)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,251 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from checksums import FrameChecksum
+from read import PACKET_TYPE_IDS, SERIAL_PORT, PacketDetector, baud_rates
+
+# Seconds of traffic sampled per candidate rate
+SAMPLE_SECONDS = 1.0
+# A rate scoring at least this much is locked onto without trying the rest
+LOCK_SCORE = 0.9
+# Fewer bytes than this is not enough to judge a rate
+MIN_SAMPLE_BYTES = 64
+# Bytes handed to the detector per read when sweeping a capture offline
+SIMULATED_READ_SIZE = 64
+
+_PARTIAL_TYPE = PACKET_TYPE_IDS["partial_28byte"]
+_SINGLE_TYPE = PACKET_TYPE_IDS["single_byte"]
+
+def score_sample(chunks, checksum=None):
+    """
+    Frame a sample with PacketDetector and score how well it frames.
+
+    Bytes inside complete packets count fully, bytes inside partial 28-byte
+    frames count half; single control bytes and discarded bytes count
+    nothing, since a wrong rate mostly turns the line into 0x00/0xFF noise.
+    With a checksum (a checksums.FrameChecksum) the score is the mean of that
+    and the share of checked frames passing it. Returns a dict with the
+    score (0-1) and its parts.
+    """
+    detector = PacketDetector(checksum=checksum)
+    complete_bytes = partial_bytes = complete = headers = 0
+    for data in chunks:
+        for packet in detector.add_data(data):
+            if packet.type_id == _SINGLE_TYPE:
+                continue
+            if packet.type_id == _PARTIAL_TYPE:
+                partial_bytes += packet.size
+                headers += 1
+            else:
+                complete_bytes += packet.size
+                complete += 1
+                headers += packet.type_id != PACKET_TYPE_IDS["be_fe_command"]
+
+    stats = detector.get_stats()
+    total = stats["total_bytes"]
+    if total < MIN_SAMPLE_BYTES:
+        return {"score": 0.0, "bytes": total, "framed": 0.0, "partial": 0.0,
+                "header_hits": headers, "terminator_valid": 0.0, "discarded": 0.0, "checksum": None}
+    framed = complete_bytes / total
+    partial = partial_bytes / total
+    score = framed + 0.5 * partial
+    checked = stats["checksum_passed"] + stats["checksum_failed"]
+    checksum_rate = stats["checksum_passed"] / checked if checked else None
+    if checksum is not None:
+        score = (score + (checksum_rate or 0.0)) / 2
+    return {
+        "score": score,
+        "bytes": total,
+        "framed": framed,
+        "partial": partial,
+        "header_hits": headers,
+        "terminator_valid": complete / (complete + stats["partial_packets"]) if complete else 0.0,
+        "discarded": stats["discarded_bytes"] / total,
+        "checksum": checksum_rate,
+    }
+
+def sample_port(port, baudrate, seconds=SAMPLE_SECONDS):
+    """Read the line at baudrate for seconds. Returns the chunks read."""
+    import serial
+
+    chunks = []
+    with serial.Serial(port, baudrate=baudrate, timeout=0.05) as ser:
+        ser.reset_input_buffer()  # Drop what was received at the previous rate
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            data = ser.read(ser.in_waiting or 1)
+            if data:
+                chunks.append(data)
+    return chunks
+
+# Scores this close to the best count as a tie
+TIE_MARGIN = 0.01
+
+def _rank(results):
+    return sorted(results, key=lambda item: item[1]["score"], reverse=True)
+
+def pick_rate(ranked, margin=TIE_MARGIN):
+    """
+    The rate to lock onto. A UART tolerates a few percent of clock error,
+    so the best score is usually shared by a band of neighbouring rates;
+    take the middle of that band, the rate with the most margin both ways.
+    """
+    top = ranked[0][1]["score"]
+    tied = sorted(rate for rate, result in ranked if result["score"] >= top - margin)
+    return tied[len(tied) // 2]
+
+def neighbours(baudrate, span=0.02, steps=4):
+    """Rates within +/-span of baudrate, for refining a coarse pick."""
+    return [round(baudrate * (1 + span * i / steps)) for i in range(-steps, steps + 1) if i]
+
+def detect_baud(port, candidates=baud_rates, seconds=SAMPLE_SECONDS, lock_score=LOCK_SCORE,
+                refine=True, verbose=True, checksum=None):
+    """
+    Sample the line at every candidate rate and return (rate, results)
+    where results is [(rate, score dict)] best first and rate is the one
+    picked by pick_rate. Stops early on a rate scoring lock_score or more;
+    with refine, rates around the best one are tried as well (the bike's
+    rate is not necessarily in the table). checksum is passed on to
+    score_sample.
+    """
+    results = []
+
+    def measure(rate):
+        try:
+            result = score_sample(sample_port(port, rate, seconds), checksum)
+        except Exception as e:
+            if verbose:
+                print(f"  {rate:>8}: unusable ({e})")
+            return None
+        results.append((rate, result))
+        if verbose:
+            print(f"  {rate:>8}: score {result['score']:.3f} ({result['bytes']} bytes, "
+                  f"{result['header_hits']} headers, {result['discarded']:.0%} discarded)")
+        return result
+
+    for rate in candidates:
+        result = measure(rate)
+        if result and result["score"] >= lock_score:
+            break
+
+    if not results:
+        return None, results
+    best = pick_rate(_rank(results))
+    if refine and _rank(results)[0][1]["score"] > 0:
+        tried = {rate for rate, _ in results}
+        for rate in neighbours(best):
+            if rate not in tried:
+                measure(rate)
+    ranked = _rank(results)
+    return pick_rate(ranked), ranked
+
+# Offline sweeps: re-time a capture bit by bit to see what it would have
+# looked like when sampled at another rate.
+
+def uart_bits(chunks, idle_bits=20):
+    """8N1 line levels for chunks, with idle_bits of idle line between chunks."""
+    bits = bytearray()
+    for data in chunks:
+        for byte in data:
+            bits.append(0)  # Start bit
+            bits.extend((byte >> i) & 1 for i in range(8))
+            bits.append(1)  # Stop bit
+        bits.extend(b"\x01" * idle_bits)
+    return bits
+
+def resample(bits, ratio):
+    """
+    Decode 8N1 line levels with a receiver whose bit time is ratio source
+    bits long (source rate / receiver rate), the way a UART clocked at the
+    wrong rate would: wait for a falling edge, then sample mid-bit.
+    """
+    out = bytearray()
+    n = len(bits)
+    i = 0
+    while True:
+        # Wait for the line to be idle, then for the start bit
+        while i < n and not bits[i]:
+            i += 1
+        while i < n and bits[i]:
+            i += 1
+        if i >= n:
+            break
+        start = i
+        if bits[min(n - 1, int(start + 0.5 * ratio))]:
+            i = start + 1
+            continue  # Glitch, not a start bit
+        end = int(start + 9.5 * ratio)
+        if end >= n:
+            break
+        byte = 0
+        for k in range(8):
+            byte |= bits[int(start + (k + 1.5) * ratio)] << k
+        out.append(byte)
+        i = end
+    return bytes(out)
+
+def _score_resampled(bits, source_rate, rate, checksum=None):
+    data = resample(bits, source_rate / rate)
+    # Fed a read at a time, like the port would deliver it
+    chunks = [data[i:i + SIMULATED_READ_SIZE] for i in range(0, len(data), SIMULATED_READ_SIZE)]
+    return rate, score_sample(chunks, checksum)
+
+def sweep_capture(chunks, source_rate, candidates=baud_rates, workers=None, checksum=None):
+    """
+    Score every candidate rate against a capture taken at source_rate,
+    in parallel. Returns [(rate, score dict)] best first.
+    """
+    bits = uart_bits(chunks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_score_resampled, bits, source_rate, rate, checksum) for rate in candidates]
+        return _rank([future.result() for future in futures])
+
+def print_ranking(ranked, top=10):
+    print(f"{'Baud':>8} {'Score':>7} {'Framed':>7} {'Partial':>8} {'Headers':>8} {'Discard':>8} {'Checksum':>9}")
+    for rate, result in ranked[:top]:
+        checksum = "-" if result["checksum"] is None else f"{result['checksum']:.1%}"
+        print(f"{rate:>8} {result['score']:>7.3f} {result['framed']:>7.1%} {result['partial']:>8.1%} "
+              f"{result['header_hits']:>8} {result['discarded']:>8.1%} {checksum:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the line's baud rate by how well PacketDetector frames it.")
+    parser.add_argument('--port', default=SERIAL_PORT)
+    parser.add_argument('--seconds', type=float, default=SAMPLE_SECONDS, help="sample length per rate")
+    parser.add_argument('--no-refine', action='store_true', help="only try the rates in the table")
+    parser.add_argument('--simulate', metavar='LOG',
+                        help="sweep a capture offline instead of the port (re-timed bit by bit)")
+    parser.add_argument('--source-baud', type=int, help="rate LOG was captured at (default: the logged one)")
+    parser.add_argument('--workers', type=int, help="processes for --simulate")
+    parser.add_argument('--checksum', type=FrameChecksum.parse, metavar="'ALGORITHM FIRST-LAST POSITION'",
+                        help="also score by the share of frames passing this checksum (as check/checksum.py prints it)")
+    args = parser.parse_args()
+
+    if args.simulate:
+        from replay import load_chunks
+
+        source_rate, chunks = load_chunks(args.simulate)
+        source_rate = args.source_baud or source_rate
+        candidates = sorted(set(baud_rates) | set(neighbours(source_rate)))
+        # A few thousand bytes are plenty to tell the rates apart
+        sample, size = [], 0
+        for _, data in chunks:
+            sample.append(data)
+            size += len(data)
+            if size >= 8192:
+                break
+        ranked = sweep_capture(sample, source_rate, candidates, args.workers, args.checksum)
+    else:
+        print(f"Sampling {args.port} for {args.seconds}s per rate...")
+        _, ranked = detect_baud(args.port, seconds=args.seconds, refine=not args.no_refine,
+                                checksum=args.checksum)
+
+    if not ranked:
+        print("No rate could be sampled.")
+        return
+    print()
+    print_ranking(ranked)
+    print(f"\nBest rate: {pick_rate(ranked)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import select
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eave', 'receive'))
+from read import PacketDetector, PACKET_HEADER, PACKET_TERMINATOR, SINGLE_BYTE_VALUES
+from scheduler import RateScheduler, send_schedule, wait_until
+
+# 8N1: 10 bit times per byte on the wire
+BITS_PER_BYTE = 10
+READ_SIZE = 4096
+
+# Filler bytes that no framer treats as a header, marker or control byte
+NOISE_BYTES = bytes(b for b in range(256)
+                    if b not in SINGLE_BYTE_VALUES and b not in (PACKET_HEADER[0], 0xBE, 0xFE))
+LCD_COMMANDS = (0xCC, 0xC2, 0x42, 0xCE)
+
+def _open_pty():
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    return master, slave, os.ttyname(slave)
+
+def _bridge(source, sink, baudrate):
+    """
+    Copy source -> sink, releasing the bytes no faster than a UART at
+    baudrate would put them on the wire (baudrate 0: unpaced).
+    """
+    byte_ns = BITS_PER_BYTE * 1_000_000_000 // baudrate if baudrate else 0
+    # Release in slices of about 2 ms of line time
+    slice_size = max(1, 2_000_000 // byte_ns) if byte_ns else READ_SIZE
+    line_free_ns = 0
+    while True:
+        try:
+            data = os.read(source, READ_SIZE)
+        except OSError:
+            return
+        if not data:
+            return
+        if not byte_ns:
+            os.write(sink, data)
+            continue
+        line_free_ns = max(line_free_ns, time.monotonic_ns())
+        for i in range(0, len(data), slice_size):
+            piece = data[i:i + slice_size]
+            line_free_ns += len(piece) * byte_ns
+            wait_until(line_free_ns, 0)
+            os.write(sink, piece)
+
+class VirtualLine:
+    """
+    Two pty pairs joined by a bridge process that paces the bytes at the
+    configured baud rate: whatever is written to tx_port arrives on
+    rx_port the way it would over a real UART, with no hardware.
+    The bridge runs in its own process so it does not compete with the
+    code under test for the GIL.
+    """
+
+    def __init__(self, baudrate):
+        self.baudrate = baudrate
+        self.tx_master, self.tx_slave, self.tx_port = _open_pty()
+        self.rx_master, self.rx_slave, self.rx_port = _open_pty()
+        self.process = multiprocessing.get_context('fork').Process(
+            target=_bridge, args=(self.tx_master, self.rx_master, baudrate), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.process.terminate()
+        self.process.join()
+        for fd in (self.tx_master, self.tx_slave, self.rx_master, self.rx_slave):
+            os.close(fd)
+
+    def wire_time(self, byte_count):
+        """Seconds byte_count bytes spend on the wire."""
+        return byte_count * BITS_PER_BYTE / self.baudrate if self.baudrate else 0.0
+
+class RawReceiver:
+    """
+    Reader thread on a port: hands every chunk, with its arrival time, to
+    on_chunk(timestamp_ns, data).
+    """
+
+    def __init__(self, port, on_chunk):
+        self.fd = os.open(port, os.O_RDWR | os.O_NOCTTY)
+        self.on_chunk = on_chunk
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.fd], [], [], 0.05)
+            if ready:
+                data = os.read(self.fd, READ_SIZE)
+                self.on_chunk(time.monotonic_ns(), data)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join()
+        os.close(self.fd)
+
+def parse_mix(text):
+    """'28byte:8,single:1,noise:1' -> {'28byte': 8.0, ...}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition(':')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def make_units(kind, count, mix, rng):
+    """
+    Build count units of traffic as (payload, expected) pairs. expected is
+    the frame the receiver should report for the unit, or None for noise.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    units = []
+    for name in rng.choices(names, weights, k=count):
+        if name == 'noise':
+            units.append((bytes(rng.choices(NOISE_BYTES, k=rng.randint(1, 8))), None))
+        elif kind == 'detector' and name == '28byte':
+            packet = bytes(PACKET_HEADER) + bytes(rng.choices(NOISE_BYTES, k=23)) + bytes(PACKET_TERMINATOR)
+            units.append((packet, packet))
+        elif kind == 'detector' and name == 'single':
+            units.append((b'\xff', b'\xff'))
+        elif kind == 'eave' and name == 'frame':
+            body = bytes([rng.choice(LCD_COMMANDS)]) + bytes(rng.choices(NOISE_BYTES, k=rng.randint(0, 5)))
+            packet = b'\xbe' + body + b'\xfe'
+            units.append((packet, packet))
+        else:
+            raise ValueError(f"unknown traffic type {name!r} for {kind}")
+    return units
+
+def match_packets(expected, detected):
+    """
+    Pair detected frames with the expected ones in order.
+    expected: [(sent_ns, frame)], detected: [(arrival_ns, frame)].
+    Returns (latencies_ns, dropped, unexpected).
+    """
+    latencies = []
+    unexpected = 0
+    i = 0
+    for arrival_ns, frame in detected:
+        j = i
+        while j < len(expected) and expected[j][1] != frame:
+            j += 1
+        if j == len(expected):
+            unexpected += 1
+            continue
+        latencies.append(arrival_ns - expected[j][0])
+        i = j + 1
+    return latencies, len(expected) - len(latencies), unexpected
+
+def summarize(name, baudrate, sent_bytes, chunks, packets, latencies, dropped, unexpected, extra=None):
+    received = sum(len(data) for _, data in chunks)
+    span = (chunks[-1][0] - chunks[0][0]) / 1e9 if len(chunks) > 1 else 0.0
+    latencies = sorted(latencies)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] / 1e6 if latencies else None
+
+    result = {
+        "scenario": name,
+        "baudrate": baudrate,
+        "bytes_sent": sent_bytes,
+        "bytes_received": received,
+        "packets": packets,
+        "bytes_per_second": received / span if span else 0.0,
+        "packets_per_second": packets / span if span else 0.0,
+        "latency_p50_ms": pct(0.50),
+        "latency_p95_ms": pct(0.95),
+        "latency_p99_ms": pct(0.99),
+        "latency_max_ms": latencies[-1] / 1e6 if latencies else None,
+        "dropped": dropped,
+        "unexpected": unexpected,
+    }
+    result.update(extra or {})
+    return result
+
+def _send_units(line, units, rate):
+    """Send one unit per tick at rate per second. Returns [(scheduled_ns, expected)]."""
+    scheduler = RateScheduler(rate, count=len(units))
+    with open(line.tx_port, 'wb', buffering=0) as out:
+        send_schedule(out, scheduler, [payload for payload, _ in units], progress_every=0)
+    return [(scheduler.start_ns + n * scheduler.interval_ns, expected)
+            for n, (_, expected) in enumerate(units) if expected is not None]
+
+def run_detector(baudrate, rate, count, mix, seed=0):
+    """read.PacketDetector behind a reader thread, fed by generated traffic."""
+    units = make_units('detector', count, mix, random.Random(seed))
+    units.append((NOISE_BYTES[:3], None))  # Lets the detector decide on the last unit
+    detector = PacketDetector()
+    chunks, detected = [], []
+
+    def on_chunk(timestamp_ns, data):
+        chunks.append((timestamp_ns, data))
+        for packet in detector.add_data(data):
+            if packet.type in ("28byte_standard", "single_byte"):
+                detected.append((time.monotonic_ns(), packet.data))
+
+    with VirtualLine(baudrate) as line:
+        receiver = RawReceiver(line.rx_port, on_chunk)
+        receiver.start()
+        expected = _send_units(line, units, rate)
+        time.sleep(0.5 + line.wire_time(sum(len(p) for p, _ in units)) / 10)
+        receiver.stop()
+
+    latencies, dropped, unexpected = match_packets(expected, detected)
+    return summarize('detector', baudrate, sum(len(p) for p, _ in units), chunks, len(detected),
+                     latencies, dropped, unexpected)
+
+def run_eave(baudrate, rate, count, mix, receiver='lcd', seed=0):
+    """
+    One of the eave receivers (rcv_lcd_requests / rcv_esc_responses) on
+    its own event loop, its printing discarded. Packets are timed by
+    wrapping the module's handle_byte.
+    """
+    module = importlib.import_module('rcv_lcd_requests' if receiver == 'lcd' else 'rcv_esc_responses')
+    module.packet_buffer.clear()
+    module.in_packet = False
+    module.last_frame = None
+    module.packet_counter = 0
+    module.READ_TIMEOUT = 0.5
+
+    units = make_units('eave', count, mix, random.Random(seed))
+    chunks, detected = [], []
+    handle_byte = module.handle_byte
+
+    def timed_handle_byte(current_byte, timestamp_ns):
+        if current_byte == module.END_MARKER and module.in_packet:
+            frame = b'\xbe' + bytes(module.packet_buffer) + b'\xfe'
+            handle_byte(current_byte, timestamp_ns)
+            detected.append((time.monotonic_ns(), frame))
+        else:
+            handle_byte(current_byte, timestamp_ns)
+
+    def run_receiver(port):
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(module.receive(port, baudrate or module.BAUD_RATE))
+
+    module.handle_byte = timed_handle_byte
+    try:
+        with VirtualLine(baudrate) as line:
+            thread = threading.Thread(target=run_receiver, args=(line.rx_port,), daemon=True)
+            thread.start()
+            time.sleep(0.2)  # Let the receiver open the port
+            expected = _send_units(line, units, rate)
+            thread.join()
+    finally:
+        module.handle_byte = handle_byte
+
+    # The receivers do not expose chunk times; use the packet arrivals for the rates
+    chunks = [(arrival_ns, frame) for arrival_ns, frame in detected]
+    latencies, dropped, unexpected = match_packets(expected, detected)
+    result = summarize(f'eave-{receiver}', baudrate, sum(len(p) for p, _ in units), chunks, len(detected),
+                       latencies, dropped, unexpected)
+    result["bytes_received"] = sum(len(frame) for _, frame in detected)
+    return result
+
+def run_stream(baudrate, frequency, duration, level=50, variable=False):
+    """
+    A stream.py sender writing to the virtual line; the receiver counts
+    how many of the expected packets arrived intact.
+    """
+    import stream
+
+    chunks = []
+    with VirtualLine(baudrate) as line:
+        receiver = RawReceiver(line.rx_port, lambda timestamp_ns, data: chunks.append((timestamp_ns, data)))
+        receiver.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if variable:
+                stream.send_packet_stream(line.tx_port, baudrate, duration, frequency)
+            else:
+                stream.send_constant_acceleration_stream(line.tx_port, baudrate, level, duration, frequency)
+        time.sleep(0.5)
+        receiver.stop()
+
+    scheduler = RateScheduler(frequency, duration)
+    if variable:
+        expected = [stream.create_complete_packet_stream(stream.acceleration_curve(scheduler.offset(n) / duration))
+                    for n in range(scheduler.count)]
+    else:
+        expected = [stream.create_complete_packet_stream(level)] * scheduler.count
+
+    # Every packet starts with the same fixed header: split on it and compare
+    received = b''.join(data for _, data in chunks)
+    frames = [stream.STREAM_HEADER + body for body in received.split(stream.STREAM_HEADER)[1:]]
+    found = sum(1 for frame, packet in zip(frames, expected) if frame == packet)
+    return summarize('stream-variable' if variable else 'stream-constant', baudrate, sum(map(len, expected)),
+                     chunks, found, [], len(expected) - found, max(0, len(frames) - len(expected)))
+
+def print_result(result):
+    print(f"{result['scenario']} @ {result['baudrate'] or 'unpaced'} baud")
+    print(f"  - Bytes: {result['bytes_sent']} sent, {result['bytes_received']} received "
+          f"({result['bytes_per_second']:.0f} bytes/s)")
+    print(f"  - Packets: {result['packets']} ({result['packets_per_second']:.1f} packets/s), "
+          f"{result['dropped']} dropped, {result['unexpected']} unexpected")
+    if result['latency_p50_ms'] is not None:
+        print(f"  - Latency: p50 {result['latency_p50_ms']:.3f} ms, p95 {result['latency_p95_ms']:.3f} ms, "
+              f"p99 {result['latency_p99_ms']:.3f} ms, max {result['latency_max_ms']:.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the receivers and senders over virtual UARTs (pty pairs).")
+    parser.add_argument('scenario', choices=['detector', 'eave-lcd', 'eave-esc', 'stream', 'stream-variable', 'all'])
+    parser.add_argument('--baud', type=int, default=16250, help="line rate to emulate (0: unpaced)")
+    parser.add_argument('--rate', type=float, default=50, help="units per second for generated traffic")
+    parser.add_argument('--count', type=int, default=500, help="units of generated traffic")
+    parser.add_argument('--mix', help="traffic mix, e.g. 28byte:8,single:1,noise:1 or frame:9,noise:1")
+    parser.add_argument('--frequency', type=float, default=15, help="stream.py packets per second")
+    parser.add_argument('--duration', type=float, default=5, help="stream.py run length in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print one JSON object per scenario")
+    parser.add_argument('--max-drops', type=int, help="exit with status 1 if any scenario drops more packets")
+    args = parser.parse_args()
+
+    scenarios = ['detector', 'eave-lcd', 'eave-esc', 'stream', 'stream-variable'] if args.scenario == 'all' else [args.scenario]
+    results = []
+    for scenario in scenarios:
+        if scenario == 'detector':
+            mix = parse_mix(args.mix or '28byte:8,single:1,noise:1')
+            result = run_detector(args.baud, args.rate, args.count, mix, args.seed)
+        elif scenario.startswith('eave'):
+            mix = parse_mix(args.mix or 'frame:9,noise:1')
+            result = run_eave(args.baud, args.rate, args.count, mix, scenario.split('-')[1], args.seed)
+        else:
+            result = run_stream(args.baud, args.frequency, args.duration, variable=scenario == 'stream-variable')
+        results.append(result)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_result(result)
+
+    if args.max_drops is not None and any(result['dropped'] > args.max_drops for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'eave', 'receive'))
+import read
+from replay import read_text_log
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+CORPUS_GLOBS = ('PEDRO/preprocessing/*.txt', 'PEDRO/read/pairwise/*.txt')
+
+def load_corpus(patterns=CORPUS_GLOBS):
+    """The real captures as a list of serial reads, in file order."""
+    chunks = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            chunks.extend(data for _, data in read_text_log(path))
+    return chunks
+
+def synthetic_corpus(size=200_000, noise=0.7, seed=0):
+    """
+    Noise-heavy stream: random bytes with valid 28-byte packets, BE...FE
+    commands and control bytes mixed in, cut into serial-read-sized chunks.
+    """
+    rng = random.Random(seed)
+    stream = bytearray()
+    while len(stream) < size:
+        roll = rng.random()
+        if roll < noise:
+            stream += bytes(rng.getrandbits(8) for _ in range(rng.randint(1, 16)))
+        elif roll < noise + (1 - noise) / 2:
+            stream += (bytes(read.PACKET_HEADER) + bytes(rng.getrandbits(8) for _ in range(23))
+                       + bytes(read.PACKET_TERMINATOR))
+        elif roll < 1 - (1 - noise) / 8:
+            stream += b'\xbe' + bytes([rng.choice((0xCC, 0xC2, 0x42, 0xCE))]) + b'\xfe'
+        else:
+            stream.append(rng.choice(sorted(read.SINGLE_BYTE_VALUES)))
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(1, 64)
+        chunks.append(bytes(stream[pos:pos + size]))
+        pos += size
+    return chunks
+
+# Benchmarks: name -> setup(chunks) returning a zero-argument callable that
+# processes the whole corpus once.
+
+def _detector_add_data(chunks):
+    def run():
+        detector = read.PacketDetector()
+        for data in chunks:
+            detector.add_data(data)
+    return run
+
+def _extract_28byte(chunks):
+    data = b''.join(chunks)
+    return lambda: read.extract_28byte_packets(data)
+
+def _extract_single_byte(chunks):
+    data = b''.join(chunks)
+    return lambda: read.extract_single_byte_packets(data)
+
+def _vectorized(name):
+    def setup(chunks):
+        import vectorized
+        data = b''.join(chunks)
+        function = getattr(vectorized, name)
+        return lambda: function(data)
+    return setup
+
+def _decode(format_type):
+    def setup(chunks):
+        return lambda: [read.decode_data(data, format_type) for data in chunks]
+    return setup
+
+def _handle_byte(chunks):
+    import rcv_lcd_requests as module
+    def run():
+        module.packet_buffer.clear()
+        module.in_packet = False
+        module.last_frame = None
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for data in chunks:
+                for current_byte in data:
+                    module.handle_byte(current_byte, 0)
+    return run
+
+def _befe_framer(chunks):
+    from sniff_bus import BeFeFramer
+    def run():
+        framer = BeFeFramer()
+        for data in chunks:
+            framer.feed(data)
+    return run
+
+BENCHMARKS = {
+    "detector.add_data": _detector_add_data,
+    "read.extract_28byte_packets": _extract_28byte,
+    "read.extract_single_byte_packets": _extract_single_byte,
+    "vectorized.extract_28byte_packets": _vectorized("extract_28byte_packets"),
+    "vectorized.extract_single_byte_packets": _vectorized("extract_single_byte_packets"),
+    "decode_data.HEX_ONLY": _decode("HEX_ONLY"),
+    "decode_data.HEX": _decode("HEX"),
+    "decode_data.RAW": _decode("RAW"),
+    "eave.handle_byte": _handle_byte,
+    "sniff_bus.BeFeFramer": _befe_framer,
+}
+
+def run_benchmarks(corpora, names, repeat=5):
+    """Time every benchmark on every corpus. Returns a list of result dicts."""
+    results = []
+    for corpus_name, chunks in corpora.items():
+        size = sum(map(len, chunks))
+        for name in names:
+            try:
+                function = BENCHMARKS[name](chunks)
+            except ImportError as e:
+                print(f"  skipped {name}: {e}")
+                continue
+            function()  # Warm up caches and lazy imports
+            times = timeit.Timer(function).repeat(repeat, number=1)
+            best = min(times)
+            results.append({
+                "benchmark": name,
+                "corpus": corpus_name,
+                "bytes": size,
+                "best_s": best,
+                "median_s": statistics.median(times),
+                "mb_per_s": size / best / 1e6 if best else 0.0,
+                "ns_per_byte": best * 1e9 / size if size else 0.0,
+            })
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_history(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous_run(history, host):
+    """The most recent recorded run on this host, as {(benchmark, corpus): result}."""
+    for run in reversed(history):
+        if run["host"] == host:
+            return {(r["benchmark"], r["corpus"]): r for r in run["results"]}
+    return {}
+
+def print_results(results, baseline):
+    print(f"{'Benchmark':<40} {'Corpus':<10} {'MB/s':>9} {'ns/byte':>9} {'vs last':>9}")
+    for r in results:
+        change = ""
+        previous = baseline.get((r["benchmark"], r["corpus"]))
+        if previous:
+            change = f"{(r['best_s'] / previous['best_s'] - 1) * 100:+.1f}%"
+        print(f"{r['benchmark']:<40} {r['corpus']:<10} {r['mb_per_s']:>9.2f} {r['ns_per_byte']:>9.1f} {change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the framing and decoding hot paths.")
+    parser.add_argument('-k', '--filter', help="only run benchmarks whose name contains this")
+    parser.add_argument('--corpus', choices=['pedro', 'synthetic', 'all'], default='all')
+    parser.add_argument('--noise', type=float, default=0.7, help="share of noise in the synthetic stream")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-save', action='store_true', help=f"do not append the run to {os.path.basename(RESULTS_FILE)}")
+    parser.add_argument('--fail-over', type=float, metavar='PCT',
+                        help="exit with status 1 if any benchmark is more than PCT%% slower than the last run")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    corpora = {}
+    if args.corpus in ('pedro', 'all'):
+        corpora["pedro"] = load_corpus()
+    if args.corpus in ('synthetic', 'all'):
+        corpora["synthetic"] = synthetic_corpus(noise=args.noise)
+
+    host = platform.node()
+    history = load_history()
+    baseline = previous_run(history, host)
+
+    results = run_benchmarks(corpora, names, args.repeat)
+    print_results(results, baseline)
+
+    if not args.no_save:
+        run = {
+            "time": datetime.datetime.now().isoformat(timespec='seconds'),
+            "revision": git_revision(),
+            "host": host,
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(RESULTS_FILE, 'a') as f:
+            f.write(json.dumps(run) + "\n")
+
+    if args.fail_over is not None:
+        regressions = [r for r in results
+                       if (r["benchmark"], r["corpus"]) in baseline
+                       and r["best_s"] > baseline[(r["benchmark"], r["corpus"])]["best_s"] * (1 + args.fail_over / 100)]
+        for r in regressions:
+            print(f"Regression: {r['benchmark']} on {r['corpus']}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+import argparse
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+
+# Binary capture layout (all little-endian):
+#
+#   file header   MAGIC, version, baud rate, wall-clock start time
+#   records       record header + payload, appended as data arrives
+#   footer        type table records, packet index entries, trailer
+#                 (written on close)
+#
+# Timestamps are nanoseconds since the start of the capture, taken from a
+# monotonic clock. If a capture is cut short (no trailer), readers rebuild
+# the index by walking the records.
+
+MAGIC = b"UARTCAP1"
+TRAILER_MAGIC = b"UARTIDX1"
+VERSION = 1
+
+FILE_HEADER = struct.Struct("<8sHId")       # magic, version, baud, start (time.time())
+RECORD_HEADER = struct.Struct("<BHQI")      # kind, type id, timestamp ns, payload length
+INDEX_ENTRY = struct.Struct("<QQHI")        # payload offset, timestamp ns, type id, length
+TRAILER = struct.Struct("<QQIQ8s")          # type table offset, index offset, packet count, chunk count, magic
+
+# Record kinds
+RECORD_CHUNK = 1      # raw bytes as returned by one serial read
+RECORD_PACKET = 2     # framed packet (type id refers to the type table)
+RECORD_TYPE = 3       # type table entry: payload is the packet type name
+
+# Run-length captures: the same file header with RLE_MAGIC and
+# RLE_VERSION, then FRAME and RUN/ONCE records in stream order. Every
+# distinct frame is stored once, the first time it is seen, as a patch on
+# the closest of the last RLE_BASES distinct run frames (the bytes it
+# shares with it at the start and at the end are not repeated). The
+# stream is the sequence of runs: frame id, repeat count, ns since the
+# previous run started and the frame period.
+
+RLE_MAGIC = b"UARTRLE1"
+RLE_VERSION = 2
+
+RLE_FRAME = struct.Struct("<BBBBB")         # kind, base (runs back), bytes kept from its start / end, new bytes (follow)
+RLE_RUN = struct.Struct("<BIIqI")           # kind, frame id, repeat count, timestamp delta ns, frame period ns
+RLE_ONCE = struct.Struct("<BII")            # kind, frame id, timestamp delta ns (a run of one frame)
+
+RECORD_FRAME = 4      # frame dictionary entry
+RECORD_RUN = 5        # run of one frame repeated back to back
+RECORD_ONCE = 6       # frame sent once
+
+# Frames start at this header; anything longer than RLE_MAX_FRAME is cut
+RLE_FRAME_HEADER = b"\x30\x36\x26"
+RLE_MAX_FRAME = 255
+RLE_BASES = 16       # Recent run frames a new frame can be patched onto
+
+def _recent(frames, frame):
+    """Move frame to the front of the most-recent-first list frames, keeping RLE_BASES."""
+    if frame in frames:
+        frames.remove(frame)
+    frames.insert(0, frame)
+    del frames[RLE_BASES:]
+
+def _shared_ends(a, b):
+    """Bytes a and b share at the start and (in what is left) at the end."""
+    limit = min(len(a), len(b))
+    start = 0
+    while start < limit and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < limit - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    return start, end
+
+class CaptureWriter:
+    """
+    Append-only writer for binary captures.
+
+    Index entries are spooled to a temporary file rather than kept in
+    memory, so memory use stays flat however long the capture runs.
+    """
+
+    def __init__(self, path, baudrate=0):
+        self.file = open(path, "wb")
+        self.start_ns = time.monotonic_ns()
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, baudrate, time.time()))
+        self.type_ids = {}
+        self.index = tempfile.TemporaryFile()
+        self.packet_count = 0
+        self.chunk_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _timestamp(self, timestamp_ns):
+        if timestamp_ns is None:
+            return time.monotonic_ns() - self.start_ns
+        return timestamp_ns
+
+    def _write_record(self, kind, type_id, timestamp_ns, payload):
+        self.file.write(RECORD_HEADER.pack(kind, type_id, timestamp_ns, len(payload)))
+        offset = self.file.tell()
+        self.file.write(payload)
+        return offset
+
+    def _type_id(self, packet_type):
+        type_id = self.type_ids.get(packet_type)
+        if type_id is None:
+            type_id = len(self.type_ids)
+            self.type_ids[packet_type] = type_id
+            self._write_record(RECORD_TYPE, type_id, 0, packet_type.encode())
+        return type_id
+
+    def write_chunk(self, data, timestamp_ns=None):
+        """Record one raw serial read."""
+        self._write_record(RECORD_CHUNK, 0, self._timestamp(timestamp_ns), data)
+        self.chunk_count += 1
+
+    def write_packet(self, packet_type, data, timestamp_ns=None):
+        """Record one framed packet and add it to the index."""
+        type_id = self._type_id(packet_type)
+        timestamp_ns = self._timestamp(timestamp_ns)
+        offset = self._write_record(RECORD_PACKET, type_id, timestamp_ns, data)
+        self.index.write(INDEX_ENTRY.pack(offset, timestamp_ns, type_id, len(data)))
+        self.packet_count += 1
+
+    def close(self):
+        """Write the footer index and close the file."""
+        if self.file.closed:
+            return
+        types_offset = self.file.tell()
+        for packet_type, type_id in self.type_ids.items():
+            self._write_record(RECORD_TYPE, type_id, 0, packet_type.encode())
+        index_offset = self.file.tell()
+        self.index.seek(0)
+        shutil.copyfileobj(self.index, self.file)
+        self.index.close()
+        self.file.write(TRAILER.pack(types_offset, index_offset, self.packet_count, self.chunk_count, TRAILER_MAGIC))
+        self.file.close()
+
+class RunLengthWriter:
+    """
+    Writer for run-length captures, a drop-in for CaptureWriter.
+
+    The byte stream is cut into frames at RLE_FRAME_HEADER. Each frame is
+    looked up in a dictionary of the frames seen so far, and consecutive
+    repeats are stored as one run. A new frame is stored as a patch on the
+    closest recent run frame, so a frame that differs only in a few
+    varying bytes costs those bytes, and a frame sent once costs a short
+    ONCE record. The expanded stream is byte for byte the one written. Read
+    boundaries are not kept; each run keeps the arrival time of the read
+    that completed its first frame and the mean period of its frames.
+    """
+
+    def __init__(self, path, baudrate=0, header=RLE_FRAME_HEADER, max_frame=RLE_MAX_FRAME):
+        self.file = open(path, "wb")
+        self.start_ns = time.monotonic_ns()
+        self.file.write(FILE_HEADER.pack(RLE_MAGIC, RLE_VERSION, baudrate, time.time()))
+        self.header = header
+        self.max_frame = max_frame
+        self.frame_ids = {}
+        self.pending = bytearray()
+        self.bases = [b""]          # Recent run frames, most recent first; new frames are patched onto one
+        self.run_frame = None
+        self.run_id = None
+        self.run_count = 0
+        self.run_ns = 0
+        self.run_last_ns = 0
+        self.previous_run_ns = 0
+        self.last_ns = 0
+        self.frame_count = 0
+        self.runs_written = 0
+        self.byte_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _timestamp(self, timestamp_ns):
+        if timestamp_ns is None:
+            return time.monotonic_ns() - self.start_ns
+        return timestamp_ns
+
+    def write_chunk(self, data, timestamp_ns=None):
+        """Add one serial read to the stream."""
+        timestamp_ns = self.last_ns = self._timestamp(timestamp_ns)
+        self.byte_count += len(data)
+        pending = self.pending
+        pending += data
+        start = 0
+        while True:
+            end = pending.find(self.header, start + 1)
+            if end == -1 or end - start > self.max_frame:
+                if len(pending) - start <= self.max_frame:
+                    break
+                end = start + self.max_frame
+            self._add_frame(bytes(pending[start:end]), timestamp_ns)
+            start = end
+        del pending[:start]
+
+    def write_packet(self, packet_type, data, timestamp_ns=None):
+        """Packets are not stored: they are framed again from the expanded stream."""
+
+    def _add_frame(self, frame, timestamp_ns):
+        self.frame_count += 1
+        if frame == self.run_frame and self.run_count < 0xFFFFFFFF:
+            self.run_count += 1
+            self.run_last_ns = timestamp_ns
+            return
+        # The run is closed first so the reader knows the frames a new one can be patched onto
+        self._end_run()
+        frame_id = self.frame_ids.get(frame)
+        if frame_id is None:
+            frame_id = len(self.frame_ids)
+            self.frame_ids[frame] = frame_id
+            shared = [_shared_ends(base, frame) for base in self.bases]
+            back = max(range(len(shared)), key=lambda index: sum(shared[index]))
+            keep_start, keep_end = shared[back]
+            self.file.write(RLE_FRAME.pack(RECORD_FRAME, back, keep_start, keep_end,
+                                           len(frame) - keep_start - keep_end))
+            self.file.write(frame[keep_start:len(frame) - keep_end])
+        self.run_frame, self.run_id, self.run_count = frame, frame_id, 1
+        self.run_ns = self.run_last_ns = timestamp_ns
+
+    def _end_run(self):
+        if self.run_id is None:
+            return
+        delta_ns = self.run_ns - self.previous_run_ns
+        if self.run_count == 1 and 0 <= delta_ns <= 0xFFFFFFFF:
+            self.file.write(RLE_ONCE.pack(RECORD_ONCE, self.run_id, delta_ns))
+        else:
+            period_ns = (self.run_last_ns - self.run_ns) // (self.run_count - 1) if self.run_count > 1 else 0
+            self.file.write(RLE_RUN.pack(RECORD_RUN, self.run_id, self.run_count, delta_ns,
+                                         min(period_ns, 0xFFFFFFFF)))
+        self.previous_run_ns = self.run_ns
+        _recent(self.bases, self.run_frame)
+        self.runs_written += 1
+        self.run_frame = self.run_id = None
+
+    def close(self):
+        """
+        Store the frame still being assembled and the open run, then close
+        the file. read.py calls this from a finally block, so the file is
+        closed even if flushing fails.
+        """
+        if self.file.closed:
+            return
+        try:
+            if self.pending:
+                self._add_frame(bytes(self.pending), self.last_ns)
+                self.pending.clear()
+            self._end_run()
+        finally:
+            self.file.close()
+
+class RunLengthReader:
+    """
+    Reader for run-length captures. expand() yields every frame, spread
+    over its run at the run's frame period, and stream() returns the
+    original bytes. A capture cut short loses only the run that was still
+    open.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, self.version, self.baudrate, self.start_time = FILE_HEADER.unpack_from(data, 0)
+        if magic != RLE_MAGIC:
+            raise ValueError(f"{path} is not a run-length capture")
+        if self.version != RLE_VERSION:
+            raise ValueError(f"{path} is run-length capture version {self.version}, expected {RLE_VERSION}")
+
+        self.frames = []
+        self.run_ids = array("I")
+        self.run_counts = array("I")
+        self.run_times = array("q")
+        self.run_periods = array("I")
+        bases = [b""]
+        timestamp_ns = 0
+        pos = FILE_HEADER.size
+        while pos < len(data):
+            kind = data[pos]
+            if kind == RECORD_FRAME and pos + RLE_FRAME.size <= len(data):
+                _, back, keep_start, keep_end, length = RLE_FRAME.unpack_from(data, pos)
+                pos += RLE_FRAME.size
+                if pos + length > len(data) or back >= len(bases):
+                    break  # Truncated or corrupted record
+                base = bases[back]
+                self.frames.append(base[:keep_start] + data[pos:pos + length] + base[len(base) - keep_end:])
+                pos += length
+                continue
+            if kind == RECORD_RUN and pos + RLE_RUN.size <= len(data):
+                _, frame_id, count, delta_ns, period_ns = RLE_RUN.unpack_from(data, pos)
+                pos += RLE_RUN.size
+            elif kind == RECORD_ONCE and pos + RLE_ONCE.size <= len(data):
+                _, frame_id, delta_ns = RLE_ONCE.unpack_from(data, pos)
+                count, period_ns = 1, 0
+                pos += RLE_ONCE.size
+            else:
+                break  # Truncated or unknown record
+            if frame_id >= len(self.frames):
+                break  # Corrupted record
+            timestamp_ns += delta_ns
+            _recent(bases, self.frames[frame_id])
+            self.run_ids.append(frame_id)
+            self.run_counts.append(count)
+            self.run_times.append(timestamp_ns)
+            self.run_periods.append(period_ns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def __len__(self):
+        """Number of frames in the stream (not distinct frames)."""
+        return sum(self.run_counts)
+
+    def runs(self):
+        """Iterate over (timestamp_ns, frame, repeat count, frame period ns)."""
+        frames = self.frames
+        for frame_id, count, timestamp_ns, period_ns in zip(self.run_ids, self.run_counts, self.run_times,
+                                                            self.run_periods):
+            yield timestamp_ns, frames[frame_id], count, period_ns
+
+    def expand(self):
+        """Iterate over (timestamp_ns, frame) for every frame of the stream."""
+        for timestamp_ns, frame, count, period_ns in self.runs():
+            for repeat in range(count):
+                yield timestamp_ns + repeat * period_ns, frame
+
+    def stream(self):
+        """The original byte stream."""
+        return b"".join(frame * count for _, frame, count, _ in self.runs())
+
+def is_run_length_capture(path):
+    with open(path, "rb") as f:
+        return f.read(len(RLE_MAGIC)) == RLE_MAGIC
+
+def to_run_length(source_path, rle_path, baudrate=None):
+    """
+    Convert a binary capture or a text log to a run-length capture.
+    Returns (bytes, frames, distinct frames, runs).
+    """
+    from replay import load_chunks
+
+    baudrate, chunks = load_chunks(source_path, baudrate)
+    with RunLengthWriter(rle_path, baudrate or 0) as writer:
+        for timestamp_ns, data in chunks:
+            writer.write_chunk(data, timestamp_ns)
+    return writer.byte_count, writer.frame_count, len(writer.frame_ids), writer.runs_written
+
+class CaptureReader:
+    """
+    Memory-mapped reader for binary captures with random access to packets.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.baudrate, self.start_time = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary capture")
+
+        self.packet_types = {}
+        self._index = None
+
+        if len(self.map) >= FILE_HEADER.size + TRAILER.size:
+            types_offset, index_offset, count, chunks, trailer_magic = TRAILER.unpack_from(
+                self.map, len(self.map) - TRAILER.size)
+            if trailer_magic == TRAILER_MAGIC:
+                self.records_end = types_offset
+                self.index_offset = index_offset
+                self.packet_count = count
+                self.chunk_count = chunks
+                for kind, type_id, _, offset, length in self._records(types_offset, index_offset):
+                    self.packet_types[type_id] = self.map[offset:offset + length].decode()
+                return
+
+        # No trailer: the capture was interrupted, rebuild the index in memory
+        self.records_end = len(self.map)
+        self._index = []
+        self.chunk_count = 0
+        for kind, type_id, timestamp_ns, offset, length in self._records():
+            if kind == RECORD_PACKET:
+                self._index.append((offset, timestamp_ns, type_id, length))
+            elif kind == RECORD_CHUNK:
+                self.chunk_count += 1
+            elif kind == RECORD_TYPE:
+                self.packet_types[type_id] = self.map[offset:offset + length].decode()
+        self.packet_count = len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.packet_count
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _records(self, start=FILE_HEADER.size, end=None):
+        """Yield (kind, type_id, timestamp_ns, payload_offset, length) for every record."""
+        end = self.records_end if end is None else end
+        pos = start
+        while pos + RECORD_HEADER.size <= end:
+            kind, type_id, timestamp_ns, length = RECORD_HEADER.unpack_from(self.map, pos)
+            pos += RECORD_HEADER.size
+            if pos + length > end:
+                break  # Truncated final record
+            yield kind, type_id, timestamp_ns, pos, length
+            pos += length
+
+    def _entry(self, i):
+        if self._index is not None:
+            return self._index[i]
+        return INDEX_ENTRY.unpack_from(self.map, self.index_offset + i * INDEX_ENTRY.size)
+
+    def packet(self, i):
+        """Return (timestamp_ns, packet_type, data) for packet i."""
+        if i < 0:
+            i += self.packet_count
+        if not 0 <= i < self.packet_count:
+            raise IndexError("packet index out of range")
+        offset, timestamp_ns, type_id, length = self._entry(i)
+        return timestamp_ns, self.packet_types.get(type_id, str(type_id)), self.map[offset:offset + length]
+
+    def packets(self, packet_type=None):
+        """Iterate over (timestamp_ns, packet_type, data), optionally of one type."""
+        for i in range(self.packet_count):
+            entry = self.packet(i)
+            if packet_type is None or entry[1] == packet_type:
+                yield entry
+
+    def chunks(self):
+        """Iterate over the raw serial reads as (timestamp_ns, data)."""
+        for kind, _, timestamp_ns, offset, length in self._records():
+            if kind == RECORD_CHUNK:
+                yield timestamp_ns, self.map[offset:offset + length]
+
+def to_text_log(capture_path, log_path, formats=("HEX_ONLY",)):
+    """
+    Regenerate the legacy read.py text log from a binary capture.
+    """
+    from read import decode_data
+
+    with CaptureReader(capture_path) as reader, open(log_path, "w") as log:
+        for line_counter, (_, data) in enumerate(reader.chunks(), 1):
+            for format_name in formats:
+                decoded_data = decode_data(data, format_name)
+                log.write(f"[{line_counter:04d}] [{reader.baudrate}] {format_name}: {decoded_data}\n")
+        return reader.chunk_count
+
+def print_run_length_summary(capture_path):
+    with RunLengthReader(capture_path) as reader:
+        stream_size = sum(len(frame) * count for _, frame, count, _ in reader.runs())
+        size = os.path.getsize(capture_path)
+        if size <= stream_size:
+            ratio = f"{stream_size / size if size else 0:.1f}x smaller"
+        else:
+            ratio = f"{size / stream_size if stream_size else 0:.1f}x larger"
+        print(f"Run-length capture: {capture_path}")
+        print(f"  Baud rate: {reader.baudrate}")
+        print(f"  Started: {time.ctime(reader.start_time)}")
+        print(f"  Stream: {stream_size} bytes in {len(reader)} frames")
+        print(f"  Stored: {len(reader.frames)} distinct frames, {len(reader.run_ids)} runs, {size} bytes "
+              f"({ratio} than the stream)")
+
+def print_summary(capture_path):
+    if is_run_length_capture(capture_path):
+        print_run_length_summary(capture_path)
+        return
+    with CaptureReader(capture_path) as reader:
+        print(f"Capture: {capture_path}")
+        print(f"  Baud rate: {reader.baudrate}")
+        print(f"  Started: {time.ctime(reader.start_time)}")
+        print(f"  Serial reads: {reader.chunk_count}")
+        print(f"  Packets: {len(reader)}")
+        counts = {}
+        for _, packet_type, _ in reader.packets():
+            counts[packet_type] = counts.get(packet_type, 0) + 1
+        for packet_type, count in sorted(counts.items()):
+            print(f"    {packet_type}: {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or convert binary UART captures.")
+    parser.add_argument('capture', help="binary or run-length capture written by read.py (or a text log for --rle)")
+    parser.add_argument('--text', metavar='LOG', help="regenerate the legacy text log into LOG")
+    parser.add_argument('--formats', default='HEX_ONLY', help="comma-separated decoding formats for --text (default: HEX_ONLY)")
+    parser.add_argument('--rle', metavar='OUT', help="store the capture as a deduplicated run-length capture")
+    parser.add_argument('--raw', metavar='OUT', help="write the byte stream of a run-length capture to OUT")
+    args = parser.parse_args()
+
+    if args.rle:
+        size, frames, distinct, runs = to_run_length(args.capture, args.rle)
+        print(f"Wrote {size} bytes as {frames} frames: {distinct} distinct, {runs} runs")
+        print_run_length_summary(args.rle)
+    elif args.raw:
+        with RunLengthReader(args.capture) as reader, open(args.raw, "wb") as out:
+            out.write(reader.stream())
+        print(f"Wrote {len(reader)} frames to {args.raw}")
+    elif args.text:
+        formats = [f.strip().upper() for f in args.formats.split(',')]
+        count = to_text_log(args.capture, args.text, formats)
+        print(f"Wrote {count} serial reads to {args.text}")
+    else:
+        print_summary(args.capture)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,17 @@
+import argparse
+import glob
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from checksums import CRCS
+from read import split_frames
+from replay import read_text_log
+
 # Packets
 packet1 = [
     0x30, 0x36, 0x26, 0x00, 0x0c, 0x30, 0x02, 0x00, 0xfc,
@@ -39,7 +53,191 @@ def calculate_checksums(packet, config_start=6, config_end=9, checksum_len=2, al
     else:
         print(f"Unsupported algorithm: {algo}")
 
-if __name__ == "__main__":
+# Batch solver: try every algorithm over every (start, end, checksum
+# position) of the frames found in the captures, all windows at once.
+
+CAPTURE_GLOBS = ('PEDRO/preprocessing/*.txt',)
+
+def load_frames(patterns=CAPTURE_GLOBS, min_count=2):
+    """
+    Counter of frames found in the captures. Frames seen fewer than
+    min_count times are left out: at ~3% corrupted bytes a one-off frame is
+    almost always a damaged copy of a common one.
+    """
+    frames = Counter()
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            frames.update(split_frames(b''.join(data for _, data in read_text_log(path))))
+    return Counter({frame: count for frame, count in frames.items() if count >= min_count})
+
+def crc_windows(crc, frames):
+    """
+    CRC of every window of frames (N x L uint8): a dict {(start, end): N
+    values}. Each start is run once to the frame end, so the cost is
+    L*L/2 vector steps whatever the number of frames.
+    """
+    n, length = frames.shape
+    table = np.array(crc.table, dtype=np.uint32)
+    results = {}
+    for start in range(length):
+        value = np.full(n, crc.init, dtype=np.uint32)
+        for end in range(start + 1, length + 1):
+            byte = frames[:, end - 1]
+            if crc.reflected:
+                value = (value >> 8) ^ table[(value ^ byte) & 0xFF]
+            elif crc.width == 8:
+                value = table[value ^ byte]
+            else:
+                value = ((value << 8) & crc.mask) ^ table[((value >> (crc.width - 8)) ^ byte) & 0xFF]
+            results[start, end] = value ^ crc.xorout
+    return results
+
+# Shortest window tried: a one-byte "checksum" is just a copied byte
+MIN_WINDOW = 2
+# Fewest distinct values a target position must take, and a hypothesis must
+# reproduce: a near-constant byte is "matched" by any window that is constant too
+MIN_VALUES = 4
+
+def window_bounds(length, min_window=MIN_WINDOW):
+    """Every (start, end) window of a frame at least min_window long, as two index arrays."""
+    starts, ends = np.triu_indices(length + 1, k=min_window)
+    return starts, ends
+
+def prefix_algorithms(frames, min_window=MIN_WINDOW):
+    """
+    8-bit XOR/sum style checksums of every window through prefix arrays:
+    {name: N x W values} with windows in window_bounds order.
+    """
+    n, length = frames.shape
+    prefix_xor = np.zeros((n, length + 1), dtype=np.uint8)
+    np.bitwise_xor.accumulate(frames, axis=1, out=prefix_xor[:, 1:])
+    prefix_sum = np.zeros((n, length + 1), dtype=np.int64)
+    np.cumsum(frames, axis=1, out=prefix_sum[:, 1:])
+
+    starts, ends = window_bounds(length, min_window)
+    xor = prefix_xor[:, ends] ^ prefix_xor[:, starts]
+    total = ((prefix_sum[:, ends] - prefix_sum[:, starts]) & 0xFF).astype(np.uint8)
+    return {
+        "xor": xor,
+        "xor_inverted": ~xor,
+        "sum8": total,
+        "twos_complement": (-total.astype(np.int16) & 0xFF).astype(np.uint8),
+        "ones_complement": ~total,
+    }
+
+def score_hypotheses(values, frames, weights, starts, ends, algorithm, width=8, min_values=MIN_VALUES):
+    """
+    Match every window's checksum (N x W) against every byte position
+    outside the window (16-bit ones against both byte orders). Returns
+    hypothesis dicts. Only positions taking at least min_values distinct
+    values across the frames are tried, and a hypothesis must reproduce at
+    least min_values of them: a (nearly) constant byte says nothing about
+    the algorithm.
+    """
+    n, length = frames.shape
+    total = weights.sum()
+    hypotheses = []
+
+    if width == 8:
+        targets = [(pos, pos + 1, frames[:, pos].astype(np.uint32), "") for pos in range(length)]
+    else:
+        targets = []
+        for pos in range(length - 1):
+            high, low = frames[:, pos].astype(np.uint32), frames[:, pos + 1].astype(np.uint32)
+            targets.append((pos, pos + 2, (high << 8) | low, " be"))
+            targets.append((pos, pos + 2, (low << 8) | high, " le"))
+
+    values = values.astype(np.uint32)
+    for first, last, target, order in targets:
+        levels = np.unique(target)
+        if len(levels) < min_values:
+            continue
+        outside = (ends <= first) | (starts >= last)
+        if not outside.any():
+            continue
+        matches = values[:, outside] == target[:, None]
+        # Distinct target values each window reproduces in at least one frame
+        explained = sum(matches[target == level].any(axis=0) for level in levels)
+        keep = explained >= min_values
+        if not keep.any():
+            continue
+        matches = matches[:, keep]
+        rates = weights @ matches / total
+        distinct = matches.sum(axis=0)
+        for start, end, rate, count, covered in zip(starts[outside][keep], ends[outside][keep], rates, distinct,
+                                                    explained[keep]):
+            hypotheses.append({
+                "algorithm": algorithm + order,
+                "start": int(start),
+                "end": int(end),
+                "position": first,
+                "match_rate": float(rate),
+                "distinct_matched": int(count),
+                "distinct": n,
+                "values_matched": int(covered),
+                "values": len(levels),
+            })
+    return hypotheses
+
+def solve(frames, weights=None, min_rate=0.5, min_window=MIN_WINDOW, min_values=MIN_VALUES):
+    """
+    Rank checksum hypotheses for equal-length frames (N x L uint8, one
+    row per distinct frame, weights = times each was seen). Returns
+    hypotheses with a match rate of at least min_rate, best first: by
+    distinct frames explained, so a frame repeated a thousand times counts
+    once.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    weights = np.ones(len(frames)) if weights is None else np.asarray(weights, dtype=float)
+    starts, ends = window_bounds(frames.shape[1], min_window)
+
+    hypotheses = []
+    for name, values in prefix_algorithms(frames, min_window).items():
+        hypotheses += score_hypotheses(values, frames, weights, starts, ends, name, min_values=min_values)
+    for crc in CRCS:
+        windows = crc_windows(crc, frames)
+        values = np.stack([windows[start, end] for start, end in zip(starts, ends)], axis=1)
+        hypotheses += score_hypotheses(values, frames, weights, starts, ends, crc.name, crc.width, min_values)
+
+    hypotheses = [h for h in hypotheses if h["match_rate"] >= min_rate]
+    # Prefer the most distinct frames explained, then target values, then the widest window
+    hypotheses.sort(key=lambda h: (h["distinct_matched"], h["values_matched"], h["end"] - h["start"]), reverse=True)
+    return hypotheses
+
+# Longer pieces are two frames run together through a corrupted header
+MAX_FRAME_LENGTH = 40
+
+def solve_captures(frame_counts, min_distinct=3, min_rate=0.5, max_length=MAX_FRAME_LENGTH, min_values=MIN_VALUES):
+    """
+    Solve every frame length up to max_length with at least min_distinct
+    distinct frames. Returns {length: hypotheses}.
+    """
+    by_length = {}
+    for frame, count in frame_counts.items():
+        if len(frame) > max_length:
+            continue
+        by_length.setdefault(len(frame), []).append((frame, count))
+    results = {}
+    for length, group in sorted(by_length.items()):
+        if len(group) < min_distinct:
+            continue
+        frames = np.array([list(frame) for frame, _ in group], dtype=np.uint8)
+        weights = [count for _, count in group]
+        results[length] = solve(frames, weights, min_rate, min_values=min_values)
+    return results
+
+def print_hypotheses(length, frame_count, hypotheses, top=10):
+    print(f"\n{length}-byte frames ({frame_count} distinct): {len(hypotheses)} hypotheses")
+    if not hypotheses:
+        return
+    print(f"{'Algorithm':<24} {'Window':>9} {'At':>4} {'Match':>7} {'Frames':>9} {'Values':>9}")
+    for h in hypotheses[:top]:
+        window = f"{h['start']}-{h['end'] - 1}"
+        print(f"{h['algorithm']:<24} {window:>9} {h['position']:>4} {h['match_rate']:>7.1%} "
+              f"{h['distinct_matched']:>4}/{h['distinct']:<4} {h['values_matched']:>4}/{h['values']:<4}")
+
+def interactive():
+    """Check one of the sample packets with the XOR of a fixed config/rest split."""
     packets = {
         'test1': packet1,
         'test2': packet2,
@@ -54,23 +252,51 @@ if __name__ == "__main__":
         'test2': 'test2',
         'test3': 'test3',
     }
-    
+
     print("Select packet to analyze: 1/test1, 2/test2, 3/test3")
     selection_input = input("> ").strip().lower()
     selection = selection_map.get(selection_input)
-    
+
     if not selection:
         print("Invalid packet selection")
-        exit(1)
-    
+        return
+
     print("Select checksum algorithm (xor):")
     algo = input("> ").strip().lower()
     if algo == '':
         algo = 'xor'  # default to xor if empty input
-    
+
     # Default checksum length 2 bytes for tests 1 and 3, 1 byte for test2 (adjust if needed)
     checksum_len = 2
     if selection == 'test2':
         checksum_len = 1
-    
+
     calculate_checksums(packets[selection], checksum_len=checksum_len, algo=algo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the captures for the frame checksum algorithm.")
+    parser.add_argument('captures', nargs='*', default=list(CAPTURE_GLOBS), help="capture globs (relative to the repo)")
+    parser.add_argument('--min-count', type=int, default=2, help="ignore frames seen fewer times than this")
+    parser.add_argument('--min-distinct', type=int, default=3, help="skip frame lengths with fewer distinct frames")
+    parser.add_argument('--min-rate', type=float, default=0.5, help="lowest match rate reported")
+    parser.add_argument('--max-length', type=int, default=MAX_FRAME_LENGTH, help="longest frame solved")
+    parser.add_argument('--min-values', type=int, default=MIN_VALUES,
+                        help="fewest distinct values a checksum byte must take (and a hypothesis reproduce)")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--interactive', action='store_true', help="check one of the sample packets by hand")
+    args = parser.parse_args()
+
+    if args.interactive:
+        interactive()
+        return
+
+    frame_counts = load_frames(args.captures, args.min_count)
+    print(f"Loaded {sum(frame_counts.values())} frames ({len(frame_counts)} distinct)")
+    results = solve_captures(frame_counts, args.min_distinct, args.min_rate, args.max_length, args.min_values)
+    for length, hypotheses in results.items():
+        distinct = sum(1 for frame in frame_counts if len(frame) == length)
+        print_hypotheses(length, distinct, hypotheses, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Frame checksum algorithms, shared by read.py (checking frames as they are
+# framed) and check/checksum.py (searching the captures for the algorithm)
+
+class Crc:
+    """Table-driven CRC (width 8 or 16; poly in the bit order of reflected)."""
+
+    def __init__(self, name, width, poly, init=0, reflected=False, xorout=0):
+        self.name = name
+        self.width = width
+        self.init = init
+        self.reflected = reflected
+        self.xorout = xorout
+        mask = (1 << width) - 1
+        table = []
+        for byte in range(256):
+            if reflected:
+                crc = byte
+                for _ in range(8):
+                    crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+            else:
+                crc = byte << (width - 8)
+                for _ in range(8):
+                    top = crc & (1 << (width - 1))
+                    crc = ((crc << 1) ^ poly if top else crc << 1) & mask
+            table.append(crc)
+        self.table = table
+        self.mask = mask
+
+    def __call__(self, data):
+        table, value = self.table, self.init
+        for byte in data:
+            if self.reflected:
+                value = (value >> 8) ^ table[(value ^ byte) & 0xFF]
+            else:
+                value = ((value << 8) & self.mask) ^ table[((value >> (self.width - 8)) ^ byte) & 0xFF]
+        return value ^ self.xorout
+
+CRCS = (
+    Crc("crc8", 8, 0x07),
+    Crc("crc8/maxim", 8, 0x8C, reflected=True),
+    Crc("crc8/sae-j1850", 8, 0x1D, init=0xFF, xorout=0xFF),
+    Crc("crc16/xmodem", 16, 0x1021),
+    Crc("crc16/ccitt-false", 16, 0x1021, init=0xFFFF),
+    Crc("crc16/arc", 16, 0xA001, reflected=True),
+    Crc("crc16/modbus", 16, 0xA001, init=0xFFFF, reflected=True),
+)
+
+def _xor(data):
+    value = 0
+    for byte in data:
+        value ^= byte
+    return value
+
+# name -> (function of the covered bytes, width in bytes)
+CHECKSUMS = {
+    "xor": (_xor, 1),
+    "xor_inverted": (lambda data: _xor(data) ^ 0xFF, 1),
+    "sum8": (lambda data: sum(data) & 0xFF, 1),
+    "twos_complement": (lambda data: -sum(data) & 0xFF, 1),
+    "ones_complement": (lambda data: ~sum(data) & 0xFF, 1),
+}
+CHECKSUMS.update((crc.name, (crc, crc.width // 8)) for crc in CRCS)
+
+class FrameChecksum:
+    """
+    Checksum of a frame: algorithm (a CHECKSUMS name, with " be"/" le"
+    for the byte order of 16-bit ones) over frame[start:end], stored at
+    frame[position]. Calling it with a frame says whether the checksum
+    holds. from_hypothesis takes a hypothesis from check/checksum.py and
+    parse the "algorithm first-last position" line it prints.
+    """
+
+    def __init__(self, algorithm, start, end, position):
+        name, _, order = algorithm.partition(" ")
+        if name not in CHECKSUMS:
+            raise ValueError(f"Unknown checksum algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.function, self.width = CHECKSUMS[name]
+        self.byteorder = "little" if order == "le" else "big"
+        self.start = start
+        self.end = end
+        self.position = position
+        # Shortest frame holding both the window and the checksum
+        self.min_length = max(end, position + self.width)
+
+    @classmethod
+    def from_hypothesis(cls, hypothesis):
+        return cls(hypothesis["algorithm"], hypothesis["start"], hypothesis["end"], hypothesis["position"])
+
+    @classmethod
+    def parse(cls, text):
+        """FrameChecksum from "xor 16-17 5" or "crc16/arc le 2-19 26" (window bytes inclusive)."""
+        *algorithm, window, position = text.split()
+        first, _, last = window.partition("-")
+        if not algorithm or not last:
+            raise ValueError(f"Expected 'algorithm first-last position', got {text!r}")
+        return cls(" ".join(algorithm), int(first), int(last) + 1, int(position))
+
+    def __call__(self, frame):
+        if len(frame) < self.min_length:
+            return False
+        stored = frame[self.position:self.position + self.width]
+        expected = self.function(frame[self.start:self.end])
+        return int.from_bytes(stored, self.byteorder) == expected
+
+    def __reduce__(self):
+        # The lambdas in CHECKSUMS do not pickle; rebuild from the name instead
+        return type(self), (self.algorithm, self.start, self.end, self.position)
+
+    def __str__(self):
+        return f"{self.algorithm} {self.start}-{self.end - 1} {self.position}"
+
+    def __repr__(self):
+        return f"FrameChecksum({self.algorithm!r}, {self.start}, {self.end}, {self.position})"
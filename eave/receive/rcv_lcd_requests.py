@@ -1,6 +1,12 @@
+import asyncio
 import binascii
-import serial
 import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from read import COMMAND_TYPES
+from transport import open_serial
 
 # Configuration for variable-length packet protocol
 BAUD_RATE = 16250
@@ -14,7 +20,7 @@ END_MARKER = 0xFE
 # State variables
 packet_buffer = bytearray()
 in_packet = False
-last_frame = datetime.datetime.now()
+last_frame = None  # time.monotonic_ns() of the previous complete packet
 packet_counter = 0
 
 def decode_flag(byte_val, position):
@@ -59,15 +65,7 @@ def extract_lcd_packet_info(packet_data):
     }
     
     if len(packet_data) >= 1:
-        first_byte = packet_data[0]
-        if first_byte == 0xCC:
-            info['command_type'] = 'lcd_power'
-        elif first_byte == 0xC2:
-            info['command_type'] = 'lcd_control'
-        elif first_byte == 0x42:
-            info['command_type'] = 'lcd_status'
-        elif first_byte == 0xCE:
-            info['command_type'] = 'lcd_header'
+        info['command_type'] = COMMAND_TYPES.get(packet_data[0], 'unknown')
         
         # Extract parameters (everything after first byte)
         if len(packet_data) > 1:
@@ -75,60 +73,80 @@ def extract_lcd_packet_info(packet_data):
     
     return info
 
-print(f"Starting LCD variable-length packet receiver on {SERIAL_PORT}")
-print(f"Baud rate: {BAUD_RATE}")
-print(f"Looking for packets between 0x{START_MARKER:02X} and 0x{END_MARKER:02X} markers")
-print("=" * 60)
-
-with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=READ_TIMEOUT) as ser:
-    while (byte := ser.read(1)):
-        current_byte = byte[0]
-        
-        # Check for start marker
-        if current_byte == START_MARKER:
-            if in_packet:
-                print(f"Warning: New start marker while already in packet")
-            in_packet = True
+def handle_byte(current_byte, timestamp_ns):
+    """
+    Feed one byte through the 0xBE...0xFE framing state machine.
+    timestamp_ns is the arrival time of the chunk the byte came in.
+    """
+    global in_packet, last_frame, packet_counter
+    
+    # Check for start marker
+    if current_byte == START_MARKER:
+        if in_packet:
+            print(f"Warning: New start marker while already in packet")
+        in_packet = True
+        packet_buffer.clear()
+        return
+    
+    # Check for end marker
+    elif current_byte == END_MARKER:
+        if in_packet:
+            in_packet = False
+            packet_counter += 1
+            
+            # Process complete packet
+            if last_frame is None:
+                last_frame = timestamp_ns
+            delta_time = datetime.timedelta(microseconds=(timestamp_ns - last_frame) // 1000)
+            last_frame = timestamp_ns
+            
+            print(f"\n[LCD Packet {packet_counter}] Time: {delta_time}")
+            print(f"Raw packet: {' '.join(hex(b) for b in packet_buffer)}")
+            
+            # Analyze packet
+            packet_info = extract_lcd_packet_info(packet_buffer)
+            analysis = analyze_lcd_packet(packet_buffer)
+            
+            print(f"Length: {packet_info['length']} bytes")
+            print(f"Type: {packet_info['command_type']}")
+            print(f"Analysis: {analysis}")
+            print(f"Hex: {packet_info['hex']}")
+            print(f"Decimal: {packet_info['decimal']}")
+            if packet_info['parameters']:
+                print(f"Parameters: {packet_info['parameters']}")
+            print("-" * 40)
+            
             packet_buffer.clear()
-            continue
-        
-        # Check for end marker
-        elif current_byte == END_MARKER:
-            if in_packet:
-                in_packet = False
-                packet_counter += 1
-                
-                # Process complete packet
-                curr_time = datetime.datetime.now()
-                delta_time = curr_time - last_frame
-                last_frame = curr_time
-                
-                print(f"\n[LCD Packet {packet_counter}] Time: {delta_time}")
-                print(f"Raw packet: {' '.join(hex(b) for b in packet_buffer)}")
-                
-                # Analyze packet
-                packet_info = extract_lcd_packet_info(packet_buffer)
-                analysis = analyze_lcd_packet(packet_buffer)
-                
-                print(f"Length: {packet_info['length']} bytes")
-                print(f"Type: {packet_info['command_type']}")
-                print(f"Analysis: {analysis}")
-                print(f"Hex: {packet_info['hex']}")
-                print(f"Decimal: {packet_info['decimal']}")
-                if packet_info['parameters']:
-                    print(f"Parameters: {packet_info['parameters']}")
-                print("-" * 40)
-                
-                packet_buffer.clear()
-            else:
-                print(f"Warning: End marker without start marker")
-        
-        # Add byte to packet buffer if we're in a packet
-        elif in_packet:
-            packet_buffer.append(current_byte)
-        
-        # Ignore bytes outside of packets
         else:
-            pass
+            print(f"Warning: End marker without start marker")
+    
+    # Add byte to packet buffer if we're in a packet
+    elif in_packet:
+        packet_buffer.append(current_byte)
+    
+    # Ignore bytes outside of packets
+    else:
+        pass
+
+async def receive(port=SERIAL_PORT, baudrate=BAUD_RATE):
+    """
+    Receive until the line has been silent for READ_TIMEOUT seconds.
+    """
+    stream = await open_serial(port, baudrate)
+    async with stream:
+        async for timestamp_ns, chunk in stream.chunks(idle_timeout=READ_TIMEOUT):
+            for current_byte in chunk:
+                handle_byte(current_byte, timestamp_ns)
+
+def main():
+    print(f"Starting LCD variable-length packet receiver on {SERIAL_PORT}")
+    print(f"Baud rate: {BAUD_RATE}")
+    print(f"Looking for packets between 0x{START_MARKER:02X} and 0x{END_MARKER:02X} markers")
+    print("=" * 60)
+
+    asyncio.run(receive())
+
+    print(f"\nReceived {packet_counter} complete LCD packets")
 
-print(f"\nReceived {packet_counter} complete LCD packets")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
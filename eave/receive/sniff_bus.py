@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import os
+import re
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from read import COMMAND_TYPES
+from transport import open_serial, merge_streams
+
+# Configuration (same lines as rcv_lcd_requests.py / rcv_esc_responses.py)
+BAUD_RATE = 16250
+READ_TIMEOUT = 30
+LCD_PORT = '/dev/ttyAMA0'   # LCD -> ESC requests
+ESC_PORT = '/dev/ttyUSB0'   # ESC -> LCD responses
+
+# Packet markers
+START_MARKER = 0xBE
+END_MARKER = 0xFE
+_MARKERS = re.compile(b'[\xbe\xfe]')
+
+# 8N1: 10 bit times per byte on the wire
+BITS_PER_BYTE = 10
+
+# Latencies kept per command type for the percentiles
+LATENCY_WINDOW = 10000
+
+class BeFeFramer:
+    """
+    0xBE...0xFE framing over whole chunks. Markers are located with a
+    regex scan and the bytes between them are copied in slices.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.in_packet = False
+        self.restarts = 0       # New start marker while already in a packet
+        self.orphan_ends = 0    # End marker without a start marker
+
+    def feed(self, data):
+        """Return [(payload, end_index)] for every packet completed in data."""
+        packets = []
+        pos = 0
+        for match in _MARKERS.finditer(data):
+            i = match.start()
+            if self.in_packet:
+                self.buffer += data[pos:i]
+            if data[i] == START_MARKER:
+                if self.in_packet:
+                    self.restarts += 1
+                self.in_packet = True
+                self.buffer.clear()
+            elif self.in_packet:
+                packets.append((bytes(self.buffer), i))
+                self.in_packet = False
+                self.buffer.clear()
+            else:
+                self.orphan_ends += 1
+            pos = i + 1
+        if self.in_packet:
+            self.buffer += data[pos:]
+        return packets
+
+class LatencyTracker:
+    """
+    Pairs every ESC response with the LCD request it answers (the most
+    recent unanswered one) and collects request->response latency per
+    LCD command type. Count, min, max and mean cover the whole run; the
+    percentiles cover the last window latencies.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.pending = None      # (timestamp_ns, command_type) of the last LCD request
+        self.latencies = {}      # command_type -> deque of the recent latency_ns
+        self.totals = {}         # command_type -> [count, sum, min, max]
+        self.unanswered = {}     # command_type -> count
+
+    def request(self, timestamp_ns, command_type):
+        if self.pending is not None:
+            kind = self.pending[1]
+            self.unanswered[kind] = self.unanswered.get(kind, 0) + 1
+        self.pending = (timestamp_ns, command_type)
+
+    def response(self, timestamp_ns):
+        """Return (command_type, latency_ns) for the request answered, or None."""
+        if self.pending is None:
+            return None
+        request_ns, command_type = self.pending
+        self.pending = None
+        latency_ns = timestamp_ns - request_ns
+        if command_type not in self.latencies:
+            self.latencies[command_type] = deque(maxlen=self.window)
+            self.totals[command_type] = [0, 0, latency_ns, latency_ns]
+        self.latencies[command_type].append(latency_ns)
+        totals = self.totals[command_type]
+        totals[0] += 1
+        totals[1] += latency_ns
+        totals[2] = min(totals[2], latency_ns)
+        totals[3] = max(totals[3], latency_ns)
+        return command_type, latency_ns
+
+    def summary(self):
+        """Per command type: (count, min, p50, p95, max, mean) in ms, plus unanswered count."""
+        rows = []
+        for command_type in sorted(set(self.latencies) | set(self.unanswered)):
+            values = sorted(self.latencies.get(command_type, ()))
+            unanswered = self.unanswered.get(command_type, 0)
+            if values:
+                def pct(p):
+                    return values[min(len(values) - 1, int(p * len(values)))] / 1e6
+                count, total, low, high = self.totals[command_type]
+                rows.append((command_type, count, low / 1e6, pct(0.5), pct(0.95),
+                             high / 1e6, total / count / 1e6, unanswered))
+            else:
+                rows.append((command_type, 0, None, None, None, None, None, unanswered))
+        return rows
+
+def command_type(payload):
+    if not payload:
+        return 'empty'
+    return COMMAND_TYPES.get(payload[0], f'0x{payload[0]:02X}')
+
+async def sniff(lcd_port=LCD_PORT, esc_port=ESC_PORT, baudrate=BAUD_RATE, duration=None,
+                idle_timeout=READ_TIMEOUT, log=None, echo=True):
+    """
+    Capture both lines on one event loop and print a merged timeline.
+    Returns the LatencyTracker and per-port framers.
+    """
+    byte_ns = BITS_PER_BYTE * 1_000_000_000 // baudrate
+    framers = {'LCD': BeFeFramer(), 'ESC': BeFeFramer()}
+    tracker = LatencyTracker()
+    start_ns = None
+
+    lcd = await open_serial(lcd_port, baudrate, name='LCD')
+    esc = await open_serial(esc_port, baudrate, name='ESC')
+    try:
+        async def timeline():
+            nonlocal start_ns
+            async for timestamp_ns, name, data in merge_streams(lcd, esc, idle_timeout=idle_timeout):
+                if start_ns is None:
+                    start_ns = timestamp_ns - len(data) * byte_ns
+                for payload, end in framers[name].feed(data):
+                    # The chunk is stamped when its last byte arrived; back-date
+                    # each packet to when its end marker went over the wire.
+                    packet_ns = timestamp_ns - (len(data) - 1 - end) * byte_ns
+                    raw = ' '.join(f'{b:02x}' for b in payload)
+                    if name == 'LCD':
+                        kind = command_type(payload)
+                        tracker.request(packet_ns, kind)
+                        line = f"{(packet_ns - start_ns) / 1e9:12.6f}  LCD -> [{raw}] ({kind})"
+                    else:
+                        answered = tracker.response(packet_ns)
+                        line = f"{(packet_ns - start_ns) / 1e9:12.6f}  ESC <- [{raw}]"
+                        if answered:
+                            line += f" ({answered[1] / 1e6:.3f} ms after {answered[0]})"
+                    if log:
+                        log.write(line + "\n")
+                    if echo:
+                        print(line)
+
+        if duration:
+            try:
+                await asyncio.wait_for(timeline(), duration)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await timeline()
+    finally:
+        lcd.close()
+        esc.close()
+
+    return tracker, framers
+
+def print_summary(tracker, framers):
+    print("\nRequest -> response latency (ms)")
+    print(f"{'Command':<10} {'Count':>6} {'Min':>8} {'p50':>8} {'p95':>8} {'Max':>8} {'Mean':>8} {'NoReply':>8}")
+    for kind, count, low, p50, p95, high, mean, unanswered in tracker.summary():
+        if count:
+            print(f"{kind:<10} {count:>6} {low:>8.3f} {p50:>8.3f} {p95:>8.3f} {high:>8.3f} {mean:>8.3f} {unanswered:>8}")
+        else:
+            print(f"{kind:<10} {count:>6} {'-':>8} {'-':>8} {'-':>8} {'-':>8} {'-':>8} {unanswered:>8}")
+    for name, framer in framers.items():
+        print(f"{name}: {framer.restarts} restarted packets, {framer.orphan_ends} end markers without start")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sniff the LCD and ESC lines together on one timeline.")
+    parser.add_argument('--lcd-port', default=LCD_PORT)
+    parser.add_argument('--esc-port', default=ESC_PORT)
+    parser.add_argument('--baud', type=int, default=BAUD_RATE)
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--idle-timeout', type=float, default=READ_TIMEOUT,
+                        help="stop after this many seconds of silence on both lines")
+    parser.add_argument('--log', help="also write the timeline to this file")
+    parser.add_argument('--quiet', action='store_true', help="only print the latency summary")
+    args = parser.parse_args()
+
+    print(f"Sniffing LCD {args.lcd_port} and ESC {args.esc_port} at {args.baud} baud")
+    print("=" * 60)
+
+    log = open(args.log, 'w') if args.log else None
+    try:
+        tracker, framers = asyncio.run(sniff(args.lcd_port, args.esc_port, args.baud, args.duration,
+                                             args.idle_timeout, log, not args.quiet))
+    finally:
+        if log:
+            log.close()
+
+    print_summary(tracker, framers)
+
+if __name__ == "__main__":
+    main()
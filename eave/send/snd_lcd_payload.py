@@ -1,5 +1,9 @@
-import serial
-import time
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from transport import open_serial
 
 # Configuration
 SERIAL_PORT = '/dev/ttyAMA0'  # LCD TX line
@@ -14,6 +18,35 @@ def create_packet(command_bytes):
     packet.append(END_MARKER)
     return bytes(packet)
 
+async def send_packet_stream(stream, commands, interval=0.125):
+    """
+    Frame and send each non-empty command, one every interval seconds.
+    Slots are timed from the start on the loop clock and packets are queued
+    without waiting for the driver to drain, so write time never pushes
+    the later slots back.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    slot = 0
+    for i, cmd in enumerate(commands):
+        if cmd:  # Skip empty packets
+            delay = start + slot * interval - loop.time()  # Match timing from logs
+            if delay > 0:
+                await asyncio.sleep(delay)
+            packet = create_packet(cmd)
+            print(f"Packet {i+2}: {' '.join(hex(b) for b in packet)}")
+            stream.write(packet)
+            slot += 1
+    await stream.drain()
+
+async def _send_complete_packet_stream(complete_stream):
+    stream = await open_serial(SERIAL_PORT, BAUD_RATE)
+    async with stream:
+        await send_packet_stream(stream, complete_stream)
+    stats = stream.stats
+    print(f"{stats['writes']} packets, {stats['bytes_out']} bytes in {stats['write_syscalls']} write syscalls "
+          f"({stats['bytes_out'] / max(1, stats['write_syscalls']):.1f} bytes per write)")
+
 def send_complete_packet_stream():
     """Send the complete packet stream from logs"""
     print("Sending complete packet stream from LCD logs...")
@@ -33,14 +66,7 @@ def send_complete_packet_stream():
         [0xD0, 0xCE, 0x02], [0x42], [0xDE, 0xCE, 0x02], [0xCC], [0x42], [], [0xCC], [0x42]
     ]
     
-    with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser:
-        for i, cmd in enumerate(complete_stream):
-            if cmd:  # Skip empty packets
-                packet = create_packet(cmd)
-                print(f"Packet {i+2}: {' '.join(hex(b) for b in packet)}")
-                ser.write(packet)
-                ser.flush()
-                time.sleep(0.125)  # Match timing from logs
+    asyncio.run(_send_complete_packet_stream(complete_stream))
     
     print("Complete packet stream sent!")
 
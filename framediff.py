@@ -0,0 +1,186 @@
+import argparse
+import os
+import re
+from collections import Counter
+
+from capture import CaptureReader, RunLengthReader, is_run_length_capture
+from read import MAX_FRAME_SPAN, PACKET_HEADER
+from replay import is_binary_capture, read_text_log
+
+# Frame starts: the PACKET.md header and its variant with 0x36 as the gear
+# byte, which the legacy reads mix with it
+FRAME_HEADERS = (bytes(PACKET_HEADER), bytes([0x30, 0x36, 0x36]))
+
+def capture_chunks(path):
+    """Stream the serial reads of a binary or run-length capture or a text log, one at a time."""
+    if is_binary_capture(path):
+        with CaptureReader(path) as reader:
+            for _, data in reader.chunks():
+                yield bytes(data)
+    elif is_run_length_capture(path):
+        with RunLengthReader(path) as reader:
+            for _, frame in reader.expand():
+                yield frame
+    else:
+        for _, data in read_text_log(path):
+            yield data
+
+def iter_frames(chunks, headers=FRAME_HEADERS, max_frame=MAX_FRAME_SPAN):
+    """
+    Cut a stream of chunks into frames running from one header to the
+    next, any of headers starting a frame. Only the frame being assembled
+    is held in memory; bytes before the first header are dropped and the
+    last frame is yielded at the end. A frame running past max_frame bytes
+    without another header is yielded cut there and the rest dropped as
+    noise until the next header.
+    """
+    finder = re.compile(b"|".join(re.escape(header) for header in headers))
+    longest = max(map(len, headers))
+    pending = bytearray()
+    framing = False  # pending starts with a header
+    for data in chunks:
+        # Everything before the tail was searched already; a header may
+        # still straddle the tail and the new data
+        resume = max(int(framing), len(pending) - longest + 1)
+        pending += data
+        while True:
+            match = finder.search(pending, resume)
+            if match is None:
+                break
+            if framing:
+                yield bytes(pending[:match.start()])
+            del pending[:match.start()]
+            framing = True
+            resume = 1
+        if framing and len(pending) > max_frame:
+            yield bytes(pending[:max_frame])
+            framing = False
+        if not framing:
+            del pending[:max(0, len(pending) - longest + 1)]
+    if framing:
+        yield bytes(pending)
+
+class FrameIndex:
+    """
+    Distinct frames of one or more captures with how often each was seen,
+    keyed by the frame bytes (hashed by the dict, so a long ride costs one
+    entry per distinct frame, not per frame).
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.counts = Counter()
+        self.total = 0
+
+    @classmethod
+    def from_paths(cls, paths, name=None, headers=FRAME_HEADERS):
+        index = cls(name or " + ".join(os.path.basename(path) for path in paths))
+        for path in paths:
+            index.add_frames(iter_frames(capture_chunks(path), headers))
+        return index
+
+    def add_frames(self, frames):
+        for frame in frames:
+            self.counts[frame] += 1
+            self.total += 1
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, frame):
+        return frame in self.counts
+
+    def share(self, frame):
+        """Fraction of this index's frames that are frame."""
+        return self.counts[frame] / self.total if self.total else 0.0
+
+    def only_in(self, other):
+        """Frames seen here but never in other, most common first."""
+        return [(frame, count) for frame, count in self.counts.most_common() if frame not in other]
+
+    def common(self, other):
+        """Frames seen in both, as (frame, count here, count in other), most common here first."""
+        return [(frame, count, other.counts[frame]) for frame, count in self.counts.most_common() if frame in other]
+
+    def dominant(self, length=None):
+        """The most common frame (of the given length)."""
+        for frame, _ in self.counts.most_common():
+            if length is None or len(frame) == length:
+                return frame
+        return None
+
+    def position_histograms(self, length):
+        """{position: Counter(value -> frames)} over the frames of one length."""
+        histograms = {pos: Counter() for pos in range(length)}
+        for frame, count in self.counts.items():
+            if len(frame) == length:
+                for pos, value in enumerate(frame):
+                    histograms[pos][value] += count
+        return histograms
+
+def byte_deltas(a, b, length=None):
+    """
+    Positions where frames of one length differ between two indexes:
+    [(position, value in a, share in a, value in b, share in b)] comparing
+    the most common value at each position. length defaults to the length
+    of a's dominant frame.
+    """
+    length = length or len(a.dominant() or b"")
+    histograms_a = a.position_histograms(length)
+    histograms_b = b.position_histograms(length)
+    deltas = []
+    for pos in range(length):
+        if not histograms_a[pos] or not histograms_b[pos]:
+            continue
+        value_a, count_a = histograms_a[pos].most_common(1)[0]
+        value_b, count_b = histograms_b[pos].most_common(1)[0]
+        if value_a != value_b:
+            deltas.append((pos, value_a, count_a / sum(histograms_a[pos].values()),
+                           value_b, count_b / sum(histograms_b[pos].values())))
+    return deltas
+
+def print_summary(index):
+    lengths = Counter()
+    for frame, count in index.counts.items():
+        lengths[len(frame)] += count
+    common_lengths = ", ".join(f"{length} bytes: {count}" for length, count in lengths.most_common(3))
+    print(f"{index.name}: {index.total} frames, {len(index)} distinct ({common_lengths})")
+
+def print_frames(title, rows, total, top):
+    print(f"\n{title} ({len(rows)} distinct)")
+    for frame, count, *rest in rows[:top]:
+        other = f" / {rest[0]}" if rest else ""
+        print(f"  {count:>6}{other:<8} {count / total:>6.1%}  {frame.hex(' ')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the distinct frames of two captures or groups of captures.")
+    parser.add_argument('a', nargs='+', help="first capture(s): text logs, binary or run-length captures")
+    parser.add_argument('--vs', nargs='+', required=True, metavar='B', help="capture(s) to compare against")
+    parser.add_argument('--length', type=int, help="frame length for the byte deltas (default: A's most common frame)")
+    parser.add_argument('--header', type=bytes.fromhex, action='append', dest='headers',
+                        help="hex bytes a frame starts with; repeat for several "
+                             "(default: 30 36 26 and 30 36 36, which the legacy reads mix)")
+    parser.add_argument('--top', type=int, default=10, help="frames listed per set")
+    args = parser.parse_args()
+
+    headers = args.headers or FRAME_HEADERS
+    a = FrameIndex.from_paths(args.a, headers=headers)
+    b = FrameIndex.from_paths(args.vs, headers=headers)
+    for index in (a, b):
+        print_summary(index)
+    if not a.total or not b.total:
+        print("Nothing to compare.")
+        return
+
+    print_frames(f"Only in {a.name}", a.only_in(b), a.total, args.top)
+    print_frames(f"Only in {b.name}", b.only_in(a), b.total, args.top)
+    print_frames("In both (count in A / B)", a.common(b), a.total, args.top)
+
+    length = args.length or len(a.dominant())
+    deltas = byte_deltas(a, b, length)
+    print(f"\nByte deltas between {length}-byte frames ({len(deltas)} positions)")
+    for pos, value_a, share_a, value_b, share_b in deltas:
+        print(f"  byte {pos:>2}: {value_a:02x} ({share_a:.0%}) -> {value_b:02x} ({share_b:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket upper bounds for PacketDetector instrumentation
+CALL_TIME_BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+READ_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and two additions, cheap
+    enough for every call on the capture hot path.
+    """
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket is +Inf
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self):
+        """Return (bounds, per-bucket counts, sum, count)."""
+        return self.bounds, list(self.counts), self.total, self.count
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+class MetricsText:
+    """Builder for the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """samples: [(labels dict or None, value)]"""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {value}")
+
+    def histogram(self, name, help_text, histogram, scale=1):
+        bounds, counts, total, count = histogram.snapshot()
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, bucket in zip(bounds, counts):
+            cumulative += bucket
+            self.lines.append(f'{name}_bucket{{le="{bound / scale:g}"}} {cumulative}')
+        self.lines.append(f'{name}_bucket{{le="+Inf"}} {count}')
+        self.lines.append(f"{name}_sum {total / scale:g}")
+        self.lines.append(f"{name}_count {count}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+def detector_metrics(detector, pipeline=None):
+    """Prometheus text for a PacketDetector (and the capture pipeline, if any)."""
+    out = MetricsText()
+    metrics = detector.get_metrics()
+    counters = (
+        ("total_bytes", "uart_bytes_total", "Bytes fed to the packet detector"),
+        ("packets_found", "uart_packets_total", "Complete packets framed"),
+        ("partial_packets", "uart_partial_packets_total", "Partial packets framed"),
+        ("single_bytes", "uart_single_bytes_total", "Single-byte control packets"),
+        ("unknown_patterns", "uart_unknown_patterns_total", "Runs of bytes that matched no pattern"),
+        ("discarded_bytes", "uart_discarded_bytes_total", "Bytes skipped while resynchronising"),
+        ("recovered_packets", "uart_recovered_packets_total", "28-byte frames recovered from byte errors"),
+        ("repaired_bytes", "uart_repaired_bytes_total", "Corrupted bytes restored in recovered frames"),
+        ("checksum_passed", "uart_checksum_passed_total", "Frames whose checksum held"),
+        ("checksum_failed", "uart_checksum_failed_total", "Frames rejected on their checksum"),
+    )
+    for key, name, help_text in counters:
+        out.metric(name, "counter", help_text, [(None, metrics[key])])
+    out.metric("uart_pattern_matches_total", "counter", "Packets framed per pattern",
+               [({"pattern": name}, count) for name, count in sorted(metrics["pattern_counts"].items())])
+    out.metric("uart_buffer_bytes", "gauge", "Bytes waiting in the detector buffer",
+               [(None, metrics["buffer_size"])])
+    out.metric("uart_buffer_high_water_bytes", "gauge", "Largest detector buffer seen",
+               [(None, metrics["buffer_high_water"])])
+    out.histogram("uart_add_data_seconds", "Time spent in PacketDetector.add_data per call",
+                  detector.call_time_us, scale=1_000_000)
+    out.histogram("uart_read_size_bytes", "Size of each chunk fed to the detector", detector.read_sizes)
+
+    if pipeline is not None:
+        stats = pipeline.stats()
+        for name in ("raw", "decode", "log"):
+            out.metric(f"uart_{name}_queue_dropped_total", "counter", f"Items dropped at the {name} queue",
+                       [(None, stats[f"{name}_dropped"])])
+            out.metric(f"uart_{name}_queue_depth", "gauge", f"Items waiting in the {name} queue",
+                       [(None, stats[f"{name}_depth"])])
+    return out.text()
+
+class MetricsServer:
+    """
+    Serves render() as Prometheus text on http://host:port/metrics from a
+    daemon thread, so capture health can be watched while it runs.
+    """
+
+    def __init__(self, render, port=9108, host="127.0.0.1"):
+        self.render = render
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = server.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep the capture output clean
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/metrics"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,6 +1,8 @@
 import serial
 import time
 
+from scheduler import RateScheduler, send_schedule
+
 # Default common UART baud rates (same as read.py)
 baud_rates = [
     110,
@@ -155,8 +157,9 @@ def send_repeated_packet(port="/dev/ttyAMA0", baudrate=baudrate):
         try:
             frequency = float(input("Enter frequency (packets per second, e.g., 10): ").strip())
             interval = 1.0 / frequency
-        except ValueError:
+        except (ValueError, ZeroDivisionError):
             print("Invalid frequency. Using 10 packets per second.")
+            frequency = 10.0
             interval = 0.1
         
         try:
@@ -174,34 +177,16 @@ def send_repeated_packet(port="/dev/ttyAMA0", baudrate=baudrate):
             print("Operation cancelled.")
             return
         
+        scheduler = RateScheduler(frequency, duration)
+        
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
-            start_time = time.time()
-            packet_count = 0
-            
             print("Starting packet transmission...")
             print("Press Ctrl+C to stop early")
             
-            try:
-                while time.time() - start_time < duration:
-                    ser.write(packet)
-                    ser.flush()
-                    packet_count += 1
-                    
-                    # Show progress every 10 packets
-                    if packet_count % 10 == 0:
-                        elapsed = time.time() - start_time
-                        print(f"Sent {packet_count} packets in {elapsed:.1f}s")
-                    
-                    time.sleep(interval)
-                    
-            except KeyboardInterrupt:
-                print("\nStopped by user")
+            send_schedule(ser, scheduler, packet)
             
-            elapsed = time.time() - start_time
             print(f"✓ Transmission complete!")
-            print(f"  - Packets sent: {packet_count}")
-            print(f"  - Duration: {elapsed:.1f} seconds")
-            print(f"  - Average rate: {packet_count/elapsed:.1f} packets/second")
+            scheduler.print_report()
             
             # Check for any final response
             time.sleep(1)
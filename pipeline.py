@@ -0,0 +1,200 @@
+import queue
+import threading
+import time
+
+# Marks the end of the stream as it travels through the stages
+_STOP = object()
+
+class CapturePipeline:
+    """
+    Threaded capture: the serial port is drained by a dedicated reader
+    thread that does nothing but timestamp chunks and queue them. Framing,
+    decoding and logging/printing each run on their own worker thread,
+    connected by bounded queues.
+
+    When a queue is full the item is dropped and counted instead of
+    blocking the stage in front of it, so a slow terminal or codec can
+    never back up the UART.
+
+        reader -> raw_queue -> framer -> decode_queue -> decoder -> log_queue -> logger
+    """
+
+    def __init__(self, ser, detector, baud, formats=(), render=None, log=None, capture=None,
+                 echo=True, queue_size=1024):
+        self.ser = ser
+        self.detector = detector
+        self.baud = baud
+        self.formats = list(formats)
+        self.render = render
+        self.log = log
+        self.capture = capture
+        self.echo = echo
+
+        self.raw_queue = queue.Queue(maxsize=queue_size)
+        self.decode_queue = queue.Queue(maxsize=queue_size)
+        self.log_queue = queue.Queue(maxsize=queue_size)
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.counters = {
+            "reads": 0,
+            "bytes_read": 0,
+            "chunks_framed": 0,
+            "packets_framed": 0,
+            "lines_written": 0,
+            "read_errors": 0,
+        }
+        for name in ("raw", "decode", "log"):
+            self.counters[f"{name}_dropped"] = 0
+            self.counters[f"{name}_dropped_bytes"] = 0
+            self.counters[f"{name}_high_water"] = 0
+
+        self.threads = [
+            threading.Thread(target=self._read_loop, name="uart-reader", daemon=True),
+            threading.Thread(target=self._frame_loop, name="framer", daemon=True),
+            threading.Thread(target=self._decode_loop, name="decoder", daemon=True),
+            threading.Thread(target=self._log_loop, name="logger", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop reading, then wait for the workers to drain what is already
+        queued. The stop marker travels behind the last item of every
+        queue, so once this returns nothing writes to the log or capture
+        any more and the caller may close them. The reader returns within
+        the port's read timeout.
+        """
+        self._stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def run(self, duration):
+        """Capture for duration seconds (Ctrl+C stops early)."""
+        self.start()
+        try:
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline and self.threads[0].is_alive():
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            print("\nStopped by user")
+        finally:
+            self.stop()
+
+    def stats(self):
+        """Snapshot of the pipeline counters and current queue depths."""
+        with self._lock:
+            stats = dict(self.counters)
+        stats["raw_depth"] = self.raw_queue.qsize()
+        stats["decode_depth"] = self.decode_queue.qsize()
+        stats["log_depth"] = self.log_queue.qsize()
+        return stats
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def _offer(self, name, q, item, size):
+        """Queue an item without blocking; count it as dropped if the queue is full."""
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.counters[f"{name}_dropped"] += 1
+                self.counters[f"{name}_dropped_bytes"] += size
+            return
+        depth = q.qsize()
+        with self._lock:
+            if depth > self.counters[f"{name}_high_water"]:
+                self.counters[f"{name}_high_water"] = depth
+
+    def _read_loop(self):
+        ser = self.ser
+        try:
+            while not self._stop.is_set():
+                try:
+                    data = ser.read(ser.in_waiting or 1)
+                except Exception:
+                    self._count("read_errors")
+                    break
+                if data:
+                    timestamp_ns = time.monotonic_ns()
+                    with self._lock:
+                        self.counters["reads"] += 1
+                        self.counters["bytes_read"] += len(data)
+                    self._offer("raw", self.raw_queue, (timestamp_ns, data), len(data))
+        finally:
+            self.raw_queue.put(_STOP)
+
+    @staticmethod
+    def _drain(q):
+        """Discard queued items up to the stop marker (after a stage failed)."""
+        while q.get() is not _STOP:
+            pass
+
+    def _frame_loop(self):
+        line_counter = 0
+        try:
+            while True:
+                item = self.raw_queue.get()
+                if item is _STOP:
+                    return
+                timestamp_ns, data = item
+                line_counter += 1
+
+                packets = self.detector.add_data(data, timestamp_ns)
+                if self.capture:
+                    # Keep the reader's arrival time rather than the framing time
+                    relative_ns = timestamp_ns - self.capture.start_ns
+                    self.capture.write_chunk(data, relative_ns)
+                    for packet in packets:
+                        self.capture.write_packet(packet.type, packet.data, relative_ns)
+
+                with self._lock:
+                    self.counters["chunks_framed"] += 1
+                    self.counters["packets_framed"] += len(packets)
+                if self.formats:
+                    self._offer("decode", self.decode_queue, (line_counter, data), len(data))
+        except BaseException:
+            self._stop.set()
+            self._drain(self.raw_queue)  # Keep the reader from blocking on the marker
+            raise
+        finally:
+            self.decode_queue.put(_STOP)
+
+    def _decode_loop(self):
+        try:
+            while True:
+                item = self.decode_queue.get()
+                if item is _STOP:
+                    return
+                line_counter, data = item
+                lines = [
+                    f"[{line_counter:04d}] [{self.baud}] {format_name}: {self.render(data, format_name)}"
+                    for format_name in self.formats
+                ]
+                self._offer("log", self.log_queue, lines, len(data))
+        except BaseException:
+            self._drain(self.decode_queue)
+            raise
+        finally:
+            self.log_queue.put(_STOP)
+
+    def _log_loop(self):
+        try:
+            while True:
+                lines = self.log_queue.get()
+                if lines is _STOP:
+                    return
+                for line in lines:
+                    if self.log:
+                        self.log.write(line + "\n")
+                    if self.echo:
+                        print(line)
+                self._count("lines_written", len(lines))
+        except BaseException:
+            self._drain(self.log_queue)
+            raise
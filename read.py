@@ -1,8 +1,17 @@
 import serial
 import time
 import codecs
+import re
 from collections import deque
 
+from capture import CaptureWriter, RunLengthWriter
+from checksums import FrameChecksum
+from metrics import CALL_TIME_BUCKETS_US, READ_SIZE_BUCKETS, Histogram, MetricsServer, detector_metrics
+from pipeline import CapturePipeline
+
+# Port the capture reads from
+SERIAL_PORT = "/dev/ttyAMA0"
+
 # Default common UART baud rates
 baud_rates = [
     110, 300, 600, 1200, 2400, 4800, 9600, 10400, 10450, 10500, 10550, 10600, 10638, 10650, 10700, 10800,
@@ -30,11 +39,56 @@ decoding_formats = {
     15: ("ALL", "All formats")
 }
 
+# Log outputs: legacy text log and/or binary capture (see capture.py)
+log_modes = {
+    1: ("TEXT", "Text log (log.txt)"),
+    2: ("BINARY", "Binary capture with packet index (capture.bin)"),
+    3: ("BOTH", "Text log and binary capture"),
+    4: ("RLE", "Deduplicated run-length capture for long rides (capture.rle)")
+}
+
+# Capture modes
+capture_modes = {
+    1: ("DIRECT", "Read, frame, decode and log on one thread"),
+    2: ("PIPELINE", "Dedicated reader thread with framing/decoding/logging workers")
+}
+
+# Capture duration in seconds
+CAPTURE_SECONDS = 300
+
+# Live detector/pipeline metrics (Prometheus text) on http://127.0.0.1:METRICS_PORT/metrics
+METRICS_PORT = 9108
+
 # Protocol constants based on PACKET.md
 STANDARD_PACKET_SIZE = 28
 PACKET_HEADER = [0x30, 0x36, 0x26]  # First 3 bytes of header
 PACKET_TERMINATOR = [0xCE, 0xFE]     # Last 2 bytes
 
+# The 25 header bytes of a 28-byte packet (PACKET.md); byte 26 is the data byte
+FIXED_HEADER = bytes([0x30, 0x36, 0x26, 0x00, 0x0C, 0x30, 0x40, 0x00, 0xFC, 0x30, 0x00, 0x30, 0x42,
+                      0x00, 0x32, 0x30, 0x00, 0x30, 0x82, 0x40, 0x00, 0x30, 0x0E, 0x00, 0x00])
+DATA_BYTE_INDEX = len(FIXED_HEADER)
+# Bytes that follow the gear (PACKET.md) and so are never compared or repaired:
+# header byte 3 (0x26/0x36) and byte 27 (0x8c/0x4c/0xce)
+GEAR_HEADER_INDEX = 2
+GEAR_TERMINATOR_INDEX = 26
+_FIXED_HEADER_INT = int.from_bytes(FIXED_HEADER, "big")
+_FIXED_HEADER_MASK = int.from_bytes(bytes(0 if i == GEAR_HEADER_INDEX else 0xFF for i in range(DATA_BYTE_INDEX)), "big")
+# Offsets of the first fixed bytes, one of which any recoverable frame start must match
+_FIXED_OFFSETS = [i for i in range(DATA_BYTE_INDEX) if i != GEAR_HEADER_INDEX]
+# Default byte errors a frame may carry and still be recovered (0 disables
+# recovery), and whether recovered frames get their fixed bytes restored.
+# main() asks for both at startup (see get_frame_recovery).
+FRAME_RECOVERY_ERRORS = 0
+FRAME_REPAIR = False
+# Default checksum frames must pass, once check/checksum.py has found one,
+# e.g. FrameChecksum("xor", 16, 18, 5); None accepts any well-framed packet.
+# main() asks for one at startup (see get_frame_checksum).
+FRAME_CHECKSUM = None
+# Longest frame (header to next header) a checksum is run on; the rest of a
+# longer one is noise the checksum never reaches
+MAX_FRAME_SPAN = 64
+
 # Known packet patterns for better detection
 KNOWN_PACKET_PATTERNS = {
     "28byte_standard": {
@@ -54,250 +108,593 @@ KNOWN_PACKET_PATTERNS = {
         "min_size": 10,
         "max_size": 27,
         "description": "Partial 28-byte packet"
+    },
+    "be_fe_command": {
+        "header": [0xBE],
+        "end_marker": [0xFE],
+        "min_size": 2,
+        "max_size": 32,
+        "description": "BE...FE framed command"
     }
 }
 
+# BE...FE command types by first byte, shared with the eave/ receivers
+COMMAND_TYPES = {
+    0xCC: "power",
+    0xC2: "control",
+    0x42: "status",
+    0xCE: "header",
+}
+
+# Memory bounds for long-running captures
+HISTORY_SIZE = 0         # Recent packets kept in PacketDetector.packet_history (0: not kept)
+MAX_BUFFER_SIZE = 4096   # Unframed bytes kept after a framing pass before the oldest are dropped
+BUFFER_PREVIEW = 64      # Bytes of the buffer shown by get_buffer_status
+
+# Single-byte control packet values (see PACKET.md)
+SINGLE_BYTE_VALUES = frozenset([0x00, 0x02, 0xFE, 0xFF, 0xFC, 0x01])
+_SINGLE_BYTES = [bytes((b,)) for b in range(256)]  # Shared data for single-byte packets
+
+class PatternMatcher:
+    """
+    Header index compiled once from a packet pattern table.
+
+    Every distinct header, plus the single-byte control values, is folded
+    into one regex alternation so a single scan finds the next candidate no
+    matter how many patterns exist. Patterns sharing a header are then
+    checked against the buffer and the longest valid frame wins.
+
+    Pattern kinds (by keys present in the table entry):
+      - "size" + "terminator": fixed-size frame with a fixed tail
+      - "end_marker" + "max_size": variable frame closed by a marker
+      - "min_size" + "max_size": partial frame cut short by the next header
+    """
+    
+    def __init__(self, patterns, single_bytes=SINGLE_BYTE_VALUES):
+        self.by_header = {}
+        for name, pattern in patterns.items():
+            header = bytes(pattern["header"])
+            if "terminator" in pattern:
+                entry = (name, "fixed", pattern["size"], pattern["size"], bytes(pattern["terminator"]))
+            elif "end_marker" in pattern:
+                entry = (name, "delimited", pattern["min_size"], pattern["max_size"], bytes(pattern["end_marker"]))
+            else:
+                entry = (name, "partial", pattern["min_size"], pattern["max_size"], b"")
+            self.by_header.setdefault(header, []).append(entry)
+        
+        # Longest frames first, so the first valid candidate is the longest
+        for entries in self.by_header.values():
+            entries.sort(key=lambda entry: entry[3], reverse=True)
+        
+        # Longest headers first so overlapping headers resolve to the longest
+        headers = sorted(self.by_header, key=len, reverse=True)
+        alternatives = [re.escape(header) for header in headers]
+        if single_bytes:
+            alternatives.append(b"[" + re.escape(bytes(sorted(single_bytes))) + b"]")
+        self.scanner = re.compile(b"|".join(alternatives))
+        self.header_scanner = re.compile(b"|".join(re.escape(header) for header in headers))
+        self.max_header_size = len(headers[0])
+    
+    def header_at(self, buf, pos):
+        """Return the header starting at pos, or None."""
+        match = self.scanner.match(buf, pos)
+        if match is None:
+            return None
+        header = match.group()
+        return header if header in self.by_header else None
+    
+    def next_candidate(self, buf, pos):
+        """Return the offset of the next header or control byte at or after pos, or -1."""
+        match = self.scanner.search(buf, pos)
+        return -1 if match is None else match.start()
+    
+    def match(self, buf, pos, header):
+        """
+        Match the frames that start with header at pos.
+        Returns (pattern_name, end) for the longest valid frame, None if
+        more data is needed to decide, or False if no pattern fits.
+        """
+        for name, kind, min_size, max_size, tail in self.by_header[header]:
+            end = self._frame_end(buf, pos, header, kind, min_size, max_size, tail)
+            if end is None:
+                return None
+            if end:
+                return name, end
+        return False
+    
+    def _frame_end(self, buf, pos, header, kind, min_size, max_size, tail):
+        """Return the end offset of one frame candidate, None for need-more, False for no match."""
+        limit = pos + max_size
+        # Another occurrence of the same header means this frame was cut short,
+        # also one that starts inside the frame and runs past its end
+        reach = limit + len(header) - 1
+        cut = buf.find(header, pos + len(header), reach)
+        complete = cut == -1 and len(buf) >= reach
+        
+        if kind == "fixed":
+            if cut != -1:
+                return False
+            if not complete:
+                return None
+            return limit if buf.startswith(tail, limit - len(tail)) else False
+        
+        if kind == "delimited":
+            # A delimited frame also ends at any other known header: a stray
+            # opening byte must not swallow the frame that follows it
+            other = self.header_scanner.search(buf, pos + len(header), limit)
+            if other is not None and (cut == -1 or other.start() < cut):
+                cut = other.start()
+                complete = False
+            end = buf.find(tail, pos + len(header), limit if cut == -1 else cut)
+            if end != -1 and end + len(tail) - pos >= min_size:
+                return end + len(tail)
+            return None if cut == -1 and not complete else False
+        
+        # Partial frame: everything up to the next header or max_size
+        if cut == -1 and not complete:
+            return None
+        end = limit if cut == -1 else cut
+        return end if end - pos >= min_size else False
+
+PATTERN_MATCHER = PatternMatcher(KNOWN_PACKET_PATTERNS)
+
+def analyze_28byte_packet(packet_data):
+    """Analyze a 28-byte packet according to PACKET.md."""
+    if len(packet_data) != 28:
+        return {"error": "Invalid packet size"}
+    
+    analysis = {
+        "header": list(packet_data[:25]),
+        "data_byte": packet_data[25],  # Position 26 (0-indexed)
+        "terminator": list(packet_data[26:28]),
+        "data_byte_hex": hex(packet_data[25]),
+        "data_byte_decimal": packet_data[25]
+    }
+    
+    # Analyze the data byte
+    if packet_data[25] == 0x30:
+        analysis["data_byte_meaning"] = "Normal state"
+    elif packet_data[25] == 0x32:
+        analysis["data_byte_meaning"] = "Alternate state"
+    elif packet_data[25] == 0xF0:
+        analysis["data_byte_meaning"] = "Occasional variation"
+    elif packet_data[25] == 0xFE:
+        analysis["data_byte_meaning"] = "Rare variation"
+    elif packet_data[25] == 0xFF:
+        analysis["data_byte_meaning"] = "Possible error indicator"
+    else:
+        analysis["data_byte_meaning"] = "Unknown"
+    
+    # Analyze terminator
+    if packet_data[26:28] == b"\xce\xfe":
+        analysis["terminator_type"] = "Standard"
+    elif packet_data[26:28] == b"\xce\xff":
+        analysis["terminator_type"] = "Error condition"
+    else:
+        analysis["terminator_type"] = "Unknown"
+    
+    return analysis
+
+def analyze_command_packet(packet_data):
+    """Analyze a BE...FE command packet (see eave/receive)."""
+    command = packet_data[1:-1]
+    analysis = {
+        "command": list(command),
+        "command_hex": [hex(b) for b in command],
+        "command_type": "unknown"
+    }
+    
+    if command:
+        analysis["command_type"] = COMMAND_TYPES.get(command[0], "unknown")
+    
+    return analysis
+
+def analyze_partial_packet(packet_data):
+    """Analyze a partial packet."""
+    return {
+        "partial_size": len(packet_data),
+        "has_header": packet_data[:3] == bytes(PACKET_HEADER),
+        "raw_data": list(packet_data)
+    }
+
+def frame_errors(window):
+    """
+    Number of bytes of a 28-byte window (or the start of one) that differ
+    from the fixed frame: the fixed header bytes and a 0xFE/0xFF
+    terminator. The data byte and the gear bytes can be anything.
+
+    The template is the 28-byte CE FE layout of PACKET.md. The 29-byte
+    frames of the PEDRO captures (30 36 26 00 0c 30 02 ... 32 30 3e fe 02)
+    differ from it in several header bytes, so they are never within
+    reach of recovery.
+    """
+    size = min(len(window), DATA_BYTE_INDEX)
+    shift = 8 * (DATA_BYTE_INDEX - size)
+    diff = (int.from_bytes(window[:size], "big") ^ (_FIXED_HEADER_INT >> shift)) & (_FIXED_HEADER_MASK >> shift)
+    errors = size - diff.to_bytes(size, "big").count(0)
+    if len(window) == STANDARD_PACKET_SIZE:
+        errors += window[27] not in (0xFE, 0xFF)
+    return errors
+
+def repair_frame(window):
+    """
+    The frame with every fixed byte restored. The gear bytes, the data
+    byte and a 0xFF terminator are kept as received.
+    """
+    last = window[27] if window[27] in (0xFE, 0xFF) else PACKET_TERMINATOR[1]
+    return (FIXED_HEADER[:GEAR_HEADER_INDEX] + bytes((window[GEAR_HEADER_INDEX],))
+            + FIXED_HEADER[GEAR_HEADER_INDEX + 1:]
+            + bytes((window[DATA_BYTE_INDEX], window[GEAR_TERMINATOR_INDEX], last)))
+
+def split_frames(data, header=bytes(PACKET_HEADER)):
+    """
+    Cut a byte stream into frames, each running from a header to the next
+    one. This is the framing checksums are searched on (check/checksum.py)
+    and checked on (PacketDetector), so both see the same byte positions.
+    """
+    pieces = data.split(header)
+    return [header + piece for piece in pieces[1:]]
+
+# Packet types, interned as small integer ids: every known pattern, frames
+# recovered from byte errors and single bytes
+PACKET_TYPE_NAMES = tuple(KNOWN_PACKET_PATTERNS) + ("28byte_recovered", "single_byte")
+PACKET_TYPE_IDS = {name: type_id for type_id, name in enumerate(PACKET_TYPE_NAMES)}
+RECOVERED_TYPE = PACKET_TYPE_IDS["28byte_recovered"]
+SINGLE_BYTE_TYPE = PACKET_TYPE_IDS["single_byte"]
+_RECOVERABLE_PATTERNS = frozenset(("28byte_standard", "28byte_alt_terminator", "partial_28byte"))
+# Complete frames that get an error count when recovery is on
+_COMPLETE_28BYTE_PATTERNS = frozenset(("28byte_standard", "28byte_alt_terminator"))
+_FRAME_HEADER = bytes(PACKET_HEADER)
+
+def _type_info(name):
+    """(is_complete, description, analyzer) for one packet type."""
+    if name == "single_byte":
+        return None, "Single-byte control packet", lambda data: analyze_single_byte_packet(data[0])
+    if name == "28byte_recovered":
+        return True, "28-byte packet recovered from byte errors", analyze_28byte_packet
+    pattern = KNOWN_PACKET_PATTERNS[name]
+    if "terminator" not in pattern and "end_marker" not in pattern:
+        return False, f"Partial {pattern['description']}", analyze_partial_packet
+    if name in ("28byte_standard", "28byte_alt_terminator"):
+        return True, pattern["description"], analyze_28byte_packet
+    if name == "be_fe_command":
+        return True, pattern["description"], analyze_command_packet
+    return True, pattern["description"], lambda data: {"raw_data": list(data)}
+
+_TYPE_INFO = tuple(_type_info(name) for name in PACKET_TYPE_NAMES)
+
+class Packet:
+    """
+    One framed packet: the raw bytes, where they started in the stream,
+    when the chunk carrying them arrived and an interned type id. errors is
+    the number of corrupted bytes of a recovered frame (0 otherwise).
+
+    The description and analysis are only worked out when read. Packets
+    still support the dict-style access of the old per-packet dicts
+    (packet["type"], packet["data"], packet["analysis"], ...).
+    """
+    
+    __slots__ = ("type_id", "data", "offset", "timestamp_ns", "errors", "_analysis")
+    
+    _FIELDS = frozenset(("type", "data", "size", "description", "analysis", "errors"))
+    
+    def __init__(self, type_id, data, offset, timestamp_ns=None, errors=0):
+        self.type_id = type_id
+        self.data = data
+        self.offset = offset            # Byte offset of the packet in the whole stream
+        self.timestamp_ns = timestamp_ns
+        self.errors = errors
+        self._analysis = None
+    
+    @property
+    def type(self):
+        return PACKET_TYPE_NAMES[self.type_id]
+    
+    @property
+    def size(self):
+        return len(self.data)
+    
+    @property
+    def description(self):
+        return _TYPE_INFO[self.type_id][1]
+    
+    @property
+    def analysis(self):
+        if self._analysis is None:
+            self._analysis = _TYPE_INFO[self.type_id][2](self.data)
+        return self._analysis
+    
+    def __getitem__(self, key):
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._FIELDS else default
+    
+    def __repr__(self):
+        return f"Packet({self.type}, {self.data.hex(' ')}, offset={self.offset})"
+
 class PacketDetector:
     """
     Advanced packet detector that can handle multiple packet types,
     partial packets, and provides detailed analysis.
+
+    Incoming bytes are appended to a compacting bytearray. Headers are
+    located with the compiled PATTERN_MATCHER and packets are sliced out
+    through a memoryview, so no Python work is done per byte of the stream.
+    Packets come out as compact Packet records.
+
+    With max_errors, a 28-byte window that did not frame cleanly but is
+    within max_errors bytes of the fixed frame layout is recovered as a
+    "28byte_recovered" packet instead of being discarded. It is passed on
+    as received and flagged by its type and error count; with repair its
+    fixed bytes are restored (the gear bytes never are). Framed 28-byte
+    packets keep their type and only get their error count. Noise is
+    skipped to the next byte that could start a frame. Only frames of the
+    PACKET.md layout can be recovered (see frame_errors).
+
+    With a checksum (a FrameChecksum, or any callable taking the frame
+    bytes), every packet starting with the frame header must also pass it,
+    run on the frame as split_frames cuts it (up to the next header), as
+    must recovered frames. Frames shorter than the checksum's min_length
+    are let through unchecked. Frames that fail are rejected before
+    reaching analysis and the stream is resynchronised from the next byte.
     """
     
-    def __init__(self):
-        self.buffer = deque()  # Buffer for partial packets
-        self.packet_history = []  # Track packet patterns
+    def __init__(self, history_size=HISTORY_SIZE, max_buffer=MAX_BUFFER_SIZE, max_errors=0, repair=False,
+                 checksum=None):
+        self.buffer = bytearray()  # Buffer for partial packets
+        self.buffer_offset = 0     # Stream offset of buffer[0]
+        self.max_buffer = max_buffer
+        self.max_errors = max_errors
+        self.repair = repair
+        self.checksum = checksum
+        self._skip_end = -1        # Stream offset just past the last byte skipped
+        self.packet_history = deque(maxlen=history_size)  # Recent packets, oldest evicted first (off at 0)
         self.stats = {
             "total_bytes": 0,
             "packets_found": 0,
             "partial_packets": 0,
             "single_bytes": 0,
-            "unknown_patterns": 0
+            "unknown_patterns": 0,
+            "discarded_bytes": 0,
+            "buffer_high_water": 0,
+            "buffer_overflows": 0,
+            "recovered_packets": 0,
+            "repaired_bytes": 0,
+            "checksum_passed": 0,
+            "checksum_failed": 0
         }
+        
+        # Instrumentation (see get_metrics)
+        self.type_counts = [0] * len(PACKET_TYPE_NAMES)
+        self.call_time_us = Histogram(CALL_TIME_BUCKETS_US)
+        self.read_sizes = Histogram(READ_SIZE_BUCKETS)
+        self._timestamp_ns = None
     
-    def add_data(self, data_bytes):
-        """Add new data to the buffer and process for packets."""
-        self.buffer.extend(data_bytes)
+    @property
+    def pattern_counts(self):
+        """Packets framed per pattern name."""
+        return {PACKET_TYPE_NAMES[type_id]: count for type_id, count in enumerate(self.type_counts) if count}
+    
+    def add_data(self, data_bytes, timestamp_ns=None):
+        """
+        Add new data to the buffer and process for packets.
+        timestamp_ns (arrival time of the chunk) is recorded on every packet
+        completed by it.
+        """
+        started = time.perf_counter_ns()
+        self._timestamp_ns = timestamp_ns
+        self.buffer += data_bytes
         self.stats["total_bytes"] += len(data_bytes)
+        self.read_sizes.observe(len(data_bytes))
+        if len(self.buffer) > self.stats["buffer_high_water"]:
+            self.stats["buffer_high_water"] = len(self.buffer)
         
         packets = []
+        pos = 0
         
-        # Process complete packets
-        while len(self.buffer) >= 3:  # Minimum header size
-            packet = self._extract_next_packet()
-            if packet:
-                packets.append(packet)
-            else:
-                break
+        # The view must be released before the buffer is compacted
+        with memoryview(self.buffer) as view:
+            while len(self.buffer) - pos >= PATTERN_MATCHER.max_header_size:
+                packet, pos = self._extract_next_packet(view, pos)
+                if packet:
+                    packets.append(packet)
+                elif packet is None:
+                    break  # Need more data
+        
+        # Cap what is still waiting to be framed (never what just arrived):
+        # drop the oldest unconsumed bytes and resync instead of growing
+        overflow = len(self.buffer) - pos - self.max_buffer
+        if overflow > 0:
+            pos += overflow
+            self.stats["discarded_bytes"] += overflow
+            self.stats["buffer_overflows"] += 1
         
+        # Compact: drop everything that has been consumed
+        if pos:
+            del self.buffer[:pos]
+            self.buffer_offset += pos
+        
+        if self.packet_history.maxlen:
+            self.packet_history.extend(packets)
+        self.call_time_us.observe((time.perf_counter_ns() - started) // 1000)
         return packets
     
-    def _extract_next_packet(self):
-        """Extract the next complete packet from the buffer."""
-        if len(self.buffer) < 3:
-            return None
+    def _extract_next_packet(self, view, pos):
+        """
+        Extract the next packet starting at or after pos.
+        Returns (packet, new_pos). packet is None when more data is needed
+        and False when bytes were skipped without producing a packet.
+        """
+        buf = self.buffer
+        recover = self.max_errors
+        
+        header = PATTERN_MATCHER.header_at(buf, pos)
+        if header is not None:
+            match = PATTERN_MATCHER.match(buf, pos, header)
+            if match is None:
+                return None, pos  # Not enough data yet
+            if match:
+                pattern_name, end = match
+                if recover and pattern_name == "partial_28byte":
+                    # A partial frame may be a whole one with a bad terminator
+                    recovered = self._try_recover(view, pos)
+                    if recovered is None or recovered[0]:
+                        return recovered or (None, pos)
+                    recover = False  # Already tried at this position
+                checked = True
+                if self.checksum is not None and header == _FRAME_HEADER:
+                    checked = self._check_header_frame(view, pos)
+                    if checked is None:
+                        return None, pos  # The frame runs on past the buffer
+                if checked:
+                    packet = self._build_packet(view, pos, end, pattern_name)
+                    if recover and pattern_name in _COMPLETE_28BYTE_PATTERNS:
+                        packet.errors = frame_errors(view[pos:end])  # Flagged, never relabelled
+                    return packet, end
         
-        # Look for known packet patterns
-        for pattern_name, pattern in KNOWN_PACKET_PATTERNS.items():
-            packet = self._try_extract_pattern(pattern_name, pattern)
-            if packet:
-                return packet
+        if recover:
+            recovered = self._try_recover(view, pos)
+            if recovered is None:
+                return None, pos  # Wait for a whole window
+            if recovered[0]:
+                return recovered
         
-        # Look for single-byte packets
-        single_byte = self._try_extract_single_byte()
-        if single_byte:
+        single_byte = self._try_extract_single_byte(pos)
+        if single_byte is not None:
             return single_byte
         
-        # If no pattern matches, remove one byte and try again
-        self.buffer.popleft()
-        return None
-    
-    def _try_extract_pattern(self, pattern_name, pattern):
-        """Try to extract a packet matching the given pattern."""
-        if len(self.buffer) < len(pattern["header"]):
-            return None
+        # Skip straight to the next header or control byte candidate
+        next_pos = PATTERN_MATCHER.next_candidate(buf, pos + 1)
+        if next_pos == -1:
+            # Keep a possible split header at the tail of the buffer
+            next_pos = max(pos + 1, len(buf) - (PATTERN_MATCHER.max_header_size - 1))
         
-        # Check header
-        for i, expected in enumerate(pattern["header"]):
-            if self.buffer[i] != expected:
-                return None
+        if self.max_errors:
+            # A corrupted frame still matches one of its first max_errors + 1
+            # fixed bytes, so stop at the next position where one of them fits
+            offsets = _FIXED_OFFSETS[:self.max_errors + 1]
+            next_pos = min(next_pos, max(pos + 1, len(buf) - offsets[-1]))
+            for offset in offsets:
+                found = buf.find(FIXED_HEADER[offset], pos + 1 + offset, next_pos + offset)
+                if found != -1:
+                    next_pos = found - offset
         
-        # For complete packets, check size and terminator
-        if "size" in pattern:
-            if len(self.buffer) < pattern["size"]:
-                return None  # Not enough data yet
-            
-            packet_data = list(self.buffer)[:pattern["size"]]
-            
-            # Check terminator
-            if "terminator" in pattern:
-                terminator = pattern["terminator"]
-                if (packet_data[-len(terminator)] != terminator[0] or 
-                    packet_data[-len(terminator)+1] != terminator[1]):
-                    return None
-            
-            # Extract the packet
-            packet_bytes = bytes(packet_data)
-            for _ in range(pattern["size"]):
-                self.buffer.popleft()
-            
+        # Skips that continue where the last one ended (a failed candidate,
+        # a split header kept across reads) still count as one unknown run
+        if self.buffer_offset + pos != self._skip_end:
+            self.stats["unknown_patterns"] += 1
+        self._skip_end = self.buffer_offset + next_pos
+        self.stats["discarded_bytes"] += next_pos - pos
+        return False, next_pos
+    
+    def _build_packet(self, view, start, end, pattern_name):
+        """Slice a matched frame out of the buffer into a Packet."""
+        type_id = PACKET_TYPE_IDS[pattern_name]
+        self.type_counts[type_id] += 1
+        if _TYPE_INFO[type_id][0]:
             self.stats["packets_found"] += 1
-            return {
-                "type": pattern_name,
-                "data": packet_bytes,
-                "size": len(packet_bytes),
-                "description": pattern["description"],
-                "analysis": self._analyze_packet(packet_bytes, pattern_name)
-            }
-        
-        # For partial packets
-        elif "min_size" in pattern and "max_size" in pattern:
-            if len(self.buffer) >= pattern["min_size"]:
-                # Extract what we have
-                packet_data = list(self.buffer)[:pattern["max_size"]]
-                packet_bytes = bytes(packet_data)
-                
-                # Remove the data we processed
-                for _ in range(len(packet_data)):
-                    self.buffer.popleft()
-                
-                self.stats["partial_packets"] += 1
-                return {
-                    "type": pattern_name,
-                    "data": packet_bytes,
-                    "size": len(packet_bytes),
-                    "description": f"Partial {pattern['description']}",
-                    "analysis": self._analyze_partial_packet(packet_bytes)
-                }
-        
-        return None
+        else:
+            self.stats["partial_packets"] += 1
+        return Packet(type_id, view[start:end].tobytes(), self.buffer_offset + start, self._timestamp_ns)
+    
+    def _try_recover(self, view, pos):
+        """
+        Try to recover a 28-byte frame at pos that did not frame cleanly.
+        Returns (packet, end), (False, pos) when the window is too far from
+        the frame layout, or None when the buffer does not hold a whole
+        window yet.
+        """
+        end = pos + STANDARD_PACKET_SIZE
+        if end > len(self.buffer):
+            # Only hold back bytes that can still become a frame
+            return None if frame_errors(view[pos:]) <= self.max_errors else (False, pos)
+        window = view[pos:end]
+        errors = frame_errors(window)
+        if errors > self.max_errors:
+            return False, pos
+        data = repair_frame(window) if self.repair else window.tobytes()
+        if self.checksum is not None and not self._check_frame(data):
+            return False, pos
+        self.stats["recovered_packets"] += 1
+        if self.repair:
+            self.stats["repaired_bytes"] += errors
+        self.type_counts[RECOVERED_TYPE] += 1
+        return Packet(RECOVERED_TYPE, data, self.buffer_offset + pos, self._timestamp_ns, errors), end
+    
+    def _check_header_frame(self, view, pos):
+        """
+        Run the checksum on the frame at pos as split_frames cuts it, up to
+        the next header (or MAX_FRAME_SPAN bytes). None until that is known.
+        """
+        buf = self.buffer
+        limit = pos + MAX_FRAME_SPAN
+        end = buf.find(_FRAME_HEADER, pos + len(_FRAME_HEADER), limit)
+        if end == -1:
+            if len(buf) < limit:
+                return None
+            end = limit
+        return self._check_frame(view[pos:end])
+    
+    def _check_frame(self, frame):
+        """Run the checksum on a frame long enough to hold it and count the outcome."""
+        if len(frame) < getattr(self.checksum, "min_length", 0):
+            return True
+        if self.checksum(frame):
+            self.stats["checksum_passed"] += 1
+            return True
+        self.stats["checksum_failed"] += 1
+        return False
     
-    def _try_extract_single_byte(self):
+    def _try_extract_single_byte(self, pos):
         """Try to extract a single-byte control packet."""
-        if not self.buffer:
-            return None
-        
-        byte = self.buffer[0]
+        byte = self.buffer[pos]
         
         # Check if this could be a valid single-byte packet
-        if byte in [0x00, 0x02, 0xFE, 0xFF, 0xFC, 0x01]:
+        if byte in SINGLE_BYTE_VALUES:
             # Validate context
-            is_valid = self._validate_single_byte_context(byte)
+            is_valid = self._validate_single_byte_context(pos)
             if is_valid:
-                self.buffer.popleft()
                 self.stats["single_bytes"] += 1
-                return {
-                    "type": "single_byte",
-                    "data": bytes([byte]),
-                    "size": 1,
-                    "description": "Single-byte control packet",
-                    "analysis": self._analyze_single_byte(byte)
-                }
+                self.type_counts[SINGLE_BYTE_TYPE] += 1
+                return Packet(SINGLE_BYTE_TYPE, _SINGLE_BYTES[byte], self.buffer_offset + pos,
+                              self._timestamp_ns), pos + 1
         
         return None
     
-    def _validate_single_byte_context(self, byte):
+    def _validate_single_byte_context(self, pos):
         """Validate if a single byte is likely a control packet."""
-        # Case 1: Isolated single byte
-        if len(self.buffer) > 1:
-            next_byte = self.buffer[1]
-            if next_byte not in [0x00, 0x02, 0xFE, 0xFF, 0xFC]:
-                return True
-        
-        # Case 2: At start of buffer
-        if len(self.buffer) == 1:
-            return True
-        
-        # Case 3: Part of control sequence
-        if len(self.buffer) > 1 and self.buffer[1] in [0xFE, 0xFF]:
-            return True
-        
-        return False
-    
-    def _analyze_packet(self, packet_data, pattern_name):
-        """Analyze a complete packet."""
-        if pattern_name == "28byte_standard" or pattern_name == "28byte_alt_terminator":
-            return self._analyze_28byte_packet(packet_data)
-        else:
-            return {"raw_data": list(packet_data)}
-    
-    def _analyze_28byte_packet(self, packet_data):
-        """Analyze a 28-byte packet according to PACKET.md."""
-        if len(packet_data) != 28:
-            return {"error": "Invalid packet size"}
-        
-        analysis = {
-            "header": list(packet_data[:25]),
-            "data_byte": packet_data[25],  # Position 26 (0-indexed)
-            "terminator": list(packet_data[26:28]),
-            "data_byte_hex": hex(packet_data[25]),
-            "data_byte_decimal": packet_data[25]
-        }
-        
-        # Analyze the data byte
-        if packet_data[25] == 0x30:
-            analysis["data_byte_meaning"] = "Normal state"
-        elif packet_data[25] == 0x32:
-            analysis["data_byte_meaning"] = "Alternate state"
-        elif packet_data[25] == 0xF0:
-            analysis["data_byte_meaning"] = "Occasional variation"
-        elif packet_data[25] == 0xFE:
-            analysis["data_byte_meaning"] = "Rare variation"
-        elif packet_data[25] == 0xFF:
-            analysis["data_byte_meaning"] = "Possible error indicator"
-        else:
-            analysis["data_byte_meaning"] = "Unknown"
-        
-        # Analyze terminator
-        if packet_data[26:28] == [0xCE, 0xFE]:
-            analysis["terminator_type"] = "Standard"
-        elif packet_data[26:28] == [0xCE, 0xFF]:
-            analysis["terminator_type"] = "Error condition"
-        else:
-            analysis["terminator_type"] = "Unknown"
-        
-        return analysis
-    
-    def _analyze_partial_packet(self, packet_data):
-        """Analyze a partial packet."""
-        return {
-            "partial_size": len(packet_data),
-            "has_header": len(packet_data) >= 3 and packet_data[:3] == [0x30, 0x36, 0x26],
-            "raw_data": list(packet_data)
-        }
-    
-    def _analyze_single_byte(self, byte_value):
-        """Analyze a single-byte packet."""
-        analysis = {
-            "value": hex(byte_value),
-            "decimal": byte_value,
-            "likely_purpose": "Unknown"
-        }
-        
-        # Based on PACKET.md analysis
-        if byte_value == 0x02:
-            analysis["likely_purpose"] = "Acknowledgment (ACK)"
-        elif byte_value == 0xFE:
-            analysis["likely_purpose"] = "Status update"
-        elif byte_value == 0xFF:
-            analysis["likely_purpose"] = "Error indicator"
-        elif byte_value == 0x00:
-            analysis["likely_purpose"] = "Null/empty"
-        elif byte_value == 0xFC:
-            analysis["likely_purpose"] = "Flow control"
-        elif byte_value == 0x01:
-            analysis["likely_purpose"] = "Control signal"
-        
-        return analysis
+        # Isolated single byte, or part of a control sequence (0xFE/0xFF)
+        next_byte = self.buffer[pos + 1]
+        return next_byte not in (0x00, 0x02, 0xFC)
     
     def get_stats(self):
         """Get current statistics."""
         return self.stats.copy()
     
+    def get_metrics(self):
+        """
+        Statistics plus instrumentation: per-pattern counts, current buffer
+        size and the add_data timing / read size histograms (bounds, bucket
+        counts, sum, count).
+        """
+        metrics = self.stats.copy()
+        metrics["pattern_counts"] = dict(self.pattern_counts)
+        metrics["buffer_size"] = len(self.buffer)
+        metrics["add_data_time_us"] = self.call_time_us.snapshot()
+        metrics["read_sizes"] = self.read_sizes.snapshot()
+        return metrics
+    
     def get_buffer_status(self):
-        """Get current buffer status."""
+        """Get current buffer status (contents limited to the first BUFFER_PREVIEW bytes)."""
         return {
             "buffer_size": len(self.buffer),
-            "buffer_contents": list(self.buffer)
+            "buffer_capacity": self.max_buffer,
+            "buffer_high_water": self.stats["buffer_high_water"],
+            "buffer_contents": list(self.buffer[:BUFFER_PREVIEW]),
+            "truncated": len(self.buffer) > BUFFER_PREVIEW
         }
 
 def extract_28byte_packets(data_bytes):
@@ -418,60 +815,126 @@ def analyze_packet_structure(packet_data):
     
     return analysis
 
-def decode_data(data, format_type):
+# Text codecs behind the decoding formats that are plain bytes.decode calls
+CODEC_FORMATS = {
+    "UTF8": "utf-8",
+    "GBK": "gbk",
+    "GB2312": "gb2312",
+    "BIG5": "big5",
+    "SHIFT_JIS": "shift_jis",
+    "EUC_JP": "euc_jp",
+    "ISO_8859_1": "iso-8859-1",
+}
+
+# Per-byte lookup tables, built once
+_DEC_TABLE = [str(b) for b in range(256)]
+_HEX_TABLE = [hex(b) for b in range(256)]
+_OCTAL_TABLE = [oct(b) for b in range(256)]
+
+def _joined_renderer(table, separator=" "):
+    """Render bytes as the table's per-byte strings joined by separator."""
+    lookup = table.__getitem__
+    def render(data):
+        return separator.join(map(lookup, data))
+    return render
+
+def _list_renderer(table):
+    """Render bytes exactly as str() of the list of the table's strings."""
+    join = _joined_renderer([repr(s) for s in table], ", ")
+    def render(data):
+        return "[" + join(data) + "]"
+    return render
+
+def _codec_renderer(codec):
+    def render(data):
+        return data.decode(codec, errors="replace")
+    return render
+
+def _build_renderers():
     """
-    Decode data according to the specified format.
+    Build the renderer registry from decoding_formats.
+    Returns (value_renderers, text_renderers): the former keep the
+    decode_data return types, the latter produce the printed/logged text.
     """
+    value_renderers = {
+        "RAW": repr,
+        "DEC": lambda data: list(map(_DEC_TABLE.__getitem__, data)),
+        "HEX": lambda data: list(map(_HEX_TABLE.__getitem__, data)),
+        "HEX_ONLY": lambda data: data.hex(" "),
+        "ASCII": _joined_renderer([chr(b) if 32 <= b <= 126 else f'\\x{b:02x}' for b in range(256)], ""),
+        "BINARY": _joined_renderer([f'{b:08b}' for b in range(256)]),
+        "OCTAL": lambda data: list(map(_OCTAL_TABLE.__getitem__, data)),
+    }
+    text_renderers = dict(value_renderers)
+    text_renderers["DEC"] = _list_renderer(_DEC_TABLE)
+    text_renderers["HEX"] = _list_renderer(_HEX_TABLE)
+    text_renderers["OCTAL"] = _list_renderer(_OCTAL_TABLE)
+    
+    for format_name, _ in decoding_formats.values():
+        codec = CODEC_FORMATS.get(format_name)
+        if codec:
+            value_renderers[format_name] = text_renderers[format_name] = _codec_renderer(codec)
+    
+    # Only keep renderers for formats that can actually be selected
+    selectable = {format_name for format_name, _ in decoding_formats.values()}
+    value_renderers = {k: v for k, v in value_renderers.items() if k in selectable}
+    text_renderers = {k: v for k, v in text_renderers.items() if k in selectable}
+    return value_renderers, text_renderers
+
+VALUE_RENDERERS, TEXT_RENDERERS = _build_renderers()
+
+def _render(renderers, data, format_type):
+    renderer = renderers.get(format_type)
+    if renderer is None:
+        return f"Unknown format: {format_type}"
     try:
-        if format_type == "RAW":
-            return repr(data)
-        elif format_type == "DEC":
-            return [str(b) for b in data]
-        elif format_type == "HEX":
-            return [hex(b) for b in data]
-        elif format_type == "HEX_ONLY":
-            return ' '.join(f'{b:02x}' for b in data)
-        elif format_type == "ASCII":
-            return ''.join(chr(b) if 32 <= b <= 126 else f'\\x{b:02x}' for b in data)
-        elif format_type == "UTF8":
-            return data.decode('utf-8', errors='replace')
-        elif format_type == "GBK":
-            return data.decode('gbk', errors='replace')
-        elif format_type == "GB2312":
-            return data.decode('gb2312', errors='replace')
-        elif format_type == "BIG5":
-            return data.decode('big5', errors='replace')
-        elif format_type == "SHIFT_JIS":
-            return data.decode('shift_jis', errors='replace')
-        elif format_type == "EUC_JP":
-            return data.decode('euc_jp', errors='replace')
-        elif format_type == "ISO_8859_1":
-            return data.decode('iso-8859-1', errors='replace')
-        elif format_type == "BINARY":
-            return ' '.join(f'{b:08b}' for b in data)
-        elif format_type == "OCTAL":
-            return [oct(b) for b in data]
-        else:
-            return f"Unknown format: {format_type}"
+        return renderer(data)
     except Exception as e:
         return f"Error decoding {format_type}: {e}"
 
+def decode_data(data, format_type):
+    """
+    Decode data according to the specified format.
+    """
+    return _render(VALUE_RENDERERS, data, format_type)
+
+def render_data(data, format_type):
+    """
+    Render data as the text that decode_data's result prints as.
+    """
+    return _render(TEXT_RENDERERS, data, format_type)
+
 def print_decoding_formats():
     """Print available decoding formats."""
     print("\nAvailable decoding formats:")
     for key, (format_name, description) in decoding_formats.items():
         print(f"{key:2d}: {format_name:<12} - {description}")
 
+def auto_detect_baud():
+    """Sweep the baud_rates table on SERIAL_PORT and lock onto the best framing rate."""
+    from autobaud import detect_baud
+    
+    print(f"\nAuto-detecting baud rate on {SERIAL_PORT}...")
+    baud, ranked = detect_baud(SERIAL_PORT)
+    if baud is None or ranked[0][1]["score"] == 0:
+        raise ValueError("no baud rate produced any packets")
+    print(f"Locked onto {baud} baud (score {dict(ranked)[baud]['score']:.3f})")
+    return baud
+
 def get_user_selections():
     """Get user selections for baud rate and decoding formats."""
     # Get baud rate selection
     print("Available baud rates:")
+    print("0: Auto-detect (score each rate by packet framing)")
     for i, br in enumerate(baud_rates):
         print(f"{i + 1}: {br}")
     
     try:
         index = int(input("Select baud rate number: ")) - 1
-        baud = baud_rates[index]
+        if index == -1:
+            baud = auto_detect_baud()
+        else:
+            baud = baud_rates[index]
     except:
         print("Invalid selection.")
         exit(1)
@@ -483,12 +946,14 @@ def get_user_selections():
     
     selected_formats = []
     if format_input == 'all':
-        selected_formats = [format_name for _, (format_name, _) in decoding_formats.items()]
+        selected_formats = list(TEXT_RENDERERS)
     else:
         try:
             format_indices = [int(x.strip()) for x in format_input.split(',')]
             for idx in format_indices:
-                if idx in decoding_formats:
+                if decoding_formats.get(idx, ("",))[0] == "ALL":
+                    selected_formats.extend(TEXT_RENDERERS)
+                elif idx in decoding_formats:
                     selected_formats.append(decoding_formats[idx][0])
                 else:
                     print(f"Warning: Invalid format number {idx}")
@@ -502,53 +967,183 @@ def get_user_selections():
     
     return baud, selected_formats
 
-# Get user selections
-baud, selected_formats = get_user_selections()
+def get_log_mode():
+    """Ask where the capture should be written."""
+    print("\nLog outputs:")
+    for key, (mode_name, description) in log_modes.items():
+        print(f"{key}: {mode_name:<7} - {description}")
+    
+    try:
+        return log_modes[int(input("Select log output (default 1): ").strip() or 1)][0]
+    except (ValueError, KeyError):
+        print("Invalid selection. Using text log.")
+        return "TEXT"
+
+def get_capture_mode():
+    """Ask whether to run the single-threaded loop or the threaded pipeline."""
+    print("\nCapture modes:")
+    for key, (mode_name, description) in capture_modes.items():
+        print(f"{key}: {mode_name:<8} - {description}")
+    
+    try:
+        return capture_modes[int(input("Select capture mode (default 1): ").strip() or 1)][0]
+    except (ValueError, KeyError):
+        print("Invalid selection. Using direct mode.")
+        return "DIRECT"
 
-print(f"\nSelected baud rate: {baud}")
-print(f"Selected formats: {', '.join(selected_formats)}")
+def get_frame_checksum():
+    """
+    Ask for the checksum frames must pass, as check/checksum.py prints it
+    ("xor 16-17 5": algorithm, window, position). Empty keeps FRAME_CHECKSUM.
+    """
+    text = input(f"Frame checksum, e.g. 'xor 16-17 5' (default {FRAME_CHECKSUM or 'none'}): ").strip()
+    if not text:
+        return FRAME_CHECKSUM
+    if text.lower() == "none":
+        return None
+    try:
+        return FrameChecksum.parse(text)
+    except ValueError as e:
+        print(f"Invalid checksum ({e}). Using the default.")
+        return FRAME_CHECKSUM
 
-# Try the selected baud rate
-line_counter = 0
-print(f"\nTrying baud rate: {baud}")
+def get_frame_recovery():
+    """
+    Ask how many byte errors a frame may carry and still be recovered, and
+    whether recovered frames are repaired. Empty keeps FRAME_RECOVERY_ERRORS
+    and FRAME_REPAIR. Returns (max_errors, repair).
+    """
+    text = input(f"Frame recovery, byte errors allowed, 0 for off (default {FRAME_RECOVERY_ERRORS}): ").strip()
+    try:
+        max_errors = int(text) if text else FRAME_RECOVERY_ERRORS
+        if max_errors < 0:
+            raise ValueError(text)
+    except ValueError:
+        print("Invalid number. Using the default.")
+        max_errors = FRAME_RECOVERY_ERRORS
+    if not max_errors:
+        return 0, False
+    answer = input(f"Repair recovered frames? (y/n, default {'y' if FRAME_REPAIR else 'n'}): ").strip().lower()
+    return max_errors, answer.startswith("y") if answer else FRAME_REPAIR
 
-# Initialize the advanced packet detector
-detector = PacketDetector()
+def main():
+    # Get user selections
+    baud, selected_formats = get_user_selections()
+    log_mode = get_log_mode()
+    capture_mode = get_capture_mode()
+    frame_checksum = get_frame_checksum()
+    max_errors, repair = get_frame_recovery()
+    write_text = log_mode in ("TEXT", "BOTH")
 
-try:
-    with serial.Serial("/dev/ttyAMA0", baudrate=baud, timeout=1) as ser, open("log.txt", "a") as log:
-        start = time.time()
-        while time.time() - start < 300:  # 5 minutes = 300 seconds
-            data = ser.read(ser.in_waiting or 1)
-            if data:
-                line_counter += 1
+    print(f"\nSelected baud rate: {baud}")
+    print(f"Selected formats: {', '.join(selected_formats)}")
+    print(f"Log output: {log_mode}")
+    print(f"Capture mode: {capture_mode}")
+    print(f"Frame checksum: {frame_checksum or 'none'}")
+    if max_errors:
+        print(f"Frame recovery: up to {max_errors} byte errors{', repaired' if repair else ''}")
+    else:
+        print("Frame recovery: off")
+
+    # Try the selected baud rate
+    line_counter = 0
+    print(f"\nTrying baud rate: {baud}")
+
+    # Initialize the advanced packet detector
+    detector = PacketDetector(max_errors=max_errors, repair=repair, checksum=frame_checksum)
+    pipeline = None
+    capture = None
+    
+    # Serve live statistics while capturing
+    metrics_server = None
+    try:
+        metrics_server = MetricsServer(lambda: detector_metrics(detector, pipeline), METRICS_PORT).start()
+        print(f"Live statistics: {metrics_server.url}")
+    except OSError as e:
+        print(f"Live statistics disabled: {e}")
+
+    try:
+        with serial.Serial(SERIAL_PORT, baudrate=baud, timeout=1) as ser, open("log.txt", "a") as log:
+            if log_mode in ("BINARY", "BOTH"):
+                capture = CaptureWriter("capture.bin", baud)
+            elif log_mode == "RLE":
+                capture = RunLengthWriter("capture.rle", baud)
+            if capture_mode == "PIPELINE":
+                pipeline = CapturePipeline(ser, detector, baud, selected_formats, render=render_data,
+                                           log=log if write_text else None, capture=capture)
+                pipeline.run(CAPTURE_SECONDS)
+            else:
+                start = time.time()
+                while time.time() - start < CAPTURE_SECONDS:
+                    data = ser.read(ser.in_waiting or 1)
+                    if data:
+                        line_counter += 1
                 
-                # Use the advanced packet detector
-                packets = detector.add_data(data)
+                        # Use the advanced packet detector
+                        packets = detector.add_data(data, time.monotonic_ns())
+                    
+                        if capture:
+                            capture.write_chunk(data)
+                            for packet in packets:
+                                capture.write_packet(packet.type, packet.data)
                 
-                # Output all selected formats
-                for format_name in selected_formats:
-                    decoded_data = decode_data(data, format_name)
-                    log.write(f"[{line_counter:04d}] [{baud}] {format_name}: {decoded_data}\n")
-                    print(f"[{line_counter:04d}] [{baud}] {format_name}: {decoded_data}")
+                        # Output all selected formats, each rendered once
+                        for format_name in selected_formats:
+                            decoded_data = render_data(data, format_name)
+                            if write_text:
+                                log.write(f"[{line_counter:04d}] [{baud}] {format_name}: {decoded_data}\n")
+                            print(f"[{line_counter:04d}] [{baud}] {format_name}: {decoded_data}")
         
-        # Show final statistics
-        stats = detector.get_stats()
-        print(f"\nFinal Statistics:")
-        print(f"  Total bytes processed: {stats['total_bytes']}")
-        print(f"  Complete packets found: {stats['packets_found']}")
-        print(f"  Partial packets found: {stats['partial_packets']}")
-        print(f"  Single-byte packets: {stats['single_bytes']}")
-        print(f"  Unknown patterns: {stats['unknown_patterns']}")
+            # Show final statistics
+            stats = detector.get_stats()
+            print(f"\nFinal Statistics:")
+            print(f"  Total bytes processed: {stats['total_bytes']}")
+            print(f"  Complete packets found: {stats['packets_found']}")
+            print(f"  Partial packets found: {stats['partial_packets']}")
+            print(f"  Single-byte packets: {stats['single_bytes']}")
+            print(f"  Unknown patterns: {stats['unknown_patterns']} ({stats['discarded_bytes']} bytes discarded)")
+            print(f"  Recovered packets: {stats['recovered_packets']} ({stats['repaired_bytes']} bytes repaired)")
+            if detector.checksum is not None:
+                print(f"  Checksum: {stats['checksum_passed']} passed, {stats['checksum_failed']} rejected")
+            print(f"  Buffer high-water: {stats['buffer_high_water']} bytes")
+            
+            if pipeline:
+                pipeline_stats = pipeline.stats()
+                print(f"\nPipeline Statistics:")
+                print(f"  Serial reads: {pipeline_stats['reads']} ({pipeline_stats['bytes_read']} bytes)")
+                print(f"  Read errors: {pipeline_stats['read_errors']}")
+                for name in ("raw", "decode", "log"):
+                    print(f"  {name} queue: {pipeline_stats[name + '_dropped']} dropped "
+                          f"({pipeline_stats[name + '_dropped_bytes']} bytes), "
+                          f"high-water {pipeline_stats[name + '_high_water']}")
         
-        log.write(f"\nFinal Statistics:\n")
-        log.write(f"  Total bytes processed: {stats['total_bytes']}\n")
-        log.write(f"  Complete packets found: {stats['packets_found']}\n")
-        log.write(f"  Partial packets found: {stats['partial_packets']}\n")
-        log.write(f"  Single-byte packets: {stats['single_bytes']}\n")
-        log.write(f"  Unknown patterns: {stats['unknown_patterns']}\n")
+            if write_text:
+                log.write(f"\nFinal Statistics:\n")
+                log.write(f"  Total bytes processed: {stats['total_bytes']}\n")
+                log.write(f"  Complete packets found: {stats['packets_found']}\n")
+                log.write(f"  Partial packets found: {stats['partial_packets']}\n")
+                log.write(f"  Single-byte packets: {stats['single_bytes']}\n")
+                log.write(f"  Unknown patterns: {stats['unknown_patterns']} ({stats['discarded_bytes']} bytes discarded)\n")
+                log.write(f"  Recovered packets: {stats['recovered_packets']} ({stats['repaired_bytes']} bytes repaired)\n")
+                if detector.checksum is not None:
+                    log.write(f"  Checksum: {stats['checksum_passed']} passed, {stats['checksum_failed']} rejected\n")
+                log.write(f"  Buffer high-water: {stats['buffer_high_water']} bytes\n")
         
-except Exception as e:
-    print(f"[{baud}] Error: {e}")
+    except Exception as e:
+        print(f"[{baud}] Error: {e}")
+    finally:
+        # Write the footer index even when the capture loop failed
+        if capture:
+            capture.close()
+        if metrics_server:
+            metrics_server.stop()
+
+    if write_text:
+        print("\nDone. Check log.txt for full output.")
+    elif log_mode == "RLE":
+        print("\nDone. Run 'python capture.py capture.rle' for a summary.")
+    else:
+        print("\nDone. Run 'python capture.py capture.bin --text log.txt' for a text view.")
 
-print("\nDone. Check log.txt for full output.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import ast
+import os
+import re
+import time
+import tty
+from array import array
+
+from capture import MAGIC, CaptureReader, RunLengthReader, is_run_length_capture
+from scheduler import TxBuffer, wait_until
+
+# "[0001] [16250] HEX: 30 36 26" as written by read.py and the PEDRO captures
+LOG_LINE = re.compile(r'^\[(\d+)\] \[(\d+)\] ([A-Za-z_ ]+): (.*)$')
+
+# Formats a chunk can be recovered from, most exact first
+_HEX_DIGITS = re.compile(r'[0-9a-fA-F]+')
+_DIGITS = re.compile(r'\d+')
+
+def _parse_hex(text):
+    return bytes(int(token, 16) for token in _HEX_DIGITS.findall(text.replace('0x', ' ')))
+
+PARSERS = {
+    "RAW": lambda text: bytes(ast.literal_eval(text)),
+    "HEX_ONLY": _parse_hex,
+    "HEX ONLY": _parse_hex,
+    "HEX": _parse_hex,
+    "DEC": lambda text: bytes(int(token) for token in _DIGITS.findall(text)),
+    "BINARY": lambda text: bytes(int(token, 2) for token in text.split()),
+}
+_PREFERENCE = {name: rank for rank, name in enumerate(PARSERS)}
+
+# 8N1: 10 bit times per byte on the wire
+BITS_PER_BYTE = 10
+
+def is_binary_capture(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_text_log(path):
+    """
+    Yield (baud, data) for every serial read in a text log. Each read is
+    logged once per selected format; it is recovered from the most exact
+    format present (RAW, then HEX, DEC, BINARY). Lines that are not data
+    (packet analysis, separators, truncated lines) are skipped.
+    """
+    current = None   # (line number, baud) of the read being collected
+    best = None      # (preference, format, text)
+
+    def chunk():
+        if best is None:
+            return None
+        try:
+            return PARSERS[best[1]](best[2])
+        except (ValueError, SyntaxError):
+            return None
+
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            match = LOG_LINE.match(line.rstrip('\n'))
+            if not match:
+                continue
+            counter, baud, format_name, text = match.groups()
+            format_name = format_name.strip().upper()
+            if format_name not in PARSERS:
+                continue
+
+            key = (counter, baud)
+            if key != current:
+                data = chunk()
+                if data:
+                    yield int(current[1]), data
+                current, best = key, None
+
+            rank = _PREFERENCE[format_name]
+            if best is None or rank < best[0]:
+                best = (rank, format_name, text)
+
+    data = chunk()
+    if data:
+        yield int(current[1]), data
+
+def load_chunks(path, baudrate=None, gap=0.0):
+    """
+    Return (baudrate, [(timestamp_ns, data)]) for a binary capture or a text
+    log. Binary captures keep their recorded arrival times, run-length
+    captures come back one frame per chunk, spread over each run at its
+    frame period. Text logs have no timestamps, so each read is placed
+    right after the previous one finished on the wire at the logged baud
+    rate, plus gap seconds.
+    """
+    if is_binary_capture(path):
+        with CaptureReader(path) as reader:
+            chunks = [(timestamp_ns, bytes(data)) for timestamp_ns, data in reader.chunks()]
+            return baudrate or reader.baudrate, chunks
+    if is_run_length_capture(path):
+        with RunLengthReader(path) as reader:
+            return baudrate or reader.baudrate, list(reader.expand())
+
+    chunks = []
+    timestamp_ns = 0
+    gap_ns = round(gap * 1_000_000_000)
+    logged_baud = None
+    for baud, data in read_text_log(path):
+        logged_baud = logged_baud or baud
+        timestamp_ns += len(data) * BITS_PER_BYTE * 1_000_000_000 // (baudrate or baud) + gap_ns
+        chunks.append((timestamp_ns, data))
+    return baudrate or logged_baud, chunks
+
+def replay(chunks, out, speed=1.0, window=0.002, progress_every=0):
+    """
+    Write chunks to out with their original spacing divided by speed
+    (speed 0: as fast as possible). Chunk deadlines are absolute from the
+    start, and chunks due within window seconds of each other go out in
+    one write. Returns the replay statistics.
+    """
+    tx = TxBuffer(out)
+    window_ns = round(window * 1_000_000_000)
+    lateness_ns = array('q')
+    byte_count = 0
+
+    start_ns = time.monotonic_ns()
+    first_ns = chunks[0][0] if chunks else 0
+    i = 0
+    try:
+        while i < len(chunks):
+            if speed:
+                deadline_ns = start_ns + int((chunks[i][0] - first_ns) / speed)
+                now = wait_until(deadline_ns)
+                lateness_ns.append(now - deadline_ns)
+
+            # Take every chunk that is due within the window in the same write
+            while i < len(chunks):
+                timestamp_ns, data = chunks[i]
+                if speed and tx.pending:
+                    due_ns = start_ns + int((timestamp_ns - first_ns) / speed)
+                    if due_ns - time.monotonic_ns() > window_ns:
+                        break
+                tx.add(data)
+                byte_count += len(data)
+                i += 1
+                if not speed and len(tx.pending) >= 64:
+                    break
+            tx.send()
+
+            if progress_every and i // progress_every != (i - 1) // progress_every:
+                print(f"Replayed {i}/{len(chunks)} reads in {(time.monotonic_ns() - start_ns) / 1e9:.1f}s")
+    except KeyboardInterrupt:
+        print("\nStopped by user")
+    finally:
+        tx.flush()
+
+    elapsed = (time.monotonic_ns() - start_ns) / 1e9
+    lateness = sorted(lateness_ns)
+    stats = {
+        "chunks": i,
+        "bytes": byte_count,
+        "elapsed": elapsed,
+        "recorded": (chunks[i - 1][0] - first_ns) / 1e9 if i else 0.0,
+        "bytes_per_second": byte_count / elapsed if elapsed else 0.0,
+        "late_p50_ms": lateness[len(lateness) // 2] / 1e6 if lateness else 0.0,
+        "late_p99_ms": lateness[min(len(lateness) - 1, int(0.99 * len(lateness)))] / 1e6 if lateness else 0.0,
+        "late_max_ms": lateness[-1] / 1e6 if lateness else 0.0,
+    }
+    stats.update(("tx_" + key, value) for key, value in tx.report().items())
+    return stats
+
+def open_pty():
+    """
+    Create a pseudo-terminal to replay into. Returns (writer, slave_name);
+    receivers open slave_name like a serial port.
+    """
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    return os.fdopen(master, 'wb', buffering=0), os.ttyname(slave)
+
+def parse_speed(text):
+    """'1', '4x', '0.5' or 'max' (as fast as possible, returned as 0)."""
+    text = text.strip().lower()
+    if text in ('max', 'fast', '0'):
+        return 0.0
+    speed = float(text.rstrip('x'))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured log onto a serial port or a pty.")
+    parser.add_argument('capture', help="read.py log.txt, PEDRO [NNNN] [baud] HEX: file or binary capture")
+    parser.add_argument('--speed', type=parse_speed, default=1.0, help="1, Nx, or max (default: 1)")
+    parser.add_argument('--port', help="serial port to write to (default: create a pty)")
+    parser.add_argument('--baud', type=int, help="output baud rate (default: the capture's)")
+    parser.add_argument('--gap', type=float, default=0.0,
+                        help="extra seconds between reads of a text log (they have no timestamps)")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the capture this many times")
+    args = parser.parse_args()
+
+    baudrate, chunks = load_chunks(args.capture, args.baud, args.gap)
+    if not chunks:
+        print(f"No data found in {args.capture}")
+        return
+    total = sum(len(data) for _, data in chunks)
+    print(f"Loaded {len(chunks)} reads ({total} bytes, {chunks[-1][0] / 1e9:.2f}s recorded) at {baudrate} baud")
+
+    if args.port:
+        import serial
+        out = serial.Serial(args.port, baudrate=baudrate, timeout=1)
+        print(f"Replaying to {args.port}")
+    else:
+        out, name = open_pty()
+        print(f"Replaying to {name} (open it as the receiver's port)")
+        input("Press Enter to start...")
+
+    try:
+        for run in range(args.repeat):
+            stats = replay(chunks, out, args.speed, progress_every=max(1, len(chunks) // 10))
+            print(f"Run {run + 1}: {stats['chunks']} reads, {stats['bytes']} bytes in {stats['elapsed']:.2f}s "
+                  f"({stats['bytes_per_second']:.0f} bytes/s, recorded {stats['recorded']:.2f}s)")
+            if args.speed:
+                print(f"  - Lateness: p50 {stats['late_p50_ms']:.3f} ms, p99 {stats['late_p99_ms']:.3f} ms, "
+                      f"max {stats['late_max_ms']:.3f} ms")
+            print(f"  - Writes: {stats['tx_writes']} ({stats['tx_bytes_per_write']:.1f} bytes per write)")
+    finally:
+        out.close()
+
+if __name__ == "__main__":
+    main()
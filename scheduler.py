@@ -0,0 +1,259 @@
+import math
+import time
+from array import array
+
+def wait_until(deadline_ns, spin_ns=2_000_000):
+    """
+    Wait for a time.monotonic_ns() deadline: sleep until spin_ns before it,
+    then spin. Returns the time the wait ended.
+    """
+    remaining = deadline_ns - time.monotonic_ns()
+    if remaining > spin_ns:
+        time.sleep((remaining - spin_ns) / 1_000_000_000)
+    now = time.monotonic_ns()
+    while now < deadline_ns:
+        now = time.monotonic_ns()
+    return now
+
+class RateScheduler:
+    """
+    Fixed-rate tick generator driven by absolute deadlines.
+
+    Tick n is due at start + n * interval on time.monotonic_ns(), so time
+    spent writing, flushing or printing between ticks never accumulates
+    into drift the way sleep(interval) after each send does. The wait
+    sleeps until shortly before the deadline and spins for the rest.
+
+    Every tick records how late it fired (jitter) for the final report.
+    """
+
+    def __init__(self, frequency, duration=None, count=None, spin=0.002, skip_late=False):
+        self.frequency = frequency
+        self.interval_ns = round(1_000_000_000 / frequency)
+        self.duration = duration
+        if count is None and duration is not None:
+            count = math.ceil(duration * frequency)
+        self.count = count  # None: run until the caller stops iterating
+        self.spin_ns = round(spin * 1_000_000_000)
+        self.skip_late = skip_late  # Drop ticks that are a whole interval late instead of bursting
+
+        self.start_ns = None
+        self.end_ns = None
+        self.last_fire_ns = None
+        self.next_tick = 0
+        self.sent = 0
+        self.skipped = 0
+        self.jitter_ns = array('q')
+        self.tx = None  # TxBuffer that sent the ticks, included in the report
+
+    def offset(self, n):
+        """Scheduled time of tick n in seconds after the start."""
+        return n * self.interval_ns / 1_000_000_000
+
+    def elapsed(self):
+        end_ns = self.end_ns if self.end_ns is not None else time.monotonic_ns()
+        return (end_ns - self.start_ns) / 1_000_000_000 if self.start_ns is not None else 0.0
+
+    def _wait_until(self, deadline_ns):
+        return wait_until(deadline_ns, self.spin_ns)
+
+    def _fire(self, now, deadline_ns):
+        self.jitter_ns.append(now - deadline_ns)
+        self.last_fire_ns = now
+        self.sent += 1
+
+    def __iter__(self):
+        self.start_ns = time.monotonic_ns()
+        self.end_ns = None
+        self.next_tick = 0
+        try:
+            while self.count is None or self.next_tick < self.count:
+                n = self.next_tick
+                deadline_ns = self.start_ns + n * self.interval_ns
+                now = self._wait_until(deadline_ns)
+                late_ns = now - deadline_ns
+
+                if self.skip_late and late_ns >= self.interval_ns:
+                    behind = late_ns // self.interval_ns
+                    self.skipped += behind
+                    self.next_tick += behind
+                    continue
+
+                self._fire(now, deadline_ns)
+                self.next_tick = n + 1
+                yield n
+        finally:
+            self.end_ns = time.monotonic_ns()
+
+    def claim_due(self, window_ns):
+        """
+        Fire the ticks that fall due within window_ns from now right away
+        (they are recorded with negative jitter) and return their numbers.
+        Iteration continues after the last one claimed.
+        """
+        now = time.monotonic_ns()
+        first = self.next_tick
+        while self.count is None or self.next_tick < self.count:
+            deadline_ns = self.start_ns + self.next_tick * self.interval_ns
+            if deadline_ns - now > window_ns:
+                break
+            self._fire(now, deadline_ns)
+            self.next_tick += 1
+        return range(first, self.next_tick)
+
+    def report(self):
+        """Timing summary: achieved rate and jitter percentiles in milliseconds."""
+        elapsed = self.elapsed()
+        jitter = sorted(self.jitter_ns)
+
+        # Rate over the span between the first and the last tick actually fired
+        rate = 0.0
+        if self.sent > 1:
+            span_ns = self.last_fire_ns - (self.start_ns + self.jitter_ns[0])
+            rate = (self.sent - 1) * 1_000_000_000 / span_ns if span_ns else 0.0
+
+        def pct(p):
+            return jitter[min(len(jitter) - 1, int(p * len(jitter)))] / 1e6 if jitter else 0.0
+
+        return {
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "elapsed": elapsed,
+            "target_rate": self.frequency,
+            "rate": rate,
+            "jitter_mean_ms": sum(jitter) / len(jitter) / 1e6 if jitter else 0.0,
+            "jitter_p50_ms": pct(0.50),
+            "jitter_p95_ms": pct(0.95),
+            "jitter_p99_ms": pct(0.99),
+            "jitter_max_ms": jitter[-1] / 1e6 if jitter else 0.0,
+        }
+
+    def print_report(self):
+        report = self.report()
+        print(f"  - Packets sent: {report['sent']}")
+        print(f"  - Duration: {report['elapsed']:.1f} seconds")
+        print(f"  - Average rate: {report['rate']:.2f} packets/second (target {report['target_rate']})")
+        print(f"  - Jitter: mean {report['jitter_mean_ms']:.3f} ms, p50 {report['jitter_p50_ms']:.3f} ms, "
+              f"p95 {report['jitter_p95_ms']:.3f} ms, p99 {report['jitter_p99_ms']:.3f} ms, "
+              f"max {report['jitter_max_ms']:.3f} ms")
+        if report['skipped']:
+            print(f"  - Skipped late ticks: {report['skipped']}")
+        if self.tx is not None:
+            self.tx.print_report()
+
+def build_schedule(scheduler, packet_for):
+    """
+    Pre-encode every packet of a run: packet_for(n, offset_seconds) -> bytes.
+    Identical consecutive packets share one bytes object.
+    """
+    schedule = []
+    previous = None
+    for n in range(scheduler.count):
+        packet = packet_for(n, scheduler.offset(n))
+        if packet == previous:
+            packet = previous
+        schedule.append(packet)
+        previous = packet
+    return schedule
+
+class TxBuffer:
+    """
+    Coalescing transmit buffer in front of a pyserial port.
+
+    Frames are collected with add() and handed to the driver in one
+    write() by send(). Instead of flush() (tcdrain) after every frame, the
+    driver's queue is checked with out_waiting and only drained when more
+    than max_backlog bytes from earlier writes are still waiting, so the
+    next frame is queued while the previous one is still on the wire.
+    """
+
+    def __init__(self, ser, max_backlog=256):
+        self.ser = ser
+        self.max_backlog = max_backlog
+        self.pending = []
+        self.check_backlog = hasattr(ser, "out_waiting")
+        self.stats = {
+            "frames": 0,
+            "writes": 0,
+            "bytes": 0,
+            "backlog_checks": 0,
+            "flushes": 0,
+            "max_frames_per_write": 0,
+        }
+
+    def add(self, frame):
+        self.pending.append(frame)
+
+    def send(self):
+        """Write every pending frame in one call."""
+        pending = self.pending
+        if not pending:
+            return
+        stats = self.stats
+        if self.check_backlog:
+            stats["backlog_checks"] += 1
+            if self.ser.out_waiting > self.max_backlog:
+                self.ser.flush()
+                stats["flushes"] += 1
+        data = pending[0] if len(pending) == 1 else b"".join(pending)
+        self.ser.write(data)
+        stats["frames"] += len(pending)
+        stats["writes"] += 1
+        stats["bytes"] += len(data)
+        if len(pending) > stats["max_frames_per_write"]:
+            stats["max_frames_per_write"] = len(pending)
+        pending.clear()
+
+    def flush(self):
+        """Write what is pending and wait until the driver has sent everything."""
+        self.send()
+        self.ser.flush()
+        self.stats["flushes"] += 1
+
+    def report(self):
+        stats = dict(self.stats)
+        stats["syscalls"] = stats["writes"] + stats["backlog_checks"] + stats["flushes"]
+        stats["bytes_per_write"] = stats["bytes"] / stats["writes"] if stats["writes"] else 0.0
+        stats["frames_per_write"] = stats["frames"] / stats["writes"] if stats["writes"] else 0.0
+        return stats
+
+    def print_report(self):
+        report = self.report()
+        print(f"  - Writes: {report['writes']} for {report['frames']} frames "
+              f"({report['frames_per_write']:.2f} frames, {report['bytes_per_write']:.1f} bytes per write)")
+        print(f"  - Syscalls: {report['syscalls']} ({report['backlog_checks']} backlog checks, "
+              f"{report['flushes']} flushes)")
+
+def send_schedule(ser, scheduler, schedule, progress_every=10, describe=None, window=0.002, tx=None):
+    """
+    Write schedule[n] on each tick of scheduler. schedule may be a single
+    bytes object (sent on every tick) or a pre-built list. Frames due within
+    window seconds of each other go out in one write. Stops early on
+    Ctrl+C. Returns the number of packets sent.
+    """
+    repeat = isinstance(schedule, (bytes, bytearray))
+    window_ns = round(window * 1_000_000_000)
+    if tx is None:
+        tx = TxBuffer(ser)
+    scheduler.tx = tx
+    next_progress = progress_every
+    try:
+        try:
+            for n in scheduler:
+                tx.add(schedule if repeat else schedule[n])
+                last = n
+                if window_ns:
+                    for last in scheduler.claim_due(window_ns):
+                        tx.add(schedule if repeat else schedule[last])
+                tx.send()
+
+                # Show progress every progress_every packets
+                if progress_every and scheduler.sent >= next_progress:
+                    next_progress = scheduler.sent - scheduler.sent % progress_every + progress_every
+                    suffix = f" ({describe(last)})" if describe else ""
+                    print(f"Sent {scheduler.sent} packets in {scheduler.elapsed():.1f}s{suffix}")
+        finally:
+            tx.flush()
+    except KeyboardInterrupt:
+        print("\nStopped by user")
+    return scheduler.sent
@@ -1,5 +1,8 @@
 import serial
+import sys
 import time
+
+from scheduler import RateScheduler, build_schedule, send_schedule
 import random
 
 # Default common UART baud rates (same as read.py)
@@ -13,6 +16,38 @@ baud_rates = [
 # Default baud rate (will be set by user selection)
 baudrate = 16250
 
+# Null bytes and sync sent before the bootup packets (lines 1-3 in read.txt)
+INIT_SYNC = bytes([0x00, 0x00, 0xfe])
+
+# Exact bootup/idle packet from line 4 of the logs (repeated on lines 4-48)
+BOOTUP_PACKET = bytes([
+    0xbe, 0xbe, 0xfe, 0xce, 0x02, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
+    0xbe, 0xcc, 0xfc, 0xf2, 0xbe, 0xc2, 0xfe, 0xb2, 0xfe, 0x0e, 0x00
+])
+
+# Corrected packet based on the system response at 20 packets/sec
+CORRECTED_PACKET = bytes([
+    0xbe, 0xbe, 0xfe, 0xce, 0xb2, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
+    0xbe, 0xcc, 0xfc, 0xf2, 0xbe, 0xc2, 0xfe, 0xb2, 0x4e, 0x0e, 0x00
+])
+
+# Fixed header shared by every acceleration packet
+STREAM_HEADER = bytes([
+    0xbe, 0xbe, 0xfe, 0xce, 0x02, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
+    0xbe, 0xcc, 0xfc, 0xf2, 0xbe,
+])
+
+# Real acceleration parameters from read.txt analysis
+REAL_ACCELERATION_LEVELS = [
+    # (level, parameters) - based on lines 50, 57, 63, 71, 79
+    (0, [0xc2, 0xfe, 0xb2, 0xfe, 0x0e]),      # Idle (line 4-48)
+    (20, [0xc2, 0x0e, 0x0e, 0xf2, 0x0e, 0x0c]), # Low (line 50)
+    (40, [0x42, 0x72, 0x0c, 0xf2, 0x7e]),     # Medium (line 57)
+    (60, [0x42, 0x8e, 0x82, 0xf2, 0x82]),     # High (line 63)
+    (80, [0x42, 0xce, 0x82, 0xf2, 0xc2]),     # Very high (line 71)
+    (100, [0x42, 0xf2, 0x82, 0xf2, 0xfe])     # Maximum (line 79)
+]
+
 def select_baud_rate():
     """
     Let user select baud rate from the list
@@ -48,27 +83,19 @@ def send_bootup_sequence(port="/dev/ttyAMA0", baudrate=baudrate):
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
             # Phase 1: Null bytes and sync (like lines 1-3 in read.txt)
             print("  - Sending null bytes...")
-            ser.write(bytes([0x00, 0x00, 0xfe]))
+            ser.write(INIT_SYNC)
             ser.flush()
             time.sleep(0.1)
             
             # Phase 2: Bootup packet (repeated multiple times like lines 4-48)
-            bootup_packet = bytes([
-                0xbe, 0xbe, 0xfe, 0xce, 0x02, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
-                0xbe, 0xcc, 0xfc, 0xf2, 0xbe, 0xc2, 0xfe, 0xb2, 0xfe, 0x0e, 0x00
-            ])
+            bootup_packet = BOOTUP_PACKET
             
             print("Phase 2: Sending bootup packets (multiple times)")
             print(f"  - Bootup packet: {' '.join(hex(b) for b in bootup_packet)}")
             
             # Send bootup packet multiple times (like the system does)
-            for i in range(20):  # Send 20 times (adjust as needed)
-                ser.write(bootup_packet)
-                ser.flush()
-                time.sleep(0.05)  # 50ms between packets
-                
-                if i % 5 == 0:
-                    print(f"    Sent {i+1} bootup packets...")
+            scheduler = RateScheduler(20, count=20)  # 20 times, 50ms apart (adjust as needed)
+            send_schedule(ser, scheduler, bootup_packet, progress_every=5)
             
             print("✓ Bootup sequence complete!")
             time.sleep(0.5)  # Wait for system to stabilize
@@ -76,6 +103,21 @@ def send_bootup_sequence(port="/dev/ttyAMA0", baudrate=baudrate):
     except Exception as e:
         print(f"Error during bootup sequence: {e}")
 
+def acceleration_curve(progress):
+    """
+    Acceleration level (0-100) for a run that is progress (0-1) complete:
+    start low, peak in middle, end low
+    """
+    if progress < 0.3:
+        # Ramp up
+        return int(progress * 333)  # 0 to 100
+    elif progress < 0.7:
+        # Peak acceleration
+        return 100
+    else:
+        # Ramp down
+        return int((1 - progress) * 333)  # 100 to 0
+
 def send_real_acceleration_sequence(port="/dev/ttyAMA0", baudrate=baudrate, duration=10, frequency=15):
     """
     Send real acceleration commands based on read.txt analysis
@@ -86,78 +128,22 @@ def send_real_acceleration_sequence(port="/dev/ttyAMA0", baudrate=baudrate, dura
     print(f"  - Frequency: {frequency} packets/second")
     print()
     
-    # Real acceleration parameters from read.txt analysis
-    acceleration_levels = [
-        # (level, parameters) - based on lines 50, 57, 63, 71, 79
-        (0, [0xc2, 0xfe, 0xb2, 0xfe, 0x0e]),      # Idle (line 4-48)
-        (20, [0xc2, 0x0e, 0x0e, 0xf2, 0x0e, 0x0c]), # Low (line 50)
-        (40, [0x42, 0x72, 0x0c, 0xf2, 0x7e]),     # Medium (line 57)
-        (60, [0x42, 0x8e, 0x82, 0xf2, 0x82]),     # High (line 63)
-        (80, [0x42, 0xce, 0x82, 0xf2, 0xc2]),     # Very high (line 71)
-        (100, [0x42, 0xf2, 0x82, 0xf2, 0xfe])     # Maximum (line 79)
-    ]
-    
-    interval = 1.0 / frequency
+    # Pick every packet of the run from the precomputed table so the send loop only writes
+    scheduler = RateScheduler(frequency, duration)
+    schedule = build_schedule(
+        scheduler, lambda n, offset: real_acceleration_packet(acceleration_curve(offset / duration)))
     
     try:
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
-            start_time = time.time()
-            packet_count = 0
-            
             print("Starting acceleration transmission...")
             print("Press Ctrl+C to stop early")
             print()
             
-            try:
-                while time.time() - start_time < duration:
-                    # Simulate realistic acceleration curve
-                    elapsed = time.time() - start_time
-                    progress = elapsed / duration
-                    
-                    # Create acceleration curve: start low, peak in middle, end low
-                    if progress < 0.3:
-                        # Ramp up
-                        accel_level = int(progress * 333)  # 0 to 100
-                    elif progress < 0.7:
-                        # Peak acceleration
-                        accel_level = 100
-                    else:
-                        # Ramp down
-                        accel_level = int((1 - progress) * 333)  # 100 to 0
-                    
-                    # Find the appropriate acceleration parameters
-                    accel_params = acceleration_levels[0][1]  # Default to idle
-                    for level, params in acceleration_levels:
-                        if accel_level <= level:
-                            accel_params = params
-                            break
-                    
-                    # Create the real acceleration packet
-                    packet = bytes([
-                        0xbe, 0xbe, 0xfe, 0xce, 0x02, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
-                        0xbe, 0xcc, 0xfc, 0xf2, 0xbe,  # Fixed header
-                    ] + accel_params + [0x00])  # Real acceleration parameters + end
-                    
-                    # Send the packet
-                    ser.write(packet)
-                    ser.flush()
-                    packet_count += 1
-                    
-                    # Show progress every 10 packets
-                    if packet_count % 10 == 0:
-                        elapsed = time.time() - start_time
-                        print(f"Sent {packet_count} packets in {elapsed:.1f}s (accel: {accel_level}%)")
-                    
-                    time.sleep(interval)
-                    
-            except KeyboardInterrupt:
-                print("\nStopped by user")
+            send_schedule(ser, scheduler, schedule,
+                          describe=lambda n: f"accel: {acceleration_curve(scheduler.offset(n) / duration)}%")
             
-            elapsed = time.time() - start_time
             print(f"\n✓ Real acceleration sequence complete!")
-            print(f"  - Packets sent: {packet_count}")
-            print(f"  - Duration: {elapsed:.1f} seconds")
-            print(f"  - Average rate: {packet_count/elapsed:.1f} packets/second")
+            scheduler.print_report()
             
             # Check for any final response
             time.sleep(1)
@@ -193,10 +179,7 @@ def send_exact_line4_packet(port="/dev/ttyAMA0", baudrate=baudrate, duration=10,
     Packet: 0xbe 0xbe 0xfe 0xce 0x2 0xfe 0xbc 0xbe 0xbe 0xcc 0xfe 0xb2 0xfe 0xbe 0xcc 0xfc 0xf2 0xbe 0xc2 0xfe 0xb2 0xfe 0xe 0x0
     """
     # Exact packet from line 4 of the logs
-    exact_packet = bytes([
-        0xbe, 0xbe, 0xfe, 0xce, 0x02, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
-        0xbe, 0xcc, 0xfc, 0xf2, 0xbe, 0xc2, 0xfe, 0xb2, 0xfe, 0x0e, 0x00
-    ])
+    exact_packet = BOOTUP_PACKET
     
     print(f"Starting exact line 4 packet transmission...")
     print(f"  - Packet: {' '.join(hex(b) for b in exact_packet)}")
@@ -206,40 +189,18 @@ def send_exact_line4_packet(port="/dev/ttyAMA0", baudrate=baudrate, duration=10,
     print(f"  - Total packets: {duration * frequency}")
     print()
     
-    # Calculate interval between packets
-    interval = 1.0 / frequency
+    scheduler = RateScheduler(frequency, duration)
     
     try:
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
-            start_time = time.time()
-            packet_count = 0
-            
             print("Starting transmission...")
             print("Press Ctrl+C to stop early")
             print()
             
-            try:
-                while time.time() - start_time < duration:
-                    # Send the exact packet
-                    ser.write(exact_packet)
-                    ser.flush()
-                    packet_count += 1
-                    
-                    # Show progress every 10 packets
-                    if packet_count % 10 == 0:
-                        elapsed = time.time() - start_time
-                        print(f"Sent {packet_count} packets in {elapsed:.1f}s")
-                    
-                    time.sleep(interval)
-                    
-            except KeyboardInterrupt:
-                print("\nStopped by user")
+            send_schedule(ser, scheduler, exact_packet)
             
-            elapsed = time.time() - start_time
             print(f"\n✓ Exact line 4 packet transmission complete!")
-            print(f"  - Packets sent: {packet_count}")
-            print(f"  - Duration: {elapsed:.1f} seconds")
-            print(f"  - Average rate: {packet_count/elapsed:.1f} packets/second")
+            scheduler.print_report()
             
             # Check for any final response
             time.sleep(1)
@@ -260,10 +221,7 @@ def send_corrected_20packets_packet(port="/dev/ttyAMA0", baudrate=baudrate, dura
     Packet: 0xbe 0xbe 0xfe 0xce 0xb2 0xfe 0xbc 0xbe 0xbe 0xcc 0xfe 0xb2 0xfe 0xbe 0xcc 0xfc 0xf2 0xbe 0xc2 0xfe 0xb2 0x4e 0xe 0x0
     """
     # Corrected packet based on 20 packets/sec system response
-    corrected_packet = bytes([
-        0xbe, 0xbe, 0xfe, 0xce, 0xb2, 0xfe, 0xbc, 0xbe, 0xbe, 0xcc, 0xfe, 0xb2, 0xfe, 
-        0xbe, 0xcc, 0xfc, 0xf2, 0xbe, 0xc2, 0xfe, 0xb2, 0x4e, 0x0e, 0x00
-    ])
+    corrected_packet = CORRECTED_PACKET
     
     print(f"Starting corrected 20 packets/sec packet transmission...")
     print(f"  - Packet: {' '.join(hex(b) for b in corrected_packet)}")
@@ -274,40 +232,18 @@ def send_corrected_20packets_packet(port="/dev/ttyAMA0", baudrate=baudrate, dura
     print(f"  - Based on: System response to 20 packets/sec")
     print()
     
-    # Calculate interval between packets
-    interval = 1.0 / frequency
+    scheduler = RateScheduler(frequency, duration)
     
     try:
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
-            start_time = time.time()
-            packet_count = 0
-            
             print("Starting transmission...")
             print("Press Ctrl+C to stop early")
             print()
             
-            try:
-                while time.time() - start_time < duration:
-                    # Send the corrected packet
-                    ser.write(corrected_packet)
-                    ser.flush()
-                    packet_count += 1
-                    
-                    # Show progress every 10 packets
-                    if packet_count % 10 == 0:
-                        elapsed = time.time() - start_time
-                        print(f"Sent {packet_count} packets in {elapsed:.1f}s")
-                    
-                    time.sleep(interval)
-                    
-            except KeyboardInterrupt:
-                print("\nStopped by user")
+            send_schedule(ser, scheduler, corrected_packet)
             
-            elapsed = time.time() - start_time
             print(f"\n✓ Corrected 20 packets/sec transmission complete!")
-            print(f"  - Packets sent: {packet_count}")
-            print(f"  - Duration: {elapsed:.1f} seconds")
-            print(f"  - Average rate: {packet_count/elapsed:.1f} packets/second")
+            scheduler.print_report()
             
             # Check for any final response
             time.sleep(1)
@@ -341,23 +277,75 @@ def generate_acceleration_parameters(acceleration_level=0):
         # Maximum acceleration (from line 79 in logs)
         return [0x42, 0xF2, 0x82, 0xF2, 0xFE]
 
-def create_complete_packet_stream(acceleration_level=0):
-    """
-    Create the complete packet stream based on log analysis
-    This simulates the exact packet structure observed in the logs
-    """
+def _build_complete_packet_stream(acceleration_level):
     # Generate acceleration parameters
     accel_params = generate_acceleration_parameters(acceleration_level)
     
     # Complete packet stream from log analysis (line 4 pattern)
     # Pattern: 0xBE 0xBE 0xFE 0xCE 0x02 0xFE 0xBC 0xBE 0xBE 0xCC 0xFE 0xB2 0xFE 0xBE 0xCC 0xFC 0xF2 0xBE [ACCEL_PARAMS] 0x00
-    packet_stream = [
-        0xBE, 0xBE, 0xFE, 0xCE, 0x02, 0xFE, 0xBC, 0xBE, 0xBE, 0xCC, 0xFE, 0xB2, 0xFE, 
-        0xBE, 0xCC, 0xFC, 0xF2, 0xBE,  # Fixed acceleration command header
+    return STREAM_HEADER + bytes([
         accel_params[0], 0xFE, accel_params[1], 0xFE, accel_params[2], 0x00  # Variable acceleration parameters
-    ]
+    ])
+
+def _build_real_acceleration_packet(acceleration_level):
+    # Find the appropriate acceleration parameters
+    accel_params = REAL_ACCELERATION_LEVELS[0][1]  # Default to idle
+    for level, params in REAL_ACCELERATION_LEVELS:
+        if acceleration_level <= level:
+            accel_params = params
+            break
     
-    return bytes(packet_stream)
+    # Create the real acceleration packet
+    return STREAM_HEADER + bytes(accel_params + [0x00])  # Real acceleration parameters + end
+
+def _build_packet_table(build):
+    """
+    One packet per acceleration level -1 to 101, indexed by level + 1. Both
+    builders are constant below 0 and above 100, so the two ends stand for
+    every level outside 0-100 (and keep each builder's own out-of-range
+    packet: real_acceleration goes back to idle above 100). Levels that
+    encode to the same bytes share one object.
+    """
+    packets = {}
+    return tuple(packets.setdefault(packet, packet) for packet in map(build, range(-1, 102)))
+
+# Precomputed packets for every acceleration level, built once at import
+STREAM_PACKETS = _build_packet_table(_build_complete_packet_stream)
+REAL_ACCELERATION_PACKETS = _build_packet_table(_build_real_acceleration_packet)
+
+def _lookup(table, build, acceleration_level):
+    if type(acceleration_level) is int:
+        return table[min(max(acceleration_level, -1), 101) + 1]
+    return build(acceleration_level)
+
+def check_packet_tables(levels=range(-10, 201)):
+    """
+    Compare the precomputed tables with their builders for every integer
+    level (python stream.py --check). Returns True when they all agree.
+    """
+    mismatches = [(build.__name__, level)
+                  for table, build in ((STREAM_PACKETS, _build_complete_packet_stream),
+                                       (REAL_ACCELERATION_PACKETS, _build_real_acceleration_packet))
+                  for level in levels if _lookup(table, build, level) != build(level)]
+    for name, level in mismatches:
+        print(f"{name}: level {level} differs from the precomputed table")
+    print(f"Checked levels {levels.start}..{levels.stop - 1}: {len(mismatches)} mismatches")
+    return not mismatches
+
+def create_complete_packet_stream(acceleration_level=0):
+    """
+    Create the complete packet stream based on log analysis
+    This simulates the exact packet structure observed in the logs
+    Integer levels come from the precomputed table (no allocation).
+    """
+    return _lookup(STREAM_PACKETS, _build_complete_packet_stream, acceleration_level)
+
+def real_acceleration_packet(acceleration_level=0):
+    """
+    Packet with the real acceleration parameters observed in read.txt for
+    acceleration_level (0-100), from the precomputed table.
+    """
+    return _lookup(REAL_ACCELERATION_PACKETS, _build_real_acceleration_packet, acceleration_level)
 
 def send_packet_stream(port="/dev/ttyAMA0", baudrate=baudrate, duration=10, frequency=15):
     """
@@ -370,59 +358,22 @@ def send_packet_stream(port="/dev/ttyAMA0", baudrate=baudrate, duration=10, freq
     print(f"  - Packet structure: Complete ebike stream simulation")
     print()
     
-    # Calculate interval between packets
-    interval = 1.0 / frequency
+    # Pre-encode the whole run: acceleration follows the scheduled time of each packet
+    scheduler = RateScheduler(frequency, duration)
+    schedule = build_schedule(
+        scheduler, lambda n, offset: create_complete_packet_stream(acceleration_curve(offset / duration)))
     
     try:
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
-            start_time = time.time()
-            packet_count = 0
-            
             print("Starting transmission...")
             print("Press Ctrl+C to stop early")
             print()
             
-            try:
-                while time.time() - start_time < duration:
-                    # Generate varying acceleration levels (0-100)
-                    # Simulate realistic acceleration curve
-                    elapsed = time.time() - start_time
-                    progress = elapsed / duration
-                    
-                    # Create acceleration curve: start low, peak in middle, end low
-                    if progress < 0.3:
-                        # Ramp up
-                        accel_level = int(progress * 333)  # 0 to 100
-                    elif progress < 0.7:
-                        # Peak acceleration
-                        accel_level = 100
-                    else:
-                        # Ramp down
-                        accel_level = int((1 - progress) * 333)  # 100 to 0
-                    
-                    # Create packet with current acceleration level
-                    packet = create_complete_packet_stream(accel_level)
-                    
-                    # Send the packet
-                    ser.write(packet)
-                    ser.flush()
-                    packet_count += 1
-                    
-                    # Show progress every 10 packets
-                    if packet_count % 10 == 0:
-                        elapsed = time.time() - start_time
-                        print(f"Sent {packet_count} packets in {elapsed:.1f}s (accel: {accel_level}%)")
-                    
-                    time.sleep(interval)
-                    
-            except KeyboardInterrupt:
-                print("\nStopped by user")
+            send_schedule(ser, scheduler, schedule,
+                          describe=lambda n: f"accel: {acceleration_curve(scheduler.offset(n) / duration)}%")
             
-            elapsed = time.time() - start_time
             print(f"\n✓ Stream transmission complete!")
-            print(f"  - Packets sent: {packet_count}")
-            print(f"  - Duration: {elapsed:.1f} seconds")
-            print(f"  - Average rate: {packet_count/elapsed:.1f} packets/second")
+            scheduler.print_report()
             
             # Check for any final response
             time.sleep(1)
@@ -445,38 +396,19 @@ def send_constant_acceleration_stream(port="/dev/ttyAMA0", baudrate=baudrate, ac
     print(f"  - Duration: {duration} seconds")
     print()
     
-    interval = 1.0 / frequency
+    packet = create_complete_packet_stream(acceleration_level)
+    scheduler = RateScheduler(frequency, duration)
     
     try:
         with serial.Serial(port, baudrate=baudrate, timeout=1) as ser:
-            start_time = time.time()
-            packet_count = 0
-            
             print("Starting transmission...")
             print("Press Ctrl+C to stop early")
             print()
             
-            try:
-                while time.time() - start_time < duration:
-                    packet = create_complete_packet_stream(acceleration_level)
-                    ser.write(packet)
-                    ser.flush()
-                    packet_count += 1
-                    
-                    if packet_count % 10 == 0:
-                        elapsed = time.time() - start_time
-                        print(f"Sent {packet_count} packets in {elapsed:.1f}s")
-                    
-                    time.sleep(interval)
-                    
-            except KeyboardInterrupt:
-                print("\nStopped by user")
+            send_schedule(ser, scheduler, packet)
             
-            elapsed = time.time() - start_time
             print(f"\n✓ Constant acceleration stream complete!")
-            print(f"  - Packets sent: {packet_count}")
-            print(f"  - Duration: {elapsed:.1f} seconds")
-            print(f"  - Average rate: {packet_count/elapsed:.1f} packets/second")
+            scheduler.print_report()
             
     except Exception as e:
         print(f"Error sending constant acceleration stream: {e}")
@@ -631,9 +563,8 @@ def main():
         
     else:
         print("Invalid choice.")
-        
-    else:
-        print("Invalid choice.")
 
 if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        sys.exit(0 if check_packet_tables() else 1)
     main()
\ No newline at end of file
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+
+import serial
+
+# Largest chunk taken from the port per readiness callback
+READ_SIZE = 4096
+
+class SerialStream:
+    """
+    asyncio wrapper around a non-blocking serial port (or any tty/pty fd).
+
+    Reads are driven by loop.add_reader on the file descriptor: each
+    readiness callback drains what the driver has, stamps it with
+    time.monotonic_ns() and queues it. Writes go straight to the fd and
+    only fall back to loop.add_writer when the driver is full; anything
+    written meanwhile is appended and goes out in the same syscall. One
+    event loop can therefore service several ports at once without polling.
+    """
+
+    def __init__(self, fd, name, owner=None, queue_size=0):
+        self.fd = fd
+        self.name = name
+        self.owner = owner  # Object that owns the fd (serial.Serial), closed with the stream
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+        self.closed = False
+        self.stats = {
+            "reads": 0,
+            "bytes_in": 0,
+            "writes": 0,
+            "bytes_out": 0,
+            "write_syscalls": 0,
+            "dropped_chunks": 0,
+        }
+
+        self._tx = bytearray()
+        self._eof = None  # Pending sentinel put when the queue was full at EOF
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+        os.set_blocking(fd, False)
+        self.loop.add_reader(fd, self._on_readable)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""  # Port went away (e.g. USB adapter unplugged)
+
+        if not data:
+            self.loop.remove_reader(self.fd)
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                # Never drop the end-of-stream marker: wait for the reader to make room
+                self._eof = self.loop.create_task(self.queue.put(None))
+            return
+
+        self.stats["reads"] += 1
+        self.stats["bytes_in"] += len(data)
+        try:
+            self.queue.put_nowait((time.monotonic_ns(), data))
+        except asyncio.QueueFull:
+            self.stats["dropped_chunks"] += 1
+
+    async def read(self, timeout=None):
+        """
+        Return the next (timestamp_ns, data) chunk, or None at end of stream
+        or when nothing arrives within timeout seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def chunks(self, idle_timeout=None):
+        """Yield (timestamp_ns, data) chunks until EOF or idle_timeout seconds of silence."""
+        while True:
+            item = await self.read(idle_timeout)
+            if item is None:
+                return
+            yield item
+
+    def write(self, data):
+        """Queue data for transmission without blocking the event loop."""
+        self.stats["writes"] += 1
+        self.stats["bytes_out"] += len(data)
+        if not self._tx:
+            self.stats["write_syscalls"] += 1
+            try:
+                written = os.write(self.fd, data)
+            except BlockingIOError:
+                written = 0
+            if written == len(data):
+                return
+            data = data[written:]
+            self._drained.clear()
+            self.loop.add_writer(self.fd, self._on_writable)
+        self._tx += data
+
+    def _on_writable(self):
+        self.stats["write_syscalls"] += 1
+        try:
+            written = os.write(self.fd, self._tx)
+        except BlockingIOError:
+            return
+        del self._tx[:written]
+        if not self._tx:
+            self.loop.remove_writer(self.fd)
+            self._drained.set()
+
+    async def drain(self):
+        """Wait until everything written has been handed to the driver."""
+        await self._drained.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.loop.remove_reader(self.fd)
+        self.loop.remove_writer(self.fd)
+        if self.owner is not None:
+            self.owner.close()
+
+async def open_serial(port, baudrate, name=None, queue_size=0, **kwargs):
+    """
+    Open a serial port for use on the running event loop.
+    """
+    ser = serial.Serial(port, baudrate=baudrate, timeout=0, write_timeout=0, **kwargs)
+    return SerialStream(ser.fileno(), name or port, owner=ser, queue_size=queue_size)
+
+async def merge_streams(*streams, idle_timeout=None):
+    """
+    Merge several streams into one sequence of (timestamp_ns, name, data)
+    ordered by the time each chunk was read. All timestamps come from the
+    same monotonic clock, so chunks from different ports are directly
+    comparable. Everything already queued is sorted before it is yielded;
+    a chunk can only come out ahead of an earlier one that had not reached
+    the merged queue yet (at most one loop iteration apart).
+    Ends when every stream has ended, or after idle_timeout seconds of
+    silence on all of them.
+    """
+    merged = asyncio.Queue()
+
+    async def pump(stream):
+        async for timestamp_ns, data in stream.chunks():
+            await merged.put((timestamp_ns, stream.name, data))
+        await merged.put(None)
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            try:
+                item = await asyncio.wait_for(merged.get(), idle_timeout)
+            except asyncio.TimeoutError:
+                return
+            # Pumps hand chunks over in task order, not read order
+            ready = [item]
+            while not merged.empty():
+                ready.append(merged.get_nowait())
+            remaining -= ready.count(None)
+            ready = [item for item in ready if item is not None]
+            ready.sort(key=lambda item: item[0])
+            for item in ready:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,110 @@
+import re
+import sys
+import time
+
+import numpy as np
+
+from read import STANDARD_PACKET_SIZE, PACKET_HEADER, PACKET_TERMINATOR
+
+# Control bytes considered by read.extract_single_byte_packets
+CONTROL_BYTES = [0x00, 0x02, 0xFE, 0xFF, 0xFC]
+
+_CONTROL_LUT = np.zeros(256, dtype=bool)
+_CONTROL_LUT[CONTROL_BYTES] = True
+
+# "[0001] [16250] HEX: 30 36 26 ..." lines written by read.py
+_HEX_LINE = re.compile(r'\[\d+\]\s+\[\d+\]\s+HEX(?:_ONLY)?:\s+((?:[0-9a-fA-F]{2}\s?)+)$')
+
+def as_uint8(data_bytes):
+    """
+    View a capture as a uint8 array without copying when possible.
+    """
+    if isinstance(data_bytes, np.ndarray):
+        return data_bytes.astype(np.uint8, copy=False)
+    if isinstance(data_bytes, (bytes, bytearray, memoryview)):
+        return np.frombuffer(data_bytes, dtype=np.uint8)
+    return np.asarray(data_bytes, dtype=np.uint8)
+
+def load_hex_log(path):
+    """
+    Load the HEX rows of a read.py / PEDRO capture as one uint8 array.
+    """
+    chunks = []
+    with open(path, 'r') as f:
+        for line in f:
+            match = _HEX_LINE.search(line.rstrip())
+            if match:
+                chunks.append(match.group(1).replace(' ', ''))
+    return np.frombuffer(bytes.fromhex(''.join(chunks)), dtype=np.uint8)
+
+def _match_sequence(arr, sequence, offset=0):
+    """
+    Boolean mask of the positions where sequence starts at position + offset.
+    The mask covers every position that could start a full packet.
+    """
+    count = len(arr) - STANDARD_PACKET_SIZE + 1
+    mask = np.ones(count, dtype=bool)
+    for k, value in enumerate(sequence):
+        mask &= arr[offset + k:offset + k + count] == value
+    return mask
+
+def extract_28byte_packets(data_bytes):
+    """
+    Vectorized read.extract_28byte_packets.
+    Returns the same list of (packet_data, start_pos, end_pos) tuples.
+    """
+    arr = as_uint8(data_bytes)
+    if len(arr) < STANDARD_PACKET_SIZE:
+        return []
+
+    # Header at the start and terminator at the end of the 28-byte window
+    valid = _match_sequence(arr, PACKET_HEADER)
+    valid &= _match_sequence(arr, PACKET_TERMINATOR, STANDARD_PACKET_SIZE - len(PACKET_TERMINATOR))
+    starts = np.flatnonzero(valid)
+
+    # The scalar scan jumps a whole packet after each match. Overlapping
+    # candidates are rare, so only walk the candidate list when they occur.
+    if len(starts) > 1 and (np.diff(starts) < STANDARD_PACKET_SIZE).any():
+        kept = []
+        next_free = 0
+        for start in starts.tolist():
+            if start >= next_free:
+                kept.append(start)
+                next_free = start + STANDARD_PACKET_SIZE
+        starts = kept
+    else:
+        starts = starts.tolist()
+
+    return [(data_bytes[i:i + STANDARD_PACKET_SIZE], i, i + STANDARD_PACKET_SIZE) for i in starts]
+
+def extract_single_byte_packets(data_bytes):
+    """
+    Vectorized read.extract_single_byte_packets.
+    Returns the same list of (bytes([byte]), start_pos, end_pos) tuples.
+    """
+    arr = as_uint8(data_bytes)
+    n = len(arr)
+    if n == 0:
+        return []
+
+    control = _CONTROL_LUT[arr]
+
+    # Inner bytes count only when both neighbours are non-control bytes;
+    # the first and last byte of the stream always count.
+    valid = control.copy()
+    valid[1:-1] &= ~control[:-2] & ~control[2:]
+
+    positions = np.flatnonzero(valid)
+    values = arr[positions].tolist()
+    return [(bytes((value,)), i, i + 1) for value, i in zip(values, positions.tolist())]
+
+if __name__ == "__main__":
+    # Usage: python vectorized.py PEDRO/preprocessing/*.txt
+    for path in sys.argv[1:]:
+        data = load_hex_log(path)
+        start = time.perf_counter()
+        packets = extract_28byte_packets(data)
+        single_bytes = extract_single_byte_packets(data)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {len(data)} bytes, {len(packets)} 28-byte packets, "
+              f"{len(single_bytes)} single-byte packets ({elapsed * 1000:.1f} ms)")